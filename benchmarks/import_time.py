@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+parser = argparse.ArgumentParser(prog='Benchmark for the import time of the utils modules and the startup time of process_datasets.py')
+parser.add_argument('--budget', help='The maximum import time in seconds of each utils module (the benchmark fails if it is exceeded)', default=0.5, type=float)
+parser.add_argument('--plan_budget', help='The maximum runtime in seconds of "process_datasets.py --plan" for the given configuration', default=2.0, type=float)
+parser.add_argument('--config_path', help='The configuration used for measuring "process_datasets.py --plan"', default='config/config_all.yaml')
+parser.add_argument('--repetitions', help='Each measurement is repeated this many times and the minimum is reported', default=5, type=int)
+
+# Libraries that must not be imported by importing a utils module or by planning the processing
+HEAVY_MODULES = ['laspy', 'plyfile', 'pypcd4', 'scipy', 'shapely', 'open3d', 'cv2', 'tifffile', 'rosbags', 'pyboreas', 'pyarrow']
+
+# Imports the module in a fresh interpreter and prints the import time and the heavy modules that got loaded
+MEASURE_IMPORT = '''
+import sys, time, json
+start_time = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start_time
+heavy_modules = [name for name in {heavy_modules} if name in sys.modules]
+print(json.dumps([import_time, heavy_modules]))
+'''
+
+# Executes process_datasets.py --plan in the current interpreter and reports the heavy modules that got loaded
+MEASURE_PLAN = '''
+import sys, runpy, json, io, contextlib
+sys.argv = ['process_datasets.py', {config_path}, '--plan']
+with contextlib.redirect_stdout(io.StringIO()):
+    runpy.run_path('process_datasets.py', run_name='__main__')
+print(json.dumps([name for name in {heavy_modules} if name in sys.modules]))
+'''
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_import(module):
+    measurements = [run_python(MEASURE_IMPORT.format(module=module, heavy_modules=HEAVY_MODULES)) for _ in range(args.repetitions)]
+    return min(import_time for import_time, _ in measurements), measurements[0][1]
+
+def measure_plan(config_path):
+    runtimes = []
+    for _ in range(args.repetitions):
+        start_time = time.perf_counter()
+        heavy_modules = run_python(MEASURE_PLAN.format(config_path=repr(config_path), heavy_modules=HEAVY_MODULES))
+        runtimes.append(time.perf_counter() - start_time)
+    return min(runtimes), heavy_modules
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    modules = sorted('utils.' + filename[:-3] for filename in os.listdir('utils') if filename.endswith('.py') and filename != '__init__.py')
+    failures = []
+
+    print('Module                          Import time  Heavy modules')
+    for module in modules:
+        try:
+            import_time, heavy_modules = measure_import(module)
+        except RuntimeError as error:
+            print(module.ljust(32) + 'not importable (' + str(error) + ')')
+            continue
+        print(module.ljust(32) + ('%.3f s' % import_time).ljust(13) + (', '.join(heavy_modules) or '-'))
+        if import_time > args.budget:
+            failures.append(module + ' exceeds the import time budget of ' + str(args.budget) + ' s')
+        if heavy_modules:
+            failures.append(module + ' imports ' + ', '.join(heavy_modules))
+
+    plan_time, heavy_modules = measure_plan(args.config_path)
+    print('process_datasets.py --plan'.ljust(32) + ('%.3f s' % plan_time).ljust(13) + (', '.join(heavy_modules) or '-'))
+    if plan_time > args.plan_budget:
+        failures.append('process_datasets.py --plan exceeds the budget of ' + str(args.plan_budget) + ' s')
+    if heavy_modules:
+        failures.append('process_datasets.py --plan imports ' + ', '.join(heavy_modules))
+
+    for failure in failures:
+        print('FAILED:', failure)
+    sys.exit(1 if failures else 0)
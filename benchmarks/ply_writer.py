@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils.pointcloud_format as pf
+from utils.io import write_ply
+
+parser = argparse.ArgumentParser(prog='Benchmark for writing point clouds as PLY: utils.io.write_ply against the previous implementation (one Python tuple per point + plyfile)')
+parser.add_argument('--num_points', help='The number of points of the random point cloud', default=2000000, type=int)
+parser.add_argument('--pointcloud_format', help='The name of a point cloud format in utils.pointcloud_format', default='FORMAT_XYZRGBSIC')
+parser.add_argument('--repetitions', help='Each measurement is repeated this many times and the minimum is reported', default=3, type=int)
+parser.add_argument('--skip_previous', help='Only measures the current implementation (the previous one takes minutes for large point clouds)', action='store_true')
+
+
+# The implementation of write_ply before it was vectorized
+def write_ply_with_tuples(pointcloud, path, pointcloud_format):
+    import plyfile
+    new_pointcloud = np.array(list(map(tuple, pointcloud)), dtype=pointcloud_format.ply_output_dtypes)
+    el = plyfile.PlyElement.describe(new_pointcloud, 'vertex')
+    plyfile.PlyData([el]).write(path)
+
+def random_pointcloud(num_points, pointcloud_format):
+    rng = np.random.default_rng(0)
+    columns = []
+    for field in pointcloud_format.fields:
+        if np.issubdtype(field.dtype, np.floating):
+            columns.append(rng.uniform(-1000, 1000, num_points))
+        else:
+            columns.append(rng.integers(0, np.iinfo(field.dtype).max, num_points, endpoint=True).astype(np.float64))
+    return np.column_stack(columns)
+
+# Returns the minimum runtime and the peak of the memory allocated in addition to the point cloud (traced in a separate execution)
+def measure(write, pointcloud, path, pointcloud_format):
+    runtimes = []
+    for _ in range(args.repetitions):
+        start_time = time.perf_counter()
+        write(pointcloud, path, pointcloud_format)
+        runtimes.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    write(pointcloud, path, pointcloud_format)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(runtimes), peak_memory
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    pointcloud_format = getattr(pf, args.pointcloud_format)
+    pointcloud = random_pointcloud(args.num_points, pointcloud_format)
+    print('Point cloud:', args.num_points, 'points,', args.pointcloud_format, '(%.1f MB as float64 array)' % (pointcloud.nbytes / 1e6))
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        current_path = os.path.join(temp_folder, 'current.ply')
+        runtime, peak_memory = measure(write_ply, pointcloud, current_path, pointcloud_format)
+        print('write_ply:  %8.3f s, %8.1f MB peak memory' % (runtime, peak_memory / 1e6))
+
+        if not args.skip_previous:
+            previous_path = os.path.join(temp_folder, 'previous.ply')
+            previous_runtime, previous_peak_memory = measure(write_ply_with_tuples, pointcloud, previous_path, pointcloud_format)
+            print('previous:   %8.3f s, %8.1f MB peak memory' % (previous_runtime, previous_peak_memory / 1e6))
+            print('Speedup: %.1fx' % (previous_runtime / runtime))
+            with open(current_path, 'rb') as current_file, open(previous_path, 'rb') as previous_file:
+                if current_file.read() != previous_file.read():
+                    print('FAILED: the files written by write_ply and the previous implementation differ')
+                    sys.exit(1)
+            print('The written files are identical')
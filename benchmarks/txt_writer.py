@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils.pointcloud_format as pf
+from utils.io import write_txt
+
+parser = argparse.ArgumentParser(prog='Benchmark for writing point clouds as text files: utils.io.write_txt against np.savetxt (the previous implementation)')
+parser.add_argument('--num_points', help='The number of points of the random point cloud', default=2000000, type=int)
+parser.add_argument('--pointcloud_format', help='The name of a point cloud format in utils.pointcloud_format', default='FORMAT_XYZRGBSIC')
+parser.add_argument('--num_workers', help='The number of threads of write_txt (defaults to the thread budget)', default=None, type=int)
+parser.add_argument('--repetitions', help='Each measurement is repeated this many times and the minimum is reported', default=3, type=int)
+parser.add_argument('--skip_previous', help='Only measures the current implementation (np.savetxt takes minutes for large point clouds)', action='store_true')
+
+
+def write_txt_with_savetxt(pointcloud, path, pointcloud_format):
+    np.savetxt(path, pointcloud, header=pointcloud_format.txt_output_header, fmt=pointcloud_format.txt_output_dtypes)
+
+# Random values in the range of the field types, including negative values and values close to rounding ties of the floats
+def random_pointcloud(num_points, pointcloud_format):
+    rng = np.random.default_rng(0)
+    columns = []
+    for field in pointcloud_format.fields:
+        if np.issubdtype(field.dtype, np.floating):
+            column = rng.uniform(-1000, 1000, num_points)
+            column[::1000] = np.round(column[::1000], 6) + 5e-7
+            columns.append(column)
+        else:
+            columns.append(rng.integers(0, np.iinfo(field.dtype).max, num_points, endpoint=True).astype(np.float64))
+    return np.column_stack(columns)
+
+def measure(write, pointcloud, path, pointcloud_format):
+    runtimes = []
+    for _ in range(args.repetitions):
+        start_time = time.perf_counter()
+        write(pointcloud, path, pointcloud_format)
+        runtimes.append(time.perf_counter() - start_time)
+    return min(runtimes)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    pointcloud_format = getattr(pf, args.pointcloud_format)
+    pointcloud = random_pointcloud(args.num_points, pointcloud_format)
+    print('Point cloud:', args.num_points, 'points,', args.pointcloud_format, '(' + pointcloud_format.txt_output_dtypes + ')')
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        current_path = os.path.join(temp_folder, 'current.txt')
+        runtime = measure(lambda *arguments: write_txt(*arguments, num_workers=args.num_workers), pointcloud, current_path, pointcloud_format)
+        print('write_txt:  %8.3f s' % runtime)
+
+        if not args.skip_previous:
+            previous_path = os.path.join(temp_folder, 'previous.txt')
+            previous_runtime = measure(write_txt_with_savetxt, pointcloud, previous_path, pointcloud_format)
+            print('np.savetxt: %8.3f s' % previous_runtime)
+            print('Speedup: %.1fx' % (previous_runtime / runtime))
+            with open(current_path, 'rb') as current_file, open(previous_path, 'rb') as previous_file:
+                if current_file.read() != previous_file.read():
+                    print('FAILED: the files written by write_txt and np.savetxt differ')
+                    sys.exit(1)
+            print('The written files are identical')
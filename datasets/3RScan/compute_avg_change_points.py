@@ -1,11 +1,10 @@
 import os
 import argparse
 import json
-import laspy
 import numpy as np
 from tqdm import tqdm
 from utils.evaluation import Statistics, print_dataset_statistics
-from utils.io import read_las_in_local_crs
+from utils.io import read_las_columns
 
 parser = argparse.ArgumentParser(prog='3RScan - Dataset Avg. Change Points Computation')
 parser.add_argument('input_path', help='The folder with the sampled point clouds')
@@ -33,19 +32,19 @@ def compute_avg_change_points(input_folder, json_path, output_log_path, leave_pr
 		first_epoch_instances = None
 		epoch_paths = sorted(os.scandir(scene.path), key=lambda e: int(e.name.split('_')[1].split('.')[0]))
 		for idx, epoch in tqdm(enumerate(epoch_paths), leave=False):
+			# only the instances of the first epoch and the change labels of the other epochs are read
 			if idx == 0:
-				pointcloud = laspy.read(epoch.path)
-				first_epoch_instances = pointcloud.instance
+				first_epoch_instances = read_las_columns(epoch.path, ['instance'])['instance']
 			else:
 				change_points = 0
-				pointcloud = read_las_in_local_crs(epoch.path)
+				change = read_las_columns(epoch.path, ['change'])['change']
 
 				# removed objects are extracted from the first epoch and counted towards the change points
 				for removed_object in removals[scene.name][idx-1]:
 					change_points += len(first_epoch_instances[first_epoch_instances == removed_object])
 
-				overall_points = change_points + len(pointcloud)
-				change_points += np.count_nonzero(pointcloud[:, 3] > 0)
+				overall_points = change_points + len(change)
+				change_points += np.count_nonzero(change > 0)
 				change_percentage.append(change_points / overall_points)
 
 	print_dataset_statistics({Statistics.CHANGE_POINTS : np.array(change_percentage)}, output_log_path)
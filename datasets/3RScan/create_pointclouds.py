@@ -18,6 +18,9 @@ parser.add_argument('--output_folder', help='The folder into which the pointclou
 parser.add_argument('--output_format', help='The format of the output point cloud', type=FileFormat, choices=[format.value for format in FileFormat], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of scans to exclude for reconstruction (e.g., 00d42bef-778d-2ac6-848a-008ef6c19ad6)', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of scans to include (overwrites exclusion list)', nargs='+', type=str)
+
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'raw/*/'
 	
 def extract_pointcloud(input_path, output_folder, output_filename, output_format, align_to_reference):
 	archive_path = os.path.join(input_path, 'sequence.zip')
@@ -35,7 +38,7 @@ def extract_pointcloud(input_path, output_folder, output_filename, output_format
 				depth_shift = float(lines[6][1])
 				num_frames = int(lines[11][1])
 
-			reconstruction = RGBDReconstruction(intrinsics[:3, :3], depth_resolution)
+			reconstruction = RGBDReconstruction(intrinsics[:3, :3], depth_resolution, pointcloud_format=FORMAT_XYZRGB)
 
 			for idx in tqdm(range(num_frames), total=num_frames, leave=False):
 				pose = np.loadtxt(os.path.join(temp_dir, f'frame-{idx:06d}.pose.txt'))
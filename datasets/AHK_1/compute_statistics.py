@@ -1,14 +1,17 @@
 import os
 import argparse
-from utils.evaluation import Statistics, EvaluationConfig, compute_dataset_statistics
+from utils.evaluation import Statistics, EvaluationConfig, compute_dataset_statistics, add_chunk_points_argument, add_txt_cache_argument, add_evaluation_cache_arguments, evaluation_cache_folder
 
 
 parser = argparse.ArgumentParser(prog='AHK 1 - Dataset Statistics Computation')
 parser.add_argument('input_path', help='The root folder of the dataset')
 parser.add_argument('--output_log', help='Path of a textfile where the results should be written to', default=None)
+add_chunk_points_argument(parser)
+add_txt_cache_argument(parser)
+add_evaluation_cache_arguments(parser)
 
 
-def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
+def compute_statistics(input_folder, output_log_path, leave_progress_bar=False, chunk_points=None, txt_cache=False, evaluation_cache=False, evaluation_cache_size=None):
 	if not os.path.exists(input_folder):
 		return
 
@@ -18,12 +21,16 @@ def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
 	config = EvaluationConfig(statistics_to_compute=[Statistics.NUM_POINTS, Statistics.AVG_DISTANCE],
 						   output_log_path=output_log_path,
 						   leave_progress_bar=leave_progress_bar,
+						   chunk_points=chunk_points,
 						   position_offset=[-652833, -5189072, 0],
-						   txt_has_header=True)
+						   txt_has_header=True,
+						   txt_cache=txt_cache,
+						   evaluation_cache=evaluation_cache_folder(input_folder, evaluation_cache),
+						   evaluation_cache_size=evaluation_cache_size)
 	
 	compute_dataset_statistics([epochs], config)
 
 
 if __name__ == '__main__':
 	args = parser.parse_args()
-	compute_statistics(args.input_path, args.output_log, leave_progress_bar=True)
\ No newline at end of file
+	compute_statistics(args.input_path, args.output_log, leave_progress_bar=True, chunk_points=args.chunk_points, txt_cache=args.txt_cache, evaluation_cache=args.evaluation_cache, evaluation_cache_size=args.evaluation_cache_size)
\ No newline at end of file
@@ -1,20 +1,23 @@
 import os
 import argparse
-from utils.evaluation import Statistics, EvaluationConfig, compute_dataset_statistics
+from utils.evaluation import Statistics, EvaluationConfig, compute_dataset_statistics, add_chunk_points_argument, add_evaluation_cache_arguments, evaluation_cache_folder
+from utils.io import is_evaluation_cache
 
 
 parser = argparse.ArgumentParser(prog='AHK 2 - Dataset Statistics Computation')
 parser.add_argument('input_path', help='The root folder of the dataset')
 parser.add_argument('--output_log', help='Path of a textfile where the results should be written to', default=None)
+add_chunk_points_argument(parser)
+add_evaluation_cache_arguments(parser)
 
 
-def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
+def compute_statistics(input_folder, output_log_path, leave_progress_bar=False, chunk_points=None, evaluation_cache=False, evaluation_cache_size=None):
 	if not os.path.exists(input_folder):
 		return
 
 	regions = { }
 	for epoch in os.scandir(input_folder):
-		if not epoch.is_dir():
+		if not epoch.is_dir() or is_evaluation_cache(epoch.path):
 			continue
 		for region in os.scandir(epoch.path):
 			region_name = region.name.split('_')[2]
@@ -26,11 +29,14 @@ def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
 	config = EvaluationConfig(statistics_to_compute=[Statistics.NUM_POINTS, Statistics.AVG_DISTANCE],
 						   output_log_path=output_log_path,
 						   leave_progress_bar=leave_progress_bar,
-						   position_offset=[-653000, -5189000, -2600])  # shift to avoid precision errors
+						   chunk_points=chunk_points,
+						   position_offset=[-653000, -5189000, -2600],  # shift to avoid precision errors
+						   evaluation_cache=evaluation_cache_folder(input_folder, evaluation_cache),
+						   evaluation_cache_size=evaluation_cache_size)
 
 	compute_dataset_statistics(list(regions.values()), config)
 
 
 if __name__ == '__main__':
 	args = parser.parse_args()
-	compute_statistics(args.input_path, args.output_log, leave_progress_bar=True)
\ No newline at end of file
+	compute_statistics(args.input_path, args.output_log, leave_progress_bar=True, chunk_points=args.chunk_points, evaluation_cache=args.evaluation_cache, evaluation_cache_size=args.evaluation_cache_size)
\ No newline at end of file
@@ -1,10 +1,9 @@
 import os
 import argparse
-import plyfile
 import numpy as np
 from tqdm import tqdm
 import utils.pointcloud_format as pf
-from utils.io import write_pointcloud, FileFormat
+from utils.io import write_pointcloud, read_ply_fields, FileFormat
 
 
 parser = argparse.ArgumentParser(prog='AgScan3D Viticulture - Point Cloud Creation')
@@ -17,10 +16,9 @@ scenes = ['b07_r100_to_r94', 'b90_r131_to_r125', 'b12_r33_to_r27', 'b13_r27_to_r
 POINTCLOUD_FORMAT = pf.PointcloudFormat([pf.X, pf.Y, pf.Z, pf.R, pf.G, pf.B])
 
 def convert_raw_data(input_path, output_folder, filename, file_format):
-    pointcloud = plyfile.PlyData.read(input_path)
-    alpha = pointcloud['vertex']['alpha']
-    pointcloud = np.column_stack([pointcloud['vertex']['x'], pointcloud['vertex']['y'], pointcloud['vertex']['z'], pointcloud['vertex']['red'], pointcloud['vertex']['green'], pointcloud['vertex']['blue']])
-    pointcloud = pointcloud[alpha > 0]    # discard rays that did not hit anything
+    vertices = read_ply_fields(input_path, ['x', 'y', 'z', 'red', 'green', 'blue', 'alpha'], element='vertex')
+    hits = vertices['alpha'] > 0    # discard rays that did not hit anything
+    pointcloud = np.column_stack([vertices['x'][hits], vertices['y'][hits], vertices['z'][hits], vertices['red'][hits], vertices['green'][hits], vertices['blue'][hits]])
     write_pointcloud(pointcloud, output_folder, filename, file_format, POINTCLOUD_FORMAT)
 
 
@@ -17,12 +17,15 @@ from utils.pointcloud_creation import get_pose_matrix, project_points_to_image,
 parser = argparse.ArgumentParser(prog='BLT - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to "[input_path]/pointclouds")')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of file names to exclude for reconstruction.', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of file names to include (overwrites the exclusion list)', nargs='+', type=str)
 parser.add_argument('--project_images', help='Projects the RGB images onto the point cloud to get per-point colors', action='store_true')
 parser.add_argument('--num_tiles', help='The number of tiles into which the scene should be divided in x and y direction', nargs=2, default=[4,4])
 
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'rosbags/Ktima Gerovassiliou/*.bag'
+
 
 # Transform matrices
 T_frontcam_to_base = np.eye(4)
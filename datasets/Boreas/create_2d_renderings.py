@@ -1,6 +1,5 @@
 import os
 import argparse
-import laspy
 import numpy as np
 import datashader as ds
 import pandas as pd
@@ -8,6 +7,9 @@ import datashader.transfer_functions as tf
 from datashader.utils import export_image
 from tqdm import tqdm
 
+from utils.io import read_point_batch
+from utils.pointcloud_format import FORMAT_XYZ
+
 parser = argparse.ArgumentParser(prog='Boreas - Render to Groundplane')
 parser.add_argument('input_path', help='The folder with the extracted pointclouds')
 parser.add_argument('output_folder', help='Path of a folder where the resulting images should be stored')
@@ -16,9 +18,9 @@ parser.add_argument('output_folder', help='Path of a folder where the resulting
 def render_to_image(input_folder, output_path):
     accumulated_image = None
     for tile in tqdm(list(os.scandir(input_folder)), leave=False):
-        pointcloud_las = laspy.read(tile.path)
+        pointcloud = read_point_batch(tile.path, FORMAT_XYZ)    # LAS/LAZ or Parquet tiles
 
-        dataframe = pd.DataFrame({'x': np.asarray(pointcloud_las.x), 'y': np.asarray(pointcloud_las.y)})
+        dataframe = pd.DataFrame({'x': np.asarray(pointcloud['X']), 'y': np.asarray(pointcloud['Y'])})
         canvas = ds.Canvas(plot_width=3000, plot_height=3000, x_range=(-2000,1000), y_range=(-800,3000))
         agg = canvas.points(dataframe, 'x', 'y')
         img = tf.shade(agg, cmap='red', how='log')
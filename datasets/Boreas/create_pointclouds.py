@@ -15,12 +15,15 @@ from utils.tile_writer import TileWriter
 parser = argparse.ArgumentParser(prog='Boreas - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to "[input_path]/pointclouds")')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of dates to exclude for reconstruction, e.g., "boreas-2020-11-26-13-58".', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of dates to include, e.g., "boreas-2020-11-26-13-58" (overwrites the exclusion list)', nargs='+', type=str)
 parser.add_argument('--project_images', help='Projects the RGB images onto the point cloud to get per-point colors', action='store_true')
 parser.add_argument('--tile_size', help='The size of the tiles into which the scene is divided in x and y direction', default=100)
 
+# No EPOCHS are declared (unlike for other datasets), as the processed sequences are given by the odom_train split of pyboreas and the exclusions
+# in extract_pointclouds, which cannot be expressed as a glob pattern. --inclusion_list skips both.
+
 
 def get_bbox(sequence):
 	bbox_min = np.array([math.inf, math.inf])
@@ -87,7 +90,7 @@ def extract_pointclouds(input_path, output_folder, output_format, exclusion_list
 	exclusion_list.append('boreas-2021-04-29-15-55')
 
 	if inclusion_list is not None:
-		split_list = [inclusion_list]
+		split_list = [[x] for x in inclusion_list]
 	else:
 		split_list = [x for x in odom_train if x[0] not in exclusion_list]
 	split_list = [x for x in split_list if os.path.exists(os.path.join(data_folder, x[0]))]
@@ -21,7 +21,7 @@ def extract_pointcloud(input_path, output_path, output_format):
 	poses = np.loadtxt(os.path.join(input_path, 'trajectory.txt'), delimiter=' ', usecols=(0,1,2,3,4,5,6,7))
 	intrinsics = np.array([[320, 0, 320], [0, 320, 240], [0, 0, 1]])
 	resolution = [640, 480]
-	reconstruction = RGBDReconstruction(intrinsics, resolution, map_color_to_segmentation_id=True, depth_threshold=40.0)
+	reconstruction = RGBDReconstruction(intrinsics, resolution, map_color_to_segmentation_id=True, depth_threshold=40.0, pointcloud_format=FORMAT_XYZRGBS)
 
 	for idx, raw_pose in tqdm(enumerate(poses), total=len(poses), leave=False):
 		filename = str(idx)
@@ -25,17 +25,18 @@ def extract_pointcloud(input_path, output_folder, output_format):
 
 	typestore = get_typestore(Stores.ROS1_NOETIC)
 	
-	result = []
-	with Reader(input_path.resolve()) as reader:
-		points_connections = [x for x in reader.connections if x.topic == 'point_cloud_G']
-		for connection, _, rawdata in tqdm(reader.messages(connections=points_connections), leave=False):
-			message = typestore.deserialize_ros1(rawdata, connection.msgtype)
-			pointcloud = pointcloud_from_point_message(message)
+	# the point cloud of each message is written directly
+	def message_pointclouds():
+		with Reader(input_path.resolve()) as reader:
+			points_connections = [x for x in reader.connections if x.topic == 'point_cloud_G']
+			for connection, _, rawdata in tqdm(reader.messages(connections=points_connections), leave=False):
+				message = typestore.deserialize_ros1(rawdata, connection.msgtype)
+				pointcloud = pointcloud_from_point_message(message)
 
-			mask = np.any(pointcloud[:,3:] != 0, axis=1)  # Remove erroneous black points
-			result.extend(pointcloud[mask])
+				mask = np.any(pointcloud[:,3:] != 0, axis=1)  # Remove erroneous black points
+				yield pointcloud[mask]
 
-	write_pointcloud(np.array(result), output_path, input_path.stem, output_format, FORMAT_XYZRGB)
+	write_pointcloud(message_pointclouds(), output_path, input_path.stem, output_format, FORMAT_XYZRGB)
 
 
 def extract_pointclouds(input_path, output_folder, output_format, exclusion_list, inclusion_list):
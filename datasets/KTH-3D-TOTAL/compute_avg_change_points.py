@@ -4,7 +4,7 @@ import numpy as np
 import xml.etree.ElementTree as ET
 from tqdm import tqdm
 from utils.evaluation import Statistics, print_dataset_statistics
-from utils.io import read_pointcloud_for_evaluation
+from utils.io import count_points_for_evaluation
 
 
 parser = argparse.ArgumentParser(prog='KTH-3D-TOTAL - Dataset Avg. Change Points Computation')
@@ -46,7 +46,7 @@ def compute_avg_change_points(input_folder, output_log_path, leave_progress_bar=
 	for table in tqdm(list(os.scandir(os.path.join(input_folder, 'pcd-annotated'))), leave=leave_progress_bar):
 		last_epoch_annotations = {}
 		for idx, scan in tqdm(list(enumerate(sorted(os.scandir(table.path), key=sorting_function))), leave=False):
-			overall_points = len(read_pointcloud_for_evaluation(scan.path))
+			overall_points = count_points_for_evaluation(scan.path)
 			label_path = os.path.join(input_folder, 'xml-annotated', table.name, scan.name.split('.')[0] + '.xml')
 
 			if idx == 0:
@@ -3,7 +3,7 @@ import argparse
 import numpy as np
 from tqdm import tqdm
 from utils.evaluation import Statistics, print_dataset_statistics
-from utils.io import read_pointcloud_for_evaluation
+from utils.io import count_points_for_evaluation
 
 parser = argparse.ArgumentParser(prog='KTH Moving Objects - Dataset Avg. Change Points Computation')
 parser.add_argument('input_path', help='The root folder of the dataset')
@@ -12,12 +12,12 @@ parser.add_argument('--output_log', help='Path of a textfile where the results s
 
 def compute_change_percentage(folder_path):
 	full_scan_path = os.path.join(folder_path, 'complete_cloud.pcd')
-	number_of_points = len(read_pointcloud_for_evaluation(full_scan_path))
+	number_of_points = count_points_for_evaluation(full_scan_path)
 
 	number_of_change_points = 0
 	for file in os.scandir(folder_path):
 		if '_label' in file.name and file.name.endswith('.pcd'):
-			number_of_change_points += len(read_pointcloud_for_evaluation(file.path))
+			number_of_change_points += count_points_for_evaluation(file.path)
 
 	return number_of_change_points / number_of_points
 
@@ -45,7 +45,7 @@ def extract_pointcloud(input_path, output_path, output_format):
 		d_connection, _, d_rawdata = next(depth_reader, None)
 		c_connection, _, c_rawdata = next(color_reader, None)
 
-		rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[640, 480])
+		rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[640, 480], pointcloud_format=FORMAT_XYZRGB)
 		progress_bar = tqdm(leave=False)
 		idx = 0
 		while d_connection is not None:
@@ -1,6 +1,5 @@
 import os
 import argparse
-import laspy
 import numpy as np
 import datashader as ds
 import pandas as pd
@@ -9,6 +8,9 @@ from datashader.utils import export_image
 from scipy.spatial.transform import Rotation as R
 from tqdm import tqdm
 
+from utils.io import read_point_batch
+from utils.pointcloud_format import FORMAT_XYZ
+
 parser = argparse.ArgumentParser(prog='NCLT - Render to Groundplane')
 parser.add_argument('input_path', help='The folder with the extracted pointclouds')
 parser.add_argument('output_folder', help='Path of a folder where the resulting images should be stored')
@@ -17,13 +19,13 @@ parser.add_argument('output_folder', help='Path of a folder where the resulting
 def render_to_image(input_folder, output_path, z_rotation=0):
 	accumulated_image = None
 	for tile in tqdm(list(os.scandir(input_folder)), leave=False):
-		pointcloud_las = laspy.read(tile.path)
+		pointcloud = read_point_batch(tile.path, FORMAT_XYZ)    # LAS/LAZ or Parquet tiles
 			
-		if len(pointcloud_las.x) < 2:
+		if len(pointcloud) < 2:
 			continue
 			
 		rotation = R.from_euler('z', z_rotation, degrees=True).as_matrix()[:2, :2]
-		xy = np.stack([pointcloud_las.x, pointcloud_las.y], axis=0)
+		xy = np.stack([pointcloud['X'], pointcloud['Y']], axis=0)
 		xy = np.matmul(rotation, xy)
 
 		dataframe = pd.DataFrame({'x': xy[0], 'y': xy[1]})
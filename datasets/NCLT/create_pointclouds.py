@@ -7,7 +7,7 @@ import cv2
 from scipy.spatial.transform import Rotation as R
 
 from utils.pointcloud_format import FORMAT_XYZI, FORMAT_XYZRGB
-from utils.io import FileFormat
+from utils.io import FileFormat, read_txt_columns
 from utils.tile_writer import TileWriter
 from utils.pointcloud_creation import get_pose_matrix, project_points_to_image, get_processing_order
 
@@ -15,11 +15,16 @@ from utils.pointcloud_creation import get_pose_matrix, project_points_to_image,
 parser = argparse.ArgumentParser(prog='NCLT - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to "[input_path]/pointclouds")')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of dates to exclude for reconstruction, e.g., "2012-01-15".', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of dates to include, e.g., "2012-01-15" (overwrites the exclusion list)', nargs='+', type=str)
 parser.add_argument('--project_images', help='Projects the RGB images onto the point cloud to get per-point colors', action='store_true')
 parser.add_argument('--tile_size', help='The size of the tiles into which the scene is divided in x and y direction', default=50, type=int)
+parser.add_argument('--resume', help='Continues an interrupted extraction from the last checkpoint in the output folder', action='store_true')
+parser.add_argument('--checkpoint_interval', help='The interval in seconds in which the extraction progress is stored for resuming it later (checkpoints are only stored with this option or --resume, which defaults to 600 seconds)', default=None, type=float)
+
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'raw/*/'
 
 
 # inspired in some parts by https://github.com/Kitware/pyLiDAR-SLAM/blob/master/slam/dataset/nclt_dataset.py
@@ -93,8 +98,9 @@ def verify_start_marker(s):
 
 # extracts all poses and their timestamps from the pose file
 def extract_poses(pose_path):
-	poses = np.loadtxt(pose_path, delimiter=',', skiprows=1, usecols=(1,2,3,4,5,6))
-	timestamps = np.loadtxt(pose_path, delimiter=',', skiprows=1, usecols=(0), dtype='uint64')
+	pose_data = read_txt_columns(pose_path, usecols=(0,1,2,3,4,5,6), dtype=[('timestamp', 'uint64'), ('pose', 'float64', (6,))], skiprows=1, delimiter=',')
+	poses = pose_data['pose']
+	timestamps = pose_data['timestamp']
 	valid_poses = ~np.isnan(poses).any(axis=1)
 	poses = poses[valid_poses]
 	timestamps = timestamps[valid_poses]
@@ -121,7 +127,7 @@ def get_undistorted_image(image_path, undistorted_image_path, cam_index):
 	return img_undistorted
 
 
-def extract_pointcloud_with_intensity(input_path, output_path, output_format, tile_size):
+def extract_pointcloud_with_intensity(input_path, output_path, output_format, tile_size, checkpoint_interval=None, resume=False):
 	velodyne_path = os.path.join(input_path, 'velodyne_hits.bin')
 	pose_path = os.path.join(input_path, 'groundtruth_' + os.path.basename(input_path) + '.csv')
 
@@ -134,9 +140,13 @@ def extract_pointcloud_with_intensity(input_path, output_path, output_format, ti
 						  file_format=output_format,
 						  bbox=np.array([np.min(poses[:, :2], axis=0), np.max(poses[:, :2], axis=0)]), 
 						  tile_size=tile_size,
-						  padding=2)
+						  padding=2,
+						  checkpoint_interval=checkpoint_interval,
+						  resume=resume)
 	
 	f_bin = open(velodyne_path, 'rb')
+	if tile_writer.resume_position is not None:    # the position is the file offset after the last processed scan
+		f_bin.seek(tile_writer.resume_position)
 	progress_bar = tqdm()
 	while True:
 		start_marker = f_bin.read(8)
@@ -163,10 +173,11 @@ def extract_pointcloud_with_intensity(input_path, output_path, output_format, ti
 		tile_writer.add_points(np.column_stack([xyz[:3].T, pointcloud[:, 3]])) # the 4th column contains the intensity
 
 		progress_bar.update()
+		tile_writer.checkpoint(f_bin.tell())
 	tile_writer.close()
 
 # requires the velodyne_sync and lb3 folders, as well as the camera parameters
-def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_size):
+def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_size, checkpoint_interval=None, resume=False):
 	velodyne_path = os.path.join(input_path, 'velodyne_sync')
 	pose_path = os.path.join(input_path, 'groundtruth_' + os.path.basename(input_path) + '.csv')
 
@@ -179,14 +190,21 @@ def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_
 						  file_format=output_format,
 						  bbox=np.array([np.min(poses[:, :2], axis=0), np.max(poses[:, :2], axis=0)]), 
 						  tile_size=tile_size,
-						  padding=2)
+						  padding=2,
+						  checkpoint_interval=checkpoint_interval,
+						  resume=resume)
 
 	# Prepare folders for color images
 	images_path = os.path.join(input_path, 'lb3')
 	undistorted_images_path = os.path.join(input_path, 'lb3_undistorted')
 	retrieve_undistorted_image_names(undistorted_images_path)
 
-	for scan in tqdm(list(os.scandir(velodyne_path))):
+	# the scans are sorted, so that the position of a checkpoint (the number of processed scans) is valid across runs
+	scans = sorted(os.scandir(velodyne_path), key=lambda scan: scan.name)
+	first_scan = tile_writer.resume_position if tile_writer.resume_position is not None else 0
+	for scan_index in tqdm(range(first_scan, len(scans))):
+		scan = scans[scan_index]
+		tile_writer.checkpoint(scan_index)
 		timestamp = int(scan.name.split('.')[0])
 		if timestamp < min_timestamp or timestamp > max_timestamp:    # we ignore all scans for which we have no gt pose
 			continue
@@ -232,7 +250,7 @@ def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_
 	tile_writer.close()
 
 
-def extract_pointclouds(input_path, output_folder, output_format, exclusion_list, inclusion_list, project_images, tile_size):
+def extract_pointclouds(input_path, output_folder, output_format, exclusion_list, inclusion_list, project_images, tile_size, checkpoint_interval=None, resume=False):
 	if not os.path.exists(input_path):
 		return
 
@@ -251,9 +269,9 @@ def extract_pointclouds(input_path, output_folder, output_format, exclusion_list
 		os.makedirs(output_path, exist_ok=True)
 
 		if project_images:
-			extract_pointcloud_with_colors(entry, output_path, output_format, tile_size)
+			extract_pointcloud_with_colors(entry, output_path, output_format, tile_size, checkpoint_interval, resume)
 		else:
-			extract_pointcloud_with_intensity(entry, output_path, output_format, tile_size)
+			extract_pointcloud_with_intensity(entry, output_path, output_format, tile_size, checkpoint_interval, resume)
 
 
 if __name__ == '__main__':
@@ -264,4 +282,6 @@ if __name__ == '__main__':
 					 args.exclusion_list,
 					 args.inclusion_list,
 					 args.project_images,
-					 args.tile_size)
\ No newline at end of file
+					 args.tile_size,
+					 args.checkpoint_interval,
+					 args.resume)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import os
+import glob
+import argparse
+import numpy as np
+from tqdm import tqdm
+
+from utils.pointcloud_format import FORMAT_XYZI, FORMAT_XYZRGB
+from utils.io import read_bbox_from_header
+from utils.scene_container import SceneContainer, SCENE_METADATA, import_epoch
+
+
+parser = argparse.ArgumentParser(prog='NCLT - Scene Container Creation')
+parser.add_argument('input_path', help='The root path of the dataset')
+parser.add_argument('--pointcloud_folder', help='The folder with the point clouds extracted by create_pointclouds.py (defaults to "[input_path]/pointclouds")')
+parser.add_argument('--output_folder', help='The folder of the scene container (defaults to "[input_path]/scene")')
+parser.add_argument('--project_images', help='Whether the point clouds were extracted with colors (see create_pointclouds.py)', action='store_true')
+parser.add_argument('--tile_size', help='The size of the tiles of the scene container in x and y direction', default=50, type=int)
+
+
+# Imports the tiles of all extracted epochs into one scene container with a shared tile grid, and packs it, so that each tile can be read across
+# all epochs at once. Epochs that are already in the container are skipped.
+def create_scene_container(input_path, pointcloud_folder, output_folder, project_images, tile_size):
+	pointcloud_folder = os.path.join(input_path, 'pointclouds') if pointcloud_folder is None else pointcloud_folder
+	output_folder = os.path.join(input_path, 'scene') if output_folder is None else output_folder
+	if not os.path.exists(pointcloud_folder):
+		return
+
+	epochs = {}
+	for epoch in sorted(os.scandir(pointcloud_folder), key=lambda entry: entry.name):
+		tiles = sorted(path for pattern in ['tile_*.las', 'tile_*.laz', 'tile_*.parquet'] for path in glob.glob(os.path.join(epoch.path, pattern)))
+		if epoch.is_dir() and tiles:
+			epochs[epoch.name] = tiles
+
+	if not epochs:
+		return
+	if os.path.isfile(os.path.join(output_folder, SCENE_METADATA)):
+		# the tile grid of an existing scene is kept, points of new epochs outside of it are added to the nearest tiles
+		scene = SceneContainer(output_folder)
+	else:
+		# the tile grid covers the extracted tiles of all epochs, whose bounding boxes are read from their headers
+		bboxes = np.array([read_bbox_from_header(tile) for tiles in epochs.values() for tile in tiles])
+		bbox = np.array([np.min(bboxes[:, 0, :2], axis=0), np.max(bboxes[:, 1, :2], axis=0)])
+		scene = SceneContainer.create(output_folder, FORMAT_XYZRGB if project_images else FORMAT_XYZI, bbox, tile_size=tile_size)
+
+	existing_epochs = scene.epochs()
+	for epoch, tiles in tqdm(epochs.items()):
+		if epoch not in existing_epochs:
+			import_epoch(scene, epoch, tiles)
+	scene.pack()
+
+
+if __name__ == '__main__':
+	args = parser.parse_args()
+	create_scene_container(args.input_path, args.pointcloud_folder, args.output_folder, args.project_images, args.tile_size)
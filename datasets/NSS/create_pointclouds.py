@@ -16,15 +16,15 @@ parser.add_argument('--inclusion_list', help='A list of epoch names to include (
 
 
 def extract_pointcloud(input_folder, poses, output_folder, output_format):
-	pointcloud = []
-	for pose_name in poses:
-		xyz = read_pointcloud_for_evaluation(os.path.join(input_folder, pose_name))
-		xyzw = np.hstack((xyz, np.ones((xyz.shape[0], 1))))
-		xyz = np.dot(xyzw, poses[pose_name].T)[:, :3]
-		pointcloud.extend(xyz)
+	# the scans are transformed and written one after the other
+	def transformed_scans():
+		for pose_name in poses:
+			xyz = read_pointcloud_for_evaluation(os.path.join(input_folder, pose_name))
+			xyzw = np.hstack((xyz, np.ones((xyz.shape[0], 1))))
+			yield np.dot(xyzw, poses[pose_name].T)[:, :3]
 	
-	if len(pointcloud) > 0:
-		write_pointcloud(np.array(pointcloud), output_folder, pose_name.split('_')[1], output_format, FORMAT_XYZ)
+	if len(poses) > 0:
+		write_pointcloud(transformed_scans(), output_folder, list(poses)[-1].split('_')[1], output_format, FORMAT_XYZ)
 
 
 def extract_pointclouds(input_path, output_folder, output_format, exclusion_list, inclusion_list):
@@ -1,6 +1,5 @@
 import os
 import argparse
-import laspy
 import numpy as np
 import pandas as pd
 import datashader as ds
@@ -8,6 +7,9 @@ import datashader.transfer_functions as tf
 from datashader.utils import export_image
 from tqdm import tqdm
 
+from utils.io import read_point_batch
+from utils.pointcloud_format import FORMAT_XYZ
+
 
 parser = argparse.ArgumentParser(prog='OpenLORIS-Scene - Render to Groundplane')
 parser.add_argument('input_path', help='The folder with the extracted pointclouds')
@@ -25,12 +27,12 @@ ranges = {
 def render_to_image(input_folder, output_path, plot_range):
 	accumulated_image = None
 	for tile in tqdm(list(os.scandir(input_folder)), leave=False):
-		pointcloud_las = laspy.read(tile.path)
+		pointcloud = read_point_batch(tile.path, FORMAT_XYZ)    # LAS/LAZ or Parquet tiles
 			
-		if len(pointcloud_las.x) < 2:
+		if len(pointcloud) < 2:
 			continue
 
-		dataframe = pd.DataFrame({'x': np.asarray(pointcloud_las.x), 'y': np.asarray(pointcloud_las.y)})
+		dataframe = pd.DataFrame({'x': np.asarray(pointcloud['X']), 'y': np.asarray(pointcloud['Y'])})
 		canvas = ds.Canvas(plot_width=2000, plot_height=2000, x_range=plot_range[0], y_range=plot_range[1])
 		agg = canvas.points(dataframe, 'x', 'y')
 		img = tf.shade(agg, cmap='red', how='log')
@@ -5,7 +5,7 @@ import cv2
 
 from utils.tile_writer import TileWriter
 from utils.pointcloud_format import FORMAT_XYZRGB
-from utils.io import FileFormat
+from utils.io import FileFormat, read_txt_columns
 from utils.pointcloud_processing import remove_duplicates
 from utils.pointcloud_creation import RGBDReconstruction, get_pose_matrix, get_processing_order
 from tqdm import tqdm
@@ -14,15 +14,19 @@ from tqdm import tqdm
 parser = argparse.ArgumentParser(prog='OpenLORIS-Scene - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to [input_path]/pointclouds)')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of epochs to exclude for reconstruction, e.g., "cafe1-1"', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of epochs to include (overwrites exclusion list)', nargs='+', type=str)
 parser.add_argument('--num_tiles', help='The number of tiles into which the scene should be divided in x and y direction', nargs=2, default=[7,7])
 
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'raw/*/*/'
+
 
 def extract_pointcloud(input_path, output_path, output_format, num_tiles):
-	timestamps = np.loadtxt(os.path.join(input_path, 'groundtruth.txt'), usecols=(0), skiprows=1, dtype=np.float64)
-	poses = np.loadtxt(os.path.join(input_path, 'groundtruth.txt'), usecols=(1,2,3,4,5,6,7), skiprows=1)
+	groundtruth = read_txt_columns(os.path.join(input_path, 'groundtruth.txt'), usecols=(0,1,2,3,4,5,6,7), skiprows=1, delimiter=None)
+	timestamps = groundtruth[:, 0]
+	poses = groundtruth[:, 1:]
 	depth_paths = np.loadtxt(os.path.join(input_path, 'aligned_depth.txt'), dtype=str)
 	color_paths = np.loadtxt(os.path.join(input_path, 'color.txt'), dtype=str)
 
@@ -45,7 +49,7 @@ def extract_pointcloud(input_path, output_path, output_format, num_tiles):
 	extrinsics_file.release()
 
 	# The depth maps are quite noisy, especially at larger distances. We used a threshold of 3m.
-	rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[848, 480], depth_threshold=3)
+	rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[848, 480], depth_threshold=3, pointcloud_format=FORMAT_XYZRGB)
 
 	for idx, depth_path in tqdm(enumerate(depth_paths), total=len(depth_paths), leave=False):
 		timestamp = color_paths[idx][0].astype(np.float64)
@@ -62,6 +66,13 @@ def extract_pointcloud(input_path, output_path, output_format, num_tiles):
 	tile_writer.close()
 
 
+# returns the inclusion list for a scene, in which epochs can be given by their name (e.g., "cafe1-1") or together with their scene (e.g., "cafe/cafe1-1")
+def get_scene_file_list(file_list, scene_name):
+	if file_list is None:
+		return None
+	else:
+		return [entry.split('/')[-1] for entry in file_list if '/' not in entry or entry.split('/')[0] == scene_name]
+
 def extract_pointclouds(input_path, output_folder, output_format, exclusion_list, inclusion_list, num_tiles):
 	if not os.path.exists(input_path):
 		return
@@ -71,7 +82,7 @@ def extract_pointclouds(input_path, output_folder, output_format, exclusion_list
 
 	processing_order = []
 	for scene in os.scandir(os.path.join(input_path, 'raw')):
-		processing_order.extend(get_processing_order(scene.path, inclusion_list, exclusion_list))
+		processing_order.extend(get_processing_order(scene.path, get_scene_file_list(inclusion_list, scene.name), exclusion_list))
 
 	for entry in tqdm(processing_order):
 		scene_name = entry.name[:-3]
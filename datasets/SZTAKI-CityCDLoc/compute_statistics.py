@@ -4,7 +4,7 @@ import laspy
 import numpy as np
 from tqdm import tqdm
 from utils.evaluation import Statistics, avg_neighbor_distance, print_dataset_statistics
-from utils.io import read_pointcloud_for_evaluation
+from utils.io import read_pointcloud_for_evaluation, las_local_offsets
 
 
 parser = argparse.ArgumentParser(prog='SZTAKI-CityCDLoc - Dataset Statistics Computation')
@@ -33,7 +33,8 @@ def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
 		epoch_2_path = [file.path for file in os.scandir(scene.path) if file.name.startswith('epoch_2')][0]
 		pointcloud = laspy.read(epoch_2_path)
 		scales = pointcloud.header.scales
-		pointcloud = np.column_stack((pointcloud.X * scales[0], pointcloud.Y * scales[1], pointcloud.Z * scales[2], pointcloud.user_data))
+		offsets = las_local_offsets(pointcloud.header)
+		pointcloud = np.column_stack((pointcloud.X * scales[0] + offsets[0], pointcloud.Y * scales[1] + offsets[1], pointcloud.Z * scales[2] + offsets[2], pointcloud.user_data))
 		statistics[Statistics.NUM_POINTS].append(len(pointcloud))
 		statistics[Statistics.AVG_DISTANCE].append(avg_neighbor_distance(pointcloud[:, 0:3]))
 		statistics[Statistics.CHANGE_POINTS].append(np.count_nonzero(pointcloud[:,3]) / len(pointcloud))
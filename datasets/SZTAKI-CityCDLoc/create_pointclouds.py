@@ -27,40 +27,39 @@ offset = np.array([651026, 238332, 0])
 def extract_pointcloud(input_path, output_format):
 	scene_name = os.path.basename(input_path)
 	gps_file_path = [file.path for file in os.scandir(input_path) if file.name.endswith('.csv')][0]
-	with open(gps_file_path) as gps_file:
-		reader = csv.reader(gps_file, delimiter=';')
+	# the point cloud of each scan is written directly
+	def transformed_scans():
+		with open(gps_file_path) as gps_file:
+			reader = csv.reader(gps_file, delimiter=';')
 		
-		pointcloud_parts = []
-		for row in tqdm(reader, leave=False):
-			file_name = row[0].split('.')[0]
-			file_path = os.path.join(input_path, 'GT change detection', row[0])
+			for row in tqdm(reader, leave=False):
+				file_name = row[0].split('.')[0]
+				file_path = os.path.join(input_path, 'GT change detection', row[0])
 
-			if not os.path.exists(file_path):
-				continue
+				if not os.path.exists(file_path):
+					continue
 
-			alignment_path = os.path.join(input_path, 'GT registration', file_name + '.txt')
-			alignment_matrix = np.loadtxt(alignment_path)
-			transformation_matrix = np.eye(4)
-			transformation_matrix[:3, 3] = np.array([float(row[1].replace(',', '.')), float(row[2].replace(',', '.')), z_shifts[scene_name]])
-			transformation_matrix[:3, :3] = R.from_euler('z', angles=rotations[scene_name], degrees=True).as_matrix()
-			transformation_matrix = transformation_matrix @ alignment_matrix
+				alignment_path = os.path.join(input_path, 'GT registration', file_name + '.txt')
+				alignment_matrix = np.loadtxt(alignment_path)
+				transformation_matrix = np.eye(4)
+				transformation_matrix[:3, 3] = np.array([float(row[1].replace(',', '.')), float(row[2].replace(',', '.')), z_shifts[scene_name]])
+				transformation_matrix[:3, :3] = R.from_euler('z', angles=rotations[scene_name], degrees=True).as_matrix()
+				transformation_matrix = transformation_matrix @ alignment_matrix
 
-			pointcloud = PointCloud.from_path(file_path)
-			position = pointcloud[('x', 'y', 'z')].numpy()
-			position = np.hstack((position, np.ones((position.shape[0], 1))))
-			position = np.dot(position, transformation_matrix.T)[:, 0:3] - offset
+				pointcloud = PointCloud.from_path(file_path)
+				position = pointcloud[('x', 'y', 'z')].numpy()
+				position = np.hstack((position, np.ones((position.shape[0], 1))))
+				position = np.dot(position, transformation_matrix.T)[:, 0:3] - offset
 
-			# The changes are encoded as colors
-			colors = PointCloud.decode_rgb(pointcloud[('rgb')].numpy())
-			changes = np.zeros((len(colors)))
-			changes[colors[:, 0] > 0] = 1      # red means dynamic change
-			changes[colors[:, 1] > 0] = 2      # green means vegetation change
+				# The changes are encoded as colors
+				colors = PointCloud.decode_rgb(pointcloud[('rgb')].numpy())
+				changes = np.zeros((len(colors)))
+				changes[colors[:, 0] > 0] = 1      # red means dynamic change
+				changes[colors[:, 1] > 0] = 2      # green means vegetation change
 
-			pointcloud = np.column_stack([position, changes])
-			pointcloud_parts.append(pointcloud)
+				yield np.column_stack([position, changes])
 
-	pointcloud = np.row_stack(pointcloud_parts)
-	write_pointcloud(pointcloud, input_path, 'epoch_2', output_format, FORMAT_XYZC, las_offsets=offset)
+	write_pointcloud(transformed_scans(), input_path, 'epoch_2', output_format, FORMAT_XYZC, las_offsets=offset)
 
 
 def extract_pointclouds(input_path, output_format):
@@ -15,7 +15,7 @@ from utils.pointcloud_creation import RGBDReconstruction, get_pose_matrix_from_p
 parser = argparse.ArgumentParser(prog='TorWIC-Mapping - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to [input_path]/pointclouds)')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of epochs to exclude for reconstruction, e.g., "Scenario_1-1"', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of epochs to include (overwrites exclusion list)', nargs='+', type=str)
 parser.add_argument('--num_tiles', help='The number of tiles into which the scene should be divided in x and y direction', nargs=2, default=[2,2])
@@ -34,7 +34,7 @@ def extract_pointcloud(input_path, output_path, output_format, num_tiles):
 	poses = np.loadtxt(os.path.join(input_path, 'poses.txt'))
 	
 	# The depth maps are quite noisy, especially at larger distances. According to the specs of the camera, the error is < 2% for up to 2m.
-	rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[640, 360], depth_threshold=2)
+	rgbd_reconstruction = RGBDReconstruction(intrinsics, image_resolution=[640, 360], depth_threshold=2, pointcloud_format=FORMAT_XYZRGB)
 	
 	tile_writer = TileWriter(output_path,
 			  pointcloud_format=FORMAT_XYZRGB,
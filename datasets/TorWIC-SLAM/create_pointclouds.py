@@ -20,6 +20,9 @@ parser.add_argument('--exclusion_list', help='A list of epochs to exclude for re
 parser.add_argument('--inclusion_list', help='A list of epochs to include (overwrites exclusion list)', nargs='+', type=str)
 parser.add_argument('--num_tiles', help='The number of tiles into which the scene should be divided in x and y direction', nargs=2, type=int, default=[2,2])
 
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'raw/*/*/'
+
 T_lidar_to_leftcam = np.eye(4)
 T_lidar_to_leftcam[:3,:3] = R.from_quat([-0.6116725, 0.39292797, -0.3567415, 0.58668551]).as_matrix()
 T_lidar_to_leftcam[:3, 3] = np.array([0.12944592, 0.04299934, -0.1137434])
@@ -1,6 +1,5 @@
 import os
 import argparse
-import laspy
 import numpy as np
 import datashader as ds
 import pandas as pd
@@ -8,6 +7,9 @@ import datashader.transfer_functions as tf
 from datashader.utils import export_image
 from tqdm import tqdm
 
+from utils.io import read_point_batch
+from utils.pointcloud_format import FORMAT_XYZ
+
 parser = argparse.ArgumentParser(prog='USyd Campus - Render to Groundplane')
 parser.add_argument('input_path', help='The folder with the extracted pointclouds')
 parser.add_argument('output_folder', help='Path of a folder where the resulting images should be stored')
@@ -16,12 +18,12 @@ parser.add_argument('output_folder', help='Path of a folder where the resulting
 def render_to_image(input_folder, output_path, shift=np.array([0,0])):
 	accumulated_image = None
 	for tile in tqdm(list(os.scandir(input_folder)), leave=False):
-		pointcloud_las = laspy.read(tile.path)
+		pointcloud = read_point_batch(tile.path, FORMAT_XYZ)    # LAS/LAZ or Parquet tiles
 			
-		if len(pointcloud_las.x) < 2:
+		if len(pointcloud) < 2:
 			continue
 
-		dataframe = pd.DataFrame({'x': pointcloud_las.x + shift[0], 'y': pointcloud_las.y + shift[0]})
+		dataframe = pd.DataFrame({'x': pointcloud['X'] + shift[0], 'y': pointcloud['Y'] + shift[0]})
 		canvas = ds.Canvas(plot_width=2000, plot_height=2000, x_range=(-300,1200), y_range=(-800,400))
 		agg = canvas.points(dataframe, 'x', 'y')
 		img = tf.shade(agg, cmap='red', how='log')
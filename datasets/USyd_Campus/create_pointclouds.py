@@ -18,11 +18,16 @@ from utils.pointcloud_creation import get_pose_matrix, project_points_to_image,
 parser = argparse.ArgumentParser(prog='USyd Campus - Point Cloud Creation')
 parser.add_argument('input_path', help='The root path of the dataset')
 parser.add_argument('--output_folder', help='The folder into which the pointclouds should be written (defaults to "[input_path]/pointclouds")')
-parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ supported)', type=FileFormat, choices=['LAS', 'LAZ'], default=FileFormat.LAZ)
+parser.add_argument('--output_format', help='The format of the output point cloud (only LAS/LAZ/PARQUET supported)', type=FileFormat, choices=['LAS', 'LAZ', 'PARQUET'], default=FileFormat.LAZ)
 parser.add_argument('--exclusion_list', help='A list of epoch names to exclude for reconstruction (e.g., Week23_2018-08-15).', nargs='*', type=str, default=[])
 parser.add_argument('--inclusion_list', help='A list of file names to include (overwrites the exclusion list)', nargs='+', type=str)
 parser.add_argument('--project_images', help='Projects the RGB images onto the point cloud to get per-point colors', action='store_true')
 parser.add_argument('--tile_size', help='The size of the tiles into which the scene is divided in x and y direction', default=100, type=int)
+parser.add_argument('--resume', help='Continues an interrupted extraction from the last checkpoint in the output folder', action='store_true')
+parser.add_argument('--checkpoint_interval', help='The interval in seconds in which the extraction progress is stored for resuming it later (checkpoints are only stored with this option or --resume, which defaults to 600 seconds)', default=None, type=float)
+
+# The epochs (relative to input_path) that can be processed independently of each other, e.g., as separate jobs of process_datasets.py
+EPOCHS = 'rosbags/*/'
 
 # As these do not change, we just hardcode them here
 T_lidar_to_base = np.eye(4)
@@ -132,7 +137,7 @@ def read_camera_data(input_folder, bag_path):
 	return cameras
 
 
-def extract_pointcloud_with_intensity(input_path, output_path, output_format, tile_size):
+def extract_pointcloud_with_intensity(input_path, output_path, output_format, tile_size, checkpoint_interval=None, resume=False):
 	bag_path = glob.glob(os.path.join(input_path, '*.bag'))[0]
 	
 	timestamps, poses = extract_poses(bag_path, typestore, '/vn100/odometry')
@@ -144,11 +149,15 @@ def extract_pointcloud_with_intensity(input_path, output_path, output_format, ti
 						  pointcloud_format=FORMAT_XYZI,
 						  file_format=output_format,
 						  bbox=np.array([np.min(poses[:, :2], axis=0), np.max(poses[:, :2], axis=0)]), 
-						  tile_size=tile_size)
+						  tile_size=tile_size,
+						  checkpoint_interval=checkpoint_interval,
+						  resume=resume)
 	
 	with Reader(bag_path) as reader:
 		points_connections = [x for x in reader.connections if x.topic == '/velodyne/front/points']
-		for connection, timestamp, rawdata in tqdm(reader.messages(connections=points_connections), leave=False):
+		# the position of a checkpoint is the timestamp of the first message that has not been processed yet
+		for connection, timestamp, rawdata in tqdm(reader.messages(connections=points_connections, start=tile_writer.resume_position), leave=False):
+			tile_writer.checkpoint(timestamp)
 			if timestamp < min_timestamp or timestamp > max_timestamp:
 				continue
 
@@ -166,7 +175,7 @@ def extract_pointcloud_with_intensity(input_path, output_path, output_format, ti
 	tile_writer.close()
 
 
-def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_size):
+def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_size, checkpoint_interval=None, resume=False):
 	bag_path = glob.glob(os.path.join(input_path, '*.bag'))[0]
 
 	timestamps, poses = extract_poses(bag_path, typestore, '/vn100/odometry')
@@ -176,7 +185,9 @@ def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_
 						  pointcloud_format=FORMAT_XYZRGB,
 						  file_format=output_format,
 						  bbox=np.array([np.min(poses[:, :2], axis=0), np.max(poses[:, :2], axis=0)]), 
-						  tile_size=tile_size)
+						  tile_size=tile_size,
+						  checkpoint_interval=checkpoint_interval,
+						  resume=resume)
 	
 	with Reader(bag_path) as reader:
 		# register additional message types (tf2_msgs/msg/TFMessage and gmsl_frame_msg/msg/FrameInfo are not defined yet)
@@ -196,7 +207,10 @@ def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_
 
 		points_connections = [x for x in reader.connections if x.topic == '/velodyne/front/points']
 
-		for connection, timestamp, rawdata in tqdm(reader.messages(connections=points_connections), leave=False):
+		# the position of a checkpoint is the timestamp of the first message that has not been processed yet
+		# (when resuming, the cameras still read their videos from the start, as seeking within them is unreliable)
+		for connection, timestamp, rawdata in tqdm(reader.messages(connections=points_connections, start=tile_writer.resume_position), leave=False):
+			tile_writer.checkpoint(timestamp)
 			if timestamp < min_valid_timestamp or timestamp > max_valid_timestamp:
 				continue
 
@@ -225,7 +239,7 @@ def extract_pointcloud_with_colors(input_path, output_path, output_format, tile_
 		tile_writer.close()
 
 
-def extract_pointclouds(input_path, output_path, output_format, exclusion_list, inclusion_list, project_images, tile_size):
+def extract_pointclouds(input_path, output_path, output_format, exclusion_list, inclusion_list, project_images, tile_size, checkpoint_interval=None, resume=False):
 	if not os.path.exists(input_path):
 		return
 
@@ -243,9 +257,9 @@ def extract_pointclouds(input_path, output_path, output_format, exclusion_list,
 		os.makedirs(output_folder, exist_ok=True)
 
 		if project_images:
-			extract_pointcloud_with_colors(entry.resolve(), output_folder, output_format, tile_size)
+			extract_pointcloud_with_colors(entry.resolve(), output_folder, output_format, tile_size, checkpoint_interval, resume)
 		else:
-			extract_pointcloud_with_intensity(entry.resolve(), output_folder, output_format, tile_size)
+			extract_pointcloud_with_intensity(entry.resolve(), output_folder, output_format, tile_size, checkpoint_interval, resume)
 
 
 if __name__ == '__main__':
@@ -256,5 +270,7 @@ if __name__ == '__main__':
 				 args.exclusion_list,
 				 args.inclusion_list,
 				 args.project_images,
-				 args.tile_size)
+				 args.tile_size,
+				 args.checkpoint_interval,
+				 args.resume)
 
@@ -5,7 +5,7 @@ from tqdm import tqdm
 from scipy.spatial.transform import Rotation as R
 
 from utils.pointcloud_format import FORMAT_XYZC
-from utils.io import FileFormat, write_pointcloud
+from utils.io import FileFormat, write_pointcloud, read_txt_columns
 from utils.pointcloud_creation import get_pose_matrix_from_pose
 
 
@@ -16,18 +16,19 @@ parser.add_argument('--output_format', help='The format of the output point clou
 
 
 def extract_pointcloud(epoch_parts, output_folder, output_filename, output_format):
-	parts = []
-	for scan_path, pose_path in epoch_parts:
-		pointcloud = np.loadtxt(scan_path, delimiter=',')
-		pose = np.loadtxt(pose_path, delimiter=',')
-
-		rotation = R.from_euler('xyz', angles=pose[3:]).as_quat()
-		pose_matrix = get_pose_matrix_from_pose([*pose[0:3], *rotation])
-		positions = np.vstack((pointcloud[:, 0:3].T, np.ones(pointcloud.shape[0])))
-		positions = (pose_matrix @ positions).T
-		parts.append(np.column_stack([positions[:, 0:3], pointcloud[:, 4]]))
-
-	write_pointcloud(np.vstack(parts), output_folder, output_filename, output_format, FORMAT_XYZC)
+	# the scans are transformed and written one after the other
+	def transformed_scans():
+		for scan_path, pose_path in epoch_parts:
+			pointcloud = read_txt_columns(scan_path, skiprows=0, delimiter=',')
+			pose = np.loadtxt(pose_path, delimiter=',')
+
+			rotation = R.from_euler('xyz', angles=pose[3:]).as_quat()
+			pose_matrix = get_pose_matrix_from_pose([*pose[0:3], *rotation])
+			positions = np.vstack((pointcloud[:, 0:3].T, np.ones(pointcloud.shape[0])))
+			positions = (pose_matrix @ positions).T
+			yield np.column_stack([positions[:, 0:3], pointcloud[:, 4]])
+
+	write_pointcloud(transformed_scans(), output_folder, output_filename, output_format, FORMAT_XYZC)
 
 
 def extract_pointclouds(input_path, output_folder, output_format):
@@ -1,9 +1,9 @@
 import os
 import argparse
-import plyfile
 import numpy as np
 from tqdm import tqdm
 from utils.evaluation import Statistics, avg_neighbor_distance, print_dataset_statistics
+from utils.io import read_ply_fields
 
 parser = argparse.ArgumentParser(prog='Urb3DCD-cls - Dataset Statistics Computation')
 parser.add_argument('input_path', help='The root folder of the dataset')
@@ -30,8 +30,8 @@ def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
 	# As custom parsing is required for the PLY files, we don't use utils.evaluation.compute_dataset_statistics here
 	statistics = {Statistics.NUM_POINTS:[], Statistics.AVG_DISTANCE:[], Statistics.CHANGE_POINTS:[]}
 	for scan in tqdm(processing_order, leave=leave_progress_bar):
-		pointcloud_raw = plyfile.PlyData.read(scan)
-		pointcloud = np.vstack([pointcloud_raw['params']['x'], pointcloud_raw['params']['y'], pointcloud_raw['params']['z']]).transpose()
+		pointcloud_raw = read_ply_fields(scan, element='params')    # memory-mapped, only the accessed properties are read
+		pointcloud = np.column_stack([pointcloud_raw['x'], pointcloud_raw['y'], pointcloud_raw['z']])
 		
 		if len(pointcloud) <= 10:
 			continue
@@ -40,7 +40,7 @@ def compute_statistics(input_folder, output_log_path, leave_progress_bar=False):
 		statistics[Statistics.AVG_DISTANCE].append(avg_neighbor_distance(pointcloud))
 
 		if scan.endswith('PC1.ply'):
-			changes = pointcloud_raw['params']['pred']
+			changes = pointcloud_raw['pred']
 			num_changes = np.count_nonzero(changes > 0)
 			change_ratio = num_changes / len(pointcloud)
 			statistics[Statistics.CHANGE_POINTS].append(change_ratio)
@@ -1,77 +1,248 @@
 import os
+import sys
+import time
+import shlex
 import argparse
-import yaml
 import subprocess
+from dataclasses import asdict
 from tqdm import tqdm
+from utils.processing import StepStatus, load_processing_config
+from utils.scheduler import DatasetScheduler, RuntimeHistory
+from utils.build_cache import BuildCache
+from utils.step_runner import create_step_runner, execute_step
+from utils.telemetry import RunReport, StepReport, format_seconds
+from utils.job_queue import JobQueue, run_worker, DONE
+from utils.estimator import CostModel, measure_inputs, estimate_makespan, estimate_table
+from utils.threads import step_thread_budget, LAZ_WORKERS_VARIABLE
 
 parser = argparse.ArgumentParser(prog='Script for processing multiple datasets')
-parser.add_argument('config_path', help='Path to a configuration YAML, specifying how to process which datasets')
-
-
-def placeholder_replacement(input, dataset_name, dataset_root, has_create_pointcloud_script):
-    result = input.replace('${{dataset_name}}', dataset_name)
-    result = result.replace('${{dataset_root}}', dataset_root)
-    result = result.replace('${{pointclouds}}', 'pointclouds' if has_create_pointcloud_script else '')
-    return result
-
-def get_command_for_processing_step(step, dataset_name, dataset_root, has_create_pointcloud_script):
-    script_name = step['script']
-    script_path_parts = ['datasets', dataset_name, script_name]
-    script_path = os.path.join(*script_path_parts) + '.py'
-    if not os.path.exists(script_path):
-        return None
-
-    command_parts = ['python', '-m', '.'.join(script_path_parts)]
-    for argument in step['arguments']:
-        argument_value = step['arguments'][argument]
-        if isinstance(argument_value, str):
-            argument_value = placeholder_replacement(argument_value, 
-                                                    dataset_name, 
-                                                    dataset_root, 
-                                                    has_create_pointcloud_script)
-        else:
-            argument_value = str(argument_value)
-            
-        if argument.startswith('--'):
-            command_parts.append(argument)
-        command_parts.append(argument_value)
-    return command_parts
+parser.add_argument('config_path', help='Path to a configuration YAML, specifying how to process which datasets (not required for --worker)', nargs='?')
+parser.add_argument('--jobs', help='The number of CPU cores to use for processing datasets concurrently (the steps of each dataset are still executed in order). Each dataset occupies the number of cores given by its cpu_weight.', default=1, type=float)
+parser.add_argument('--memory', help='The memory budget in GB for processing datasets concurrently. Each dataset occupies the amount given by its memory_weight (unlimited if not specified).', default=None, type=float)
+parser.add_argument('--state_folder', help='Folder for storing recorded runtimes, the build cache, and, when processing datasets concurrently, the output of each dataset', default='.processing')
+parser.add_argument('--force', help='Executes all processing steps, even if their outputs are up to date', action='store_true')
+parser.add_argument('--runner', help='subprocess: executes each step in a new Python interpreter (isolated). inprocess: executes the steps in a pool of worker processes that are reused across steps and datasets (avoids repeated interpreter startup and imports).', choices=['subprocess', 'inprocess'], default='subprocess')
+parser.add_argument('--report', help='Path of the JSON-lines file to which the resource usage of each step is written (defaults to [state_folder]/reports/run_[timestamp].jsonl)', default=None)
+parser.add_argument('--report_rows', help='The number of most expensive steps shown in the summary table at the end', default=20, type=int)
+parser.add_argument('--resume', help='Resumes interrupted steps from their last checkpoint (only for scripts that support --resume), instead of starting them from scratch', action='store_true')
+parser.add_argument('--hash_inputs', help='Detects changed input files by hashing their contents instead of comparing their sizes and modification times', action='store_true')
+parser.add_argument('--coordinator', help='Distributed mode: writes the processing steps into a job queue at the given path (on a filesystem shared by all nodes) and waits until workers have processed them', metavar='QUEUE_PATH', default=None)
+parser.add_argument('--worker', help='Distributed mode: claims and executes jobs from the job queue at the given path until it is finished', metavar='QUEUE_PATH', default=None)
+parser.add_argument('--local_workers', help='Distributed mode: the number of worker processes the coordinator starts on the local machine', default=0, type=int)
+parser.add_argument('--plan', help='Only prints the resolved processing steps (and epochs) of all datasets in the order in which they would be started, without executing them', action='store_true')
+parser.add_argument('--estimate', help='Only predicts the wall time, peak memory, and output size of all processing steps from the sizes of their inputs, calibrated with the run reports of previous runs in [state_folder]/reports', action='store_true')
+parser.add_argument('--threads', help='The number of threads each processing step may use in total (scipy workers, OpenCV, open3d, BLAS/OpenMP, ...). Defaults to the threads specified under resources in the configuration, else, when processing concurrently, to the cpu_weight of the dataset. Otherwise, the steps are not limited.', default=None, type=int)
+parser.add_argument('--laz_workers', help='The number of threads each processing step uses for compressing LAZ files (defaults to its thread budget, see --threads). With 1, LAZ files are compressed sequentially.', default=None, type=int)
+parser.add_argument('--lease_duration', help='Distributed mode: seconds after which a job is re-queued if its worker stopped sending heartbeats', default=120, type=float)
+parser.add_argument('--worker_timeout', help='Distributed mode: seconds after which the coordinator stops if no worker is active, e.g., if no worker has been started', default=600, type=float)
+
+
+def default_report_path(state_folder):
+    return os.path.join(state_folder, 'reports', time.strftime('run_%Y-%m-%d_%H-%M-%S.jsonl'))
+
+def print_summary(run_report, report_path, max_rows):
+    print(run_report.summary_table(max_rows=max_rows))
+    print('Run report written to', report_path)
+
+
+# Prints the processing steps of all datasets. Only the configuration and the scripts' EPOCHS declarations are read, no heavy libraries are imported.
+def print_plan(args, processing_order):
+    runtime_history = RuntimeHistory(os.path.join(args.state_folder, 'runtimes.json'))
+    scheduler = DatasetScheduler(num_cpus=args.jobs, memory_budget=args.memory, runtime_history=runtime_history)
+    num_steps = 0
+    for dataset in scheduler.sort_jobs(processing_order):
+        expected_runtime = runtime_history.expected_runtime(dataset)
+        print(dataset.name + ' (root: ' + dataset.dataset_root + ', cpu_weight: ' + str(dataset.cpu_weight) + ', memory_weight: ' + str(dataset.memory_weight) +
+              ', threads: ' + (str(dataset.steps[0].threads) if dataset.steps and dataset.steps[0].threads is not None else 'unlimited') +
+              ', expected runtime: ' + ('unknown' if expected_runtime is None else format_seconds(expected_runtime)) + ')')
+        for stage in dataset.stages():
+            if stage[0].epoch is not None:
+                print('  ' + stage[0].script + ' (' + str(len(stage)) + ' epochs)')
+            for step in stage:
+                indentation = '    ' if step.epoch is not None else '  '
+                print(indentation + shlex.join(step.command()))
+            num_steps += len(stage)
+    print(len(processing_order), 'datasets,', num_steps, 'steps')
+
+
+# Prints the estimated costs of all processing steps, and the estimated total wall time with the given --jobs and --memory.
+# Only the headers of the input files are read, and the estimates are derived from previous runs of the same (or equally named) scripts.
+def print_estimate(args, processing_order):
+    build_cache = BuildCache(os.path.join(args.state_folder, 'build_cache'))
+    cost_model = CostModel.from_report_folder(os.path.join(args.state_folder, 'reports'))
+    step_estimates = {}
+    for dataset in tqdm(processing_order, desc='Measuring inputs'):
+        for step in dataset.steps:
+            step_estimates[id(step)] = cost_model.estimate(step, measure_inputs(build_cache.input_files(step)))
+
+    print(estimate_table(processing_order, step_estimates))
+    makespan = estimate_makespan(processing_order, step_estimates, num_cpus=args.jobs, memory_budget=args.memory)
+    num_unknown = sum(estimate.wall_time is None for estimate in step_estimates.values())
+    print('Estimated total wall time with --jobs ' + str(args.jobs) + (' and --memory ' + str(args.memory) if args.memory is not None else '') + ': ' + (format_seconds(makespan) if num_unknown < len(step_estimates) else 'unknown'))
+    if num_unknown > 0:
+        print(num_unknown, 'of', len(step_estimates), 'steps have never been executed (neither have equally named scripts of other datasets) and are not included in the estimate')
+
+
+# Processes all datasets on this machine
+def process_locally(args, processing_order):
+    runtime_history = RuntimeHistory(os.path.join(args.state_folder, 'runtimes.json'))
+    scheduler = DatasetScheduler(num_cpus=args.jobs, memory_budget=args.memory, runtime_history=runtime_history)
+    concurrent = args.jobs > 1
+    log_folder = os.path.join(args.state_folder, 'logs')
+    if concurrent:
+        os.makedirs(log_folder, exist_ok=True)
+
+    build_cache = BuildCache(os.path.join(args.state_folder, 'build_cache'), hash_contents=args.hash_inputs)
+    step_runner = create_step_runner(args.runner, num_workers=args.jobs)
+    report_path = args.report if args.report is not None else default_report_path(args.state_folder)
+    run_report = RunReport(report_path)
+
+    # When processing datasets concurrently, the output of the scripts is written to one log file per dataset (and epoch)
+    def run_step(step):
+        log_name = step.dataset_name if step.epoch is None else step.dataset_name + '_' + step.epoch.replace('/', '_')
+        log_path = os.path.join(log_folder, log_name + '.log') if concurrent else None
+        step_report = execute_step(step, step_runner, build_cache, log_path, force=args.force)
+        run_report.add(step_report)
+        if step_report.status == StepStatus.SKIPPED:
+            tqdm.write(step.dataset_name + ': ' + step.key + ' is up to date')
+        return StepStatus(step_report.status)
+
+    progress_bar = tqdm(total=len(processing_order))
+    def on_start(job):
+        tqdm.write('Processing ' + job.name)
+    def on_finish(job, failed_step):
+        if failed_step is not None:
+            tqdm.write('Processing ' + job.name + ' failed in step ' + failed_step.key)
+        progress_bar.update()
+
+    failures = scheduler.run(processing_order, run_step, on_start=on_start, on_finish=on_finish)
+    progress_bar.close()
+    step_runner.close()
+
+    print_summary(run_report, report_path, args.report_rows)
+    print('Effective concurrency: up to', scheduler.peak_steps, 'steps with', scheduler.peak_threads, 'threads in total on', os.cpu_count(), 'cores')
+    for job, failed_step in failures:
+        print(job.name + ': ' + failed_step.key + ' failed, remaining steps were skipped')
+
+
+# Writes all processing steps into a new job queue, optionally starts local workers, and waits until the queue is finished.
+# The steps of a stage of a dataset depend on all steps of its previous stage, and datasets with a longer expected runtime get a higher priority.
+# The queue file is removed once all workers have exited. An existing queue file is only replaced if no worker uses it anymore.
+def coordinate(args, processing_order):
+    if os.path.exists(args.coordinator):
+        previous_queue = JobQueue(args.coordinator, lease_duration=args.lease_duration)
+        active_workers = previous_queue.active_workers()
+        previous_queue.close()
+        if active_workers > 0:
+            print('The job queue', args.coordinator, 'is still used by', active_workers, 'workers')
+            exit(1)
+        os.remove(args.coordinator)
+    queue = JobQueue(args.coordinator, lease_duration=args.lease_duration)
+    runtime_history = RuntimeHistory(os.path.join(args.state_folder, 'runtimes.json'))
+    num_jobs = 0
+    for dataset in processing_order:
+        expected_runtime = runtime_history.expected_runtime(dataset)
+        priority = sys.float_info.max if expected_runtime is None else expected_runtime
+        previous_jobs = []
+        for stage in dataset.stages():
+            previous_jobs = [queue.add_job(step, depends_on=previous_jobs, priority=priority) for step in stage]
+            num_jobs += len(stage)
+
+    worker_arguments = ['--worker', args.coordinator, '--state_folder', args.state_folder, '--runner', args.runner, '--lease_duration', str(args.lease_duration)]
+    worker_arguments += ['--force'] if args.force else []
+    worker_arguments += ['--hash_inputs'] if args.hash_inputs else []
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__)] + worker_arguments) for _ in range(args.local_workers)]
+
+    progress_bar = tqdm(total=num_jobs)
+    last_active_time = time.monotonic()
+    while not queue.is_finished():
+        if queue.active_workers() > 0:
+            last_active_time = time.monotonic()
+        elif time.monotonic() - last_active_time > args.worker_timeout:
+            progress_bar.close()
+            print('No worker has been active for', args.worker_timeout, 'seconds. Start workers with --worker', args.coordinator, 'or use --local_workers.')
+            queue.close()
+            os.remove(args.coordinator)
+            exit(1)
+        queue.requeue_expired()
+        counts = queue.status_counts()
+        progress_bar.n = num_jobs - counts['pending'] - counts['running']
+        progress_bar.set_postfix(counts)
+        time.sleep(2)
+    progress_bar.n = num_jobs
+    progress_bar.close()
+    for worker in workers:
+        worker.wait()
+
+    # collect the reports of the workers into one run report
+    report_path = args.report if args.report is not None else default_report_path(args.state_folder)
+    run_report = RunReport(report_path)
+    for step, status, result in queue.results():
+        if result is not None and 'dataset' in result:
+            step_report = StepReport(**result)
+            run_report.add(step_report)
+            if step_report.status == StepStatus.SUCCEEDED:
+                runtime_history.record(step, step_report.wall_time)
+        elif status != DONE:
+            print(step.dataset_name + ': ' + step.key + ':', result['error'] if result else status)
+    runtime_history.save()
+    print_summary(run_report, report_path, args.report_rows)
+
+    # the workers on other nodes exit after they noticed that the queue is finished
+    while queue.active_workers() > 0:
+        time.sleep(2)
+    queue.close()
+    os.remove(args.coordinator)
+
+
+def work(args):
+    # the coordinator removes the queue when it is finished, so connecting to it must not create a new one
+    if not os.path.exists(args.worker):
+        print('The job queue', args.worker, 'does not exist')
+        exit(1)
+    queue = JobQueue(args.worker, lease_duration=args.lease_duration)
+    build_cache = BuildCache(os.path.join(args.state_folder, 'build_cache'), hash_contents=args.hash_inputs)
+    step_runner = create_step_runner(args.runner)
+
+    def execute_job(step):
+        if args.threads is not None:
+            step.threads = args.threads
+        print('Processing', step.dataset_name, step.key, '(threads: ' + (str(step.threads) if step.threads is not None else 'unlimited') + ')')
+        step_report = execute_step(step, step_runner, build_cache, force=args.force)
+        return step_report.status != StepStatus.FAILED, asdict(step_report)
+
+    run_worker(queue, execute_job)
+    step_runner.close()
+    queue.close()
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    with open(args.config_path, 'r') as config_file:
-        config = list(yaml.safe_load_all(config_file))
-        default_config = None if len(config) == 1 else config[0]
-        datasets = config[0] if len(config) == 1 else config[1]
-
-    processing_order = []
-    for dataset_name in datasets:
-        dataset = datasets[dataset_name]
-        if (dataset != 'default') and ('dataset_root' in dataset):
-            dataset_root = dataset['dataset_root']
-        else:
-            if default_config is None:
-                print('Expected default configuration, but none was specified')
-                exit()
-            dataset_root = default_config['dataset_root']
-        
-        dataset_root = dataset_root.replace('${{dataset_name}}', dataset_name)
-        has_create_pointcloud_script = os.path.exists(os.path.join('datasets', dataset_name, 'create_pointclouds.py'))
-
-        processing_order.append({'name' : dataset_name, 'scripts' : []})
-        config = default_config['processing_steps'] if dataset == 'default' else datasets[dataset_name]['processing_steps']
-        for step in config:
-            command = get_command_for_processing_step(step, dataset_name, dataset_root, has_create_pointcloud_script)
-            if command is not None:
-                processing_order[-1]['scripts'].append(command)
-
-    for dataset in tqdm(processing_order):
-        tqdm.write('Processing ' + dataset['name'])
-        for script in dataset['scripts']:
-            subprocess.call(script)
-
-        
-
-
-         
\ No newline at end of file
+    # the scripts (and the workers started by the coordinator) inherit the environment
+    if args.laz_workers is not None:
+        os.environ[LAZ_WORKERS_VARIABLE] = str(args.laz_workers)
+    if args.worker is not None:
+        work(args)
+        exit()
+
+    if args.config_path is None:
+        parser.error('the config_path is required')
+    processing_order = load_processing_config(args.config_path)
+    # when processing concurrently, each step is limited to its share of the cores (in distributed mode, to its share of a node's cores)
+    concurrent = args.jobs > 1 or args.coordinator is not None
+    num_cpus = args.jobs if args.coordinator is None else os.cpu_count() or 1
+    for dataset in processing_order:
+        threads = step_thread_budget(dataset, num_cpus, concurrent, args.threads)
+        for step in dataset.steps:
+            step.threads = threads
+            if args.resume:
+                step.resume = step.accepts_option('--resume')
+
+    if args.plan:
+        print_plan(args, processing_order)
+    elif args.estimate:
+        print_estimate(args, processing_order)
+    elif args.coordinator is not None:
+        coordinate(args, processing_order)
+    else:
+        process_locally(args, processing_order)
@@ -0,0 +1,21 @@
+import os
+import sys
+import numpy as np
+
+# the tests import the utils package from the root folder of the repository, like the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils.pointcloud_format as pf
+
+
+# Helpers of the tests, which import them with "from conftest import ..."
+
+# Returns a PointBatch with random coordinates between 0 and 100, and random values of 0 or 1 in the other fields
+def random_batch(num_points, pointcloud_format=pf.FORMAT_XYZRGBC, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = rng.uniform(0, 100, (num_points, len(pointcloud_format.fields)))
+    columns[:, 3:] = rng.integers(0, 2, (num_points, len(pointcloud_format.fields) - 3))
+    return pf.PointBatch.from_array(columns, pointcloud_format)
+
+# Sorts the rows of a 2-D array, e.g., to compare the points of a point cloud whose points were reordered
+def sorted_rows(array):
+    return array[np.lexsort(array.T[::-1])]
@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+import utils.pointcloud_format as pf
+from utils.io import FileFormat, write_pointcloud, EVALUATION_CACHE_FOLDER
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The compute_statistics scripts with the options of the evaluation cache
+CACHED_STATISTICS_DATASETS = ['AHK_1', 'AHK_2', 'CoastScan_Combined', 'Hessigheim3D', 'Kijkduin', 'M3C2-EP', 'Rotmoos']
+
+
+# Executes a dataset script like process_datasets.py does
+def run_script(dataset_name, script, arguments):
+    return subprocess.run([sys.executable, '-m', '.'.join(['datasets', dataset_name, script])] + arguments, cwd=REPOSITORY_ROOT, capture_output=True, text=True)
+
+
+@pytest.mark.parametrize('dataset_name', CACHED_STATISTICS_DATASETS)
+def test_compute_statistics_arguments(tmp_path, dataset_name):
+    # the scripts return early for a missing dataset, after the command line has been mapped to their entry function
+    process = run_script(dataset_name, 'compute_statistics', [str(tmp_path / 'missing'), '--evaluation_cache', '--evaluation_cache_size', '1'])
+    assert process.returncode == 0, process.stderr
+
+def test_compute_statistics_ahk_2(tmp_path):
+    # two epochs of one region with 500 points each
+    rng = np.random.default_rng(0)
+    for epoch in ['2019', '2020']:
+        os.makedirs(tmp_path / epoch)
+        points = pf.PointBatch.from_array(rng.uniform(0, 10, (500, 3)), pf.FORMAT_XYZ)
+        write_pointcloud(points, str(tmp_path / epoch), 'ahk_' + epoch + '_rockglacier', FileFormat.LAZ, pf.FORMAT_XYZ)
+
+    # the second run reads the point clouds from the evaluation cache in the dataset root, which is not an epoch
+    for arguments in [['--evaluation_cache'], ['--evaluation_cache'], ['--evaluation_cache', '--chunk_points', '200']]:
+        output_log = str(tmp_path / 'statistics.txt')
+        process = run_script('AHK_2', 'compute_statistics', [str(tmp_path), '--output_log', output_log] + arguments)
+        assert process.returncode == 0, process.stderr
+        assert os.path.isdir(tmp_path / EVALUATION_CACHE_FOLDER)
+        with open(output_log, 'r') as log_file:
+            assert 'Number of points:\nMin: 500\nMedian: 500.0\nMax: 500\n' in log_file.read()
+        os.remove(output_log)
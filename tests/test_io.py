@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pytest
+import laspy
+import utils.pointcloud_format as pf
+from utils.io import FileFormat, PointcloudWriter, write_pointcloud, read_point_batch, read_las_in_local_crs, read_txt_columns, count_points, \
+                     count_points_from_header, count_points_for_evaluation, EvaluationCache, read_pointcloud_for_evaluation, \
+                     iterate_pointclouds_for_evaluation
+from conftest import random_batch
+
+
+def write_pcd(path, num_points, height=1, is_dense=True):
+    with open(path, 'wb') as pcd_file:
+        pcd_file.write(('VERSION 0.7\nFIELDS x y z\nSIZE 4 4 4\nTYPE F F F\nCOUNT 1 1 1\nWIDTH ' + str(num_points // height) + '\nHEIGHT ' + str(height) +
+                        '\nVIEWPOINT 0 0 0 1 0 0 0\nPOINTS ' + str(num_points) + '\nIS_DENSE ' + str(int(is_dense)) + '\nDATA binary\n').encode())
+        np.zeros((num_points, 3), dtype='<f4').tofile(pcd_file)
+
+def assert_same_points(result, batch, atol):
+    assert len(result) == len(batch)
+    assert np.allclose(result.xyz(), batch.xyz(), atol=atol)
+    for field in batch.pointcloud_format.fields[3:]:
+        assert np.array_equal(result[field.name], batch[field.name])
+
+
+def test_read_txt_columns_format(tmp_path):
+    values = np.arange(30, dtype=np.float64).reshape(10, 3)
+    path = str(tmp_path / 'values.csv')
+    np.savetxt(path, values, delimiter=',', header='a,b,c', comments='')
+    assert np.array_equal(read_txt_columns(path), values)
+    assert np.array_equal(read_txt_columns(path, usecols=(0, 2), skiprows=1, delimiter=','), values[:, [0, 2]])
+
+    # like for np.loadtxt, a delimiter of None means whitespace
+    path = str(tmp_path / 'values.txt')
+    np.savetxt(path, values, delimiter=' ')
+    assert np.array_equal(read_txt_columns(path, skiprows=0, delimiter=None), values)
+
+def test_read_txt_columns_chunks_and_cache(tmp_path):
+    values = np.random.default_rng(0).uniform(0, 100, (5000, 3))
+    path = str(tmp_path / 'values.txt')
+    np.savetxt(path, values, fmt='%.6f')
+    expected = np.loadtxt(path)
+    assert np.array_equal(read_txt_columns(path, chunk_bytes=4096, num_workers=2), expected)
+
+    assert np.array_equal(read_txt_columns(path, cache=True), expected)
+    assert any('.cache-' in name for name in os.listdir(tmp_path))
+    assert np.array_equal(read_txt_columns(path, cache=True), expected)
+
+def test_txt_round_trip(tmp_path):
+    batch = random_batch(2000)
+    write_pointcloud(batch, str(tmp_path), 'points', FileFormat.TXT, pf.FORMAT_XYZRGBC)
+    columns = read_txt_columns(str(tmp_path / 'points.txt'))
+    assert np.allclose(columns, batch.to_array(), atol=1e-6)
+
+def test_count_points_from_header(tmp_path):
+    write_pcd(str(tmp_path / 'dense.pcd'), 4)
+    write_pcd(str(tmp_path / 'organized.pcd'), 4, height=2)
+    write_pcd(str(tmp_path / 'sparse.pcd'), 4, is_dense=False)
+    assert count_points_from_header(str(tmp_path / 'dense.pcd')) == 4
+    # organized and non-dense point clouds can contain invalid points, which are only removed when reading them
+    assert count_points_from_header(str(tmp_path / 'organized.pcd')) is None
+    assert count_points_from_header(str(tmp_path / 'sparse.pcd')) is None
+    # for them, the points are read instead
+    assert count_points_for_evaluation(str(tmp_path / 'organized.pcd')) == 4
+    assert count_points_for_evaluation(str(tmp_path / 'sparse.pcd')) == 4
+
+@pytest.mark.parametrize('file_format', [FileFormat.LAZ, FileFormat.PLY, FileFormat.TXT])
+def test_pointcloud_writer_blocks(tmp_path, file_format):
+    batch = random_batch(3000)
+    # the blocks are far apart, which the LAS header has to cover (with millimeter precision)
+    batch.columns['X'][1000:] += 1e5
+    with PointcloudWriter(str(tmp_path), 'streamed', file_format, pf.FORMAT_XYZRGBC, las_precision=1000) as writer:
+        for start in range(0, len(batch), 1000):
+            writer.write(batch[start:start + 1000])
+    write_pointcloud(batch, str(tmp_path), 'array', file_format, pf.FORMAT_XYZRGBC, las_precision=1000)
+
+    streamed_path = str(tmp_path / ('streamed.' + file_format.value.lower()))
+    array_path = str(tmp_path / ('array.' + file_format.value.lower()))
+    if file_format == FileFormat.TXT:
+        assert np.array_equal(read_txt_columns(streamed_path), read_txt_columns(array_path))
+    else:
+        assert_same_points(read_point_batch(streamed_path, pf.FORMAT_XYZRGBC), batch, atol=1e-2)
+        assert_same_points(read_point_batch(array_path, pf.FORMAT_XYZRGBC), batch, atol=1e-2)
+
+@pytest.mark.parametrize('file_format', [FileFormat.LAS, FileFormat.LAZ, FileFormat.PLY])
+def test_pointcloud_round_trip(tmp_path, file_format):
+    batch = random_batch(2000)
+    write_pointcloud(batch, str(tmp_path), 'points', file_format, pf.FORMAT_XYZRGBC)
+    path = str(tmp_path / ('points.' + file_format.value.lower()))
+    # PLY stores the coordinates as float32, LAS/LAZ with the default precision of 1e-6
+    assert_same_points(read_point_batch(path, pf.FORMAT_XYZRGBC), batch, atol=1e-4)
+    assert count_points(path) == len(batch)
+
+def test_pointcloud_writer_bbox_hint(tmp_path):
+    batch = random_batch(2000)
+    bbox = np.array([[0., 0., 0.], [100., 100., 100.]])
+    write_pointcloud(iter([batch[:1000], batch[1000:]]), str(tmp_path), 'streamed', FileFormat.LAZ, pf.FORMAT_XYZRGBC, bbox=bbox)
+    write_pointcloud(batch, str(tmp_path), 'array', FileFormat.LAZ, pf.FORMAT_XYZRGBC)
+    assert np.array_equal(read_las_in_local_crs(str(tmp_path / 'streamed.laz')), read_las_in_local_crs(str(tmp_path / 'array.laz')))
+    with laspy.open(str(tmp_path / 'streamed.laz')) as las_file:
+        assert np.allclose([las_file.header.mins, las_file.header.maxs], [batch.xyz().min(axis=0), batch.xyz().max(axis=0)], atol=1e-5)
+
+def test_evaluation_cache(tmp_path):
+    batch = random_batch(3000)
+    write_pointcloud(batch, str(tmp_path), 'points', FileFormat.LAZ, pf.FORMAT_XYZRGBC)
+    path = str(tmp_path / 'points.laz')
+    cache = EvaluationCache(str(tmp_path / 'cache'))
+
+    expected = read_pointcloud_for_evaluation(path)
+    assert np.array_equal(read_pointcloud_for_evaluation(path, cache=cache), expected)
+    assert len(cache.entries()) == 1
+    cached = read_pointcloud_for_evaluation(path, cache=cache)
+    assert np.array_equal(cached, expected)
+    # cache hits are memory-mapped and sliced without copying the points
+    assert isinstance(cached, np.memmap)
+    chunks = list(iterate_pointclouds_for_evaluation([path], 1000, cache=cache))
+    assert all(isinstance(chunk, np.memmap) for chunk in chunks)
+    assert np.array_equal(np.concatenate(chunks), expected)
+
+    # other parameters use another entry, and the least recently used entries are evicted
+    read_pointcloud_for_evaluation(path, cache=cache, remove_duplicates=True)
+    assert len(cache.entries()) == 2
+    cache.max_bytes = max(num_bytes for _, num_bytes, _ in cache.entries())
+    cache.evict()
+    assert len(cache.entries()) == 1
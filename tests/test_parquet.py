@@ -0,0 +1,46 @@
+import numpy as np
+import utils.pointcloud_format as pf
+from utils.io import FileFormat, write_pointcloud, read_point_batch, read_parquet_columns, iterate_parquet, count_points, read_pointcloud_for_evaluation
+from utils.tile_writer import TileWriter
+from conftest import random_batch, sorted_rows
+
+
+def test_parquet_round_trip(tmp_path):
+    batch = random_batch(5000)
+    write_pointcloud(batch, str(tmp_path), 'points', FileFormat.PARQUET, pf.FORMAT_XYZRGBC)
+    path = str(tmp_path / 'points.parquet')
+
+    result = read_point_batch(path, pf.FORMAT_XYZRGBC)
+    # the points are reordered into tile-aligned row groups, but no values are changed
+    assert np.array_equal(sorted_rows(result.to_array()), sorted_rows(batch.to_array()))
+    assert result['red'].dtype == np.uint8
+    assert count_points(path) == len(batch)
+
+    chunks = list(iterate_parquet(path, ['X', 'Y', 'Z'], 1000))
+    assert [len(chunk) for chunk in chunks] == [1000] * 5
+    assert np.array_equal(np.concatenate(chunks), result.xyz())
+
+    evaluation = read_pointcloud_for_evaluation(path, position_offset=np.array([1, 2, 3]))
+    assert np.allclose(evaluation[:, 0:3], result.xyz() + [1, 2, 3])
+    assert np.array_equal(evaluation[:, 3], result['change'])
+
+def test_parquet_bbox_filter(tmp_path):
+    batch = random_batch(20000)
+    write_pointcloud(batch, str(tmp_path), 'points', FileFormat.PARQUET, pf.FORMAT_XYZRGBC)
+    bbox = np.array([[10, 20], [30, 40]])
+    columns = read_parquet_columns(str(tmp_path / 'points.parquet'), ['X', 'Y'], bbox=bbox)
+    inside = (batch['X'] >= 10) & (batch['X'] <= 30) & (batch['Y'] >= 20) & (batch['Y'] <= 40)
+    assert len(columns['X']) == np.count_nonzero(inside)
+    assert np.all((columns['X'] >= 10) & (columns['X'] <= 30))
+
+def test_parquet_tiles(tmp_path):
+    batch = random_batch(10000)
+    tile_writer = TileWriter(str(tmp_path), pf.FORMAT_XYZRGBC, file_format=FileFormat.PARQUET, bbox=np.array([[0., 0.], [100., 100.]]), tile_size=50, write_threshold=3000)
+    tile_writer.add_points(batch[:6000])
+    tile_writer.add_points(batch[6000:].to_array())
+    tile_writer.close()
+
+    tiles = sorted(tmp_path.glob('tile_*.parquet'))
+    assert len(tiles) == 4
+    result = pf.PointBatch.concatenate([read_point_batch(str(tile), pf.FORMAT_XYZRGBC) for tile in tiles])
+    assert np.array_equal(sorted_rows(result.to_array()), sorted_rows(batch.to_array()))
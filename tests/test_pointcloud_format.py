@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+import utils.pointcloud_format as pf
+
+
+def test_point_batch_array_round_trip():
+    array = np.column_stack([np.linspace(0, 1e6, 10), np.arange(10), np.arange(10), np.arange(10) % 256, np.zeros(10), np.ones(10), np.arange(10) % 2])
+    batch = pf.PointBatch.from_array(array, pf.FORMAT_XYZRGBC)
+    assert len(batch) == 10
+    # coordinates keep their float64 precision, the other fields get their type
+    assert batch['X'].dtype == np.float64 and batch['red'].dtype == np.uint8
+    assert np.array_equal(batch.to_array(), array)
+    assert np.array_equal(batch.xyz(), array[:, 0:3])
+    assert batch.nbytes == 10 * (3 * 8 + 4)
+
+def test_point_batch_indexing_and_concatenation():
+    batch = pf.PointBatch.from_array(np.arange(40, dtype=np.float64).reshape(10, 4) % 200, pf.FORMAT_XYZC)
+    mask = batch['X'] > 10
+    selected = batch[mask]
+    assert len(selected) == np.count_nonzero(mask)
+    assert np.array_equal(selected['change'], batch['change'][mask])
+    assert np.array_equal(pf.PointBatch.concatenate([batch[:3], batch[3:]]).to_array(), batch.to_array())
+    assert len(pf.PointBatch.empty(pf.FORMAT_XYZC, 5)) == 5
+
+def test_point_batch_records():
+    batch = pf.PointBatch.from_array(np.arange(40, dtype=np.float64).reshape(10, 4) % 200, pf.FORMAT_XYZC)
+    records = batch.to_records()
+    assert records.dtype == pf.FORMAT_XYZC.ply_output_dtypes
+    # columns of the type of their field are views of the records
+    restored = pf.PointBatch.from_records(records, pf.FORMAT_XYZC)
+    assert np.shares_memory(restored['change'], records)
+    assert np.array_equal(restored.to_array(), batch.to_array())
+
+def test_point_batch_column_lengths():
+    with pytest.raises(ValueError):
+        pf.PointBatch(pf.FORMAT_XYZ, {'X' : np.zeros(3), 'Y' : np.zeros(3), 'Z' : np.zeros(2)})
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+import pytest
+from utils.processing import StepStatus, ProcessingStep, DatasetJob
+from utils.scheduler import DatasetScheduler
+from utils.build_cache import BuildCache
+from utils.job_queue import JobQueue, run_worker, PENDING, RUNNING, DONE, FAILED
+
+
+def epoch_steps(dataset_name, script, epochs):
+    return [ProcessingStep(dataset_name, script, epoch=epoch) for epoch in epochs]
+
+
+def test_scheduler_order_and_failures():
+    jobs = [DatasetJob('A', 'root', [ProcessingStep('A', 'create_pointclouds')] + epoch_steps('A', 'compute_statistics', ['1', '2'])),
+            DatasetJob('B', 'root', [ProcessingStep('B', 'create_pointclouds'), ProcessingStep('B', 'compute_statistics')]),
+            DatasetJob('C', 'root', [ProcessingStep('C', 'create_pointclouds'), ProcessingStep('C', 'compute_statistics')])]
+    executed = []
+    lock = threading.Lock()
+    def run_step(step):
+        with lock:
+            executed.append((step.dataset_name, step.key))
+        if step.dataset_name == 'B' and step.script == 'create_pointclouds':
+            return StepStatus.FAILED
+        if step.dataset_name == 'C' and step.script == 'create_pointclouds':
+            raise RuntimeError('crashed runner')
+        return StepStatus.SUCCEEDED
+
+    scheduler = DatasetScheduler(num_cpus=2)
+    failures = scheduler.run(jobs, run_step)
+    # the steps of a failed dataset are skipped, while the other datasets are processed completely
+    assert sorted((job.name, step.key) for job, step in failures) == [('B', 'create_pointclouds'), ('C', 'create_pointclouds')]
+    assert sorted(executed) == [('A', 'compute_statistics/1'), ('A', 'compute_statistics/2'), ('A', 'create_pointclouds'),
+                                ('B', 'create_pointclouds'), ('C', 'create_pointclouds')]
+    assert executed.index(('A', 'create_pointclouds')) < executed.index(('A', 'compute_statistics/1'))
+    assert scheduler.peak_steps <= 2
+
+
+@pytest.fixture
+def dataset_script(tmp_path, monkeypatch):
+    # the scripts of the steps are resolved relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('datasets', 'Test'))
+    with open(os.path.join('datasets', 'Test', 'create_pointclouds.py'), 'w') as script_file:
+        script_file.write('print("test")\n')
+    os.makedirs('input')
+    with open(os.path.join('input', 'scan.txt'), 'w') as input_file:
+        input_file.write('1 2 3\n')
+
+def write_output(step):
+    output_folder = dict(step.arguments)['--output_folder']
+    os.makedirs(output_folder, exist_ok=True)
+    with open(os.path.join(output_folder, 'points.txt'), 'w') as output_file:
+        output_file.write('1 2 3\n')
+    return StepStatus.SUCCEEDED
+
+def test_build_cache(dataset_script):
+    step = ProcessingStep('Test', 'create_pointclouds', [['input_path', 'input'], ['--output_folder', 'output']], outputs=['output'], ignored_paths=['output'])
+    build_cache = BuildCache('build_cache')
+    assert build_cache.run_step(step, write_output) == StepStatus.SUCCEEDED
+    assert os.path.isfile(os.path.join('output', 'points.txt'))
+    assert not any(name.startswith('output.partial-') for name in os.listdir('.'))
+    assert build_cache.run_step(step, write_output) == StepStatus.SKIPPED
+
+    # changed inputs or missing outputs make the step run again
+    with open(os.path.join('input', 'scan.txt'), 'a') as input_file:
+        input_file.write('4 5 6\n')
+    assert build_cache.run_step(step, write_output) == StepStatus.SUCCEEDED
+    os.remove(os.path.join('output', 'points.txt'))
+    assert build_cache.run_step(step, write_output) == StepStatus.SUCCEEDED
+
+    # a failed step is not recorded and leaves the previous outputs untouched
+    assert build_cache.run_step(step, lambda step: StepStatus.FAILED, force=True) == StepStatus.FAILED
+    assert build_cache.load_record(step) is None
+    assert os.path.isfile(os.path.join('output', 'points.txt'))
+    assert build_cache.run_step(step, write_output) == StepStatus.SUCCEEDED
+
+
+def test_job_queue_dependencies(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    first = queue.add_job(ProcessingStep('A', 'create_pointclouds'))
+    second = queue.add_job(ProcessingStep('A', 'compute_statistics'), depends_on=[first])
+    other = queue.add_job(ProcessingStep('B', 'create_pointclouds'), priority=10)
+
+    assert queue.claim('worker')[0] == other
+    job_id, step = queue.claim('worker')
+    assert job_id == first and step.script == 'create_pointclouds'
+    # the second step waits for the first one
+    assert queue.claim('worker') is None
+    assert queue.complete(first, 'worker', True, {'wall_time' : 1})
+    assert queue.claim('worker')[0] == second
+    assert not queue.complete(second, 'other_worker', True, {})
+
+    # a failed job fails the jobs that depend on it
+    assert queue.complete(other, 'worker', False, {'error' : 'failed'})
+    assert queue.status_counts() == {PENDING : 0, RUNNING : 1, DONE : 1, FAILED : 1}
+    queue.close()
+
+def test_job_queue_failure_propagation_and_leases(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'), lease_duration=0.1, max_attempts=2)
+    first = queue.add_job(ProcessingStep('A', 'create_pointclouds'))
+    queue.add_job(ProcessingStep('A', 'compute_statistics'), depends_on=[first])
+
+    # jobs whose lease expired are claimed again, until max_attempts is reached
+    assert queue.claim('worker')[0] == first
+    time.sleep(0.2)
+    assert queue.claim('other_worker')[0] == first
+    assert not queue.heartbeat(first, 'worker')
+    time.sleep(0.2)
+    assert queue.claim('worker') is None
+    assert queue.is_finished()
+    assert [status for _, status, _ in queue.results()] == [FAILED, FAILED]
+    queue.close()
+
+def test_job_queue_fails_shared_dependents_once(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    first = queue.add_job(ProcessingStep('A', 'create_pointclouds'))
+    # the last job depends on the first one via both epochs
+    epochs = [queue.add_job(step, depends_on=[first]) for step in epoch_steps('A', 'compute_statistics', ['1', '2'])]
+    queue.add_job(ProcessingStep('A', 'create_2d_renderings'), depends_on=epochs)
+
+    assert queue.claim('worker')[0] == first
+    assert queue.complete(first, 'worker', False, {'error' : 'failed'})
+    assert queue.status_counts() == {PENDING : 0, RUNNING : 0, DONE : 0, FAILED : 4}
+    assert queue.is_finished()
+    queue.close()
+
+def test_run_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    first = queue.add_job(ProcessingStep('A', 'create_pointclouds'))
+    queue.add_job(ProcessingStep('A', 'compute_statistics'), depends_on=[first])
+    queue.add_job(ProcessingStep('B', 'create_pointclouds'))
+
+    active_workers = []
+    def execute_job(step):
+        active_workers.append(queue.active_workers())
+        if step.dataset_name == 'B':
+            raise RuntimeError('crashed step')
+        return True, {'script' : step.script}
+
+    run_worker(JobQueue(str(tmp_path / 'queue.db')), execute_job, worker_id='worker', poll_interval=0.01)
+    # the worker is registered while it processes jobs, so that the coordinator does not remove the queue
+    assert active_workers == [1, 1, 1]
+    assert queue.active_workers() == 0
+    results = {(step.dataset_name, step.script) : (status, result) for step, status, result in queue.results()}
+    assert results[('A', 'compute_statistics')] == (DONE, {'script' : 'compute_statistics'})
+    assert results[('B', 'create_pointclouds')][0] == FAILED
+    queue.close()
@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pytest
+import utils.pointcloud_format as pf
+from utils.io import FileFormat, write_pointcloud
+from utils.scene_container import SceneContainer, EpochWriter, import_epoch
+from conftest import random_batch, sorted_rows
+
+BBOX = np.array([[0., 0.], [100., 100.]])
+
+
+def write_epoch(scene, epoch, batch):
+    with EpochWriter(scene, epoch, write_threshold=1000) as epoch_writer:
+        for start in range(0, len(batch), 700):
+            epoch_writer.add_points(batch[start:start + 700])
+
+
+def test_epochs_round_trip(tmp_path):
+    scene = SceneContainer.create(str(tmp_path / 'scene'), pf.FORMAT_XYZRGBC, BBOX, tile_size=50)
+    batches = {'epoch_a' : random_batch(3000, seed=0), 'epoch_b' : random_batch(2000, seed=1)}
+    for epoch, batch in batches.items():
+        write_epoch(scene, epoch, batch)
+
+    assert scene.epochs() == ['epoch_a', 'epoch_b']
+    for epoch, batch in batches.items():
+        assert np.array_equal(sorted_rows(scene.read_epoch(epoch).to_array()), sorted_rows(batch.to_array()))
+    tile = scene.read_tile((1, 0))
+    inside = (batches['epoch_a']['X'] >= 50) & (batches['epoch_a']['Y'] < 50)
+    assert len(tile['epoch_a']) == np.count_nonzero(inside)
+
+    # an epoch can only be written once, and the scene can only be opened with its own tiling
+    with pytest.raises(ValueError):
+        EpochWriter(scene, 'epoch_a')
+    with pytest.raises(ValueError):
+        SceneContainer.create(str(tmp_path / 'scene'), pf.FORMAT_XYZRGBC, BBOX, tile_size=25)
+
+def test_pack(tmp_path):
+    scene = SceneContainer.create(str(tmp_path / 'scene'), pf.FORMAT_XYZRGBC, BBOX, tile_size=50)
+    batches = {'epoch_a' : random_batch(3000, seed=0), 'epoch_b' : random_batch(2000, seed=1), 'epoch_c' : random_batch(1000, seed=2)}
+    write_epoch(scene, 'epoch_a', batches['epoch_a'])
+    write_epoch(scene, 'epoch_b', batches['epoch_b'])
+    unpacked_tile = scene.read_tile((0, 1))
+    scene.pack()
+    assert scene.epochs() == ['epoch_a', 'epoch_b']
+    packed_tile = scene.read_tile((0, 1))
+    for epoch in unpacked_tile:
+        assert np.array_equal(packed_tile[epoch].to_array(), unpacked_tile[epoch].to_array())
+
+    write_epoch(scene, 'epoch_c', batches['epoch_c'])
+    assert scene.epochs() == ['epoch_a', 'epoch_b', 'epoch_c']
+    scene.pack()
+    for epoch, batch in batches.items():
+        assert np.array_equal(sorted_rows(scene.read_epoch(epoch).to_array()), sorted_rows(batch.to_array()))
+    # the previous packed tiles and the chunks of the epochs packed before are kept until the next packing
+    assert os.path.isdir(str(tmp_path / 'scene' / 'packed-1'))
+    assert os.listdir(str(tmp_path / 'scene' / 'epochs')) == ['epoch_c']
+
+def test_import_epoch(tmp_path):
+    batch = random_batch(2000, seed=0)
+    write_pointcloud(batch, str(tmp_path), 'points', FileFormat.PLY, pf.FORMAT_XYZRGBC)
+    scene = SceneContainer.create(str(tmp_path / 'scene'), pf.FORMAT_XYZRGBC, BBOX, num_tiles=np.array([2, 2]))
+    import_epoch(scene, 'epoch', [str(tmp_path / 'points.ply')])
+    # the PLY file stores the coordinates as float32
+    assert np.allclose(sorted_rows(scene.read_epoch('epoch').to_array()), sorted_rows(batch.to_array()), atol=1e-4)
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import laspy
+import utils.pointcloud_format as pf
+from utils.io import read_point_batch
+from utils.tile_writer import TileWriter
+from conftest import random_batch, sorted_rows
+
+BBOX = np.array([[0., 0.], [100., 100.]])
+
+
+# Returns a random_batch with the coordinates rounded to millimeters (and moved by the origin), which the tiles store exactly,
+# so that the points read from the tiles are sorted like the written ones
+def millimeter_batch(num_points, pointcloud_format=pf.FORMAT_XYZRGBC, origin=np.zeros(3)):
+    batch = random_batch(num_points, pointcloud_format)
+    for axis, name in enumerate(['X', 'Y', 'Z']):
+        batch.columns[name] = np.round(batch[name], 3) + origin[axis]
+    return batch
+
+def read_tiles(folder, pointcloud_format):
+    return pf.PointBatch.concatenate([read_point_batch(str(tile), pointcloud_format) for tile in sorted(folder.glob('tile_*.laz'))])
+
+
+def test_tile_writer_resume(tmp_path):
+    batch = millimeter_batch(6000)
+    tile_writer = TileWriter(str(tmp_path), pf.FORMAT_XYZRGBC, bbox=BBOX, tile_size=50, write_threshold=200, checkpoint_interval=3600)
+    tile_writer.add_points(batch[:3000])
+    assert tile_writer.checkpoint(3000, force=True)
+    # the parts of LAZ tiles are uncompressed, their points are only compressed when the parts are merged
+    for part_path in tmp_path.glob('tile_*.laz.part0'):
+        with laspy.open(str(part_path)) as part_reader:
+            assert not part_reader.header.are_points_compressed
+    # the points added after the last checkpoint are discarded when resuming, as if the extraction crashed
+    tile_writer.add_points(batch[3000:4000])
+
+    tile_writer = TileWriter(str(tmp_path), pf.FORMAT_XYZRGBC, bbox=BBOX, tile_size=50, write_threshold=200, resume=True)
+    assert tile_writer.resume_position == 3000
+    tile_writer.add_points(batch[3000:])
+    tile_writer.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['tile_0_0.laz', 'tile_0_1.laz', 'tile_1_0.laz', 'tile_1_1.laz']
+    for tile in tmp_path.glob('tile_*.laz'):
+        with laspy.open(str(tile)) as tile_reader:
+            assert tile_reader.header.are_points_compressed
+    assert np.allclose(sorted_rows(read_tiles(tmp_path, pf.FORMAT_XYZRGBC).to_array()), sorted_rows(batch.to_array()), rtol=0, atol=1e-6)
+
+def test_tile_writer_world_coordinates(tmp_path):
+    origin = np.array([500000., 5000000., 300.])
+    batch = millimeter_batch(4000, pf.FORMAT_XYZI, origin)
+    tile_writer = TileWriter(str(tmp_path), pf.FORMAT_XYZI, bbox=BBOX + origin[:2], tile_size=50, write_threshold=1000)
+    # the coordinates are buffered as the int32 values of the LAS header, so a point takes as many bytes as in a float32 array
+    assert sum(column.itemsize for column in tile_writer.writers[0][0].columns.values()) == 16
+    for start in range(0, len(batch), 700):
+        tile_writer.add_points(batch[start:start + 700])
+    tile_writer.close()
+    assert np.allclose(sorted_rows(read_tiles(tmp_path, pf.FORMAT_XYZI).to_array()), sorted_rows(batch.to_array()), rtol=0, atol=1e-6)
+
+def test_tile_writer_clips_far_points(tmp_path, capsys):
+    tile_writer = TileWriter(str(tmp_path), pf.FORMAT_XYZC, bbox=BBOX, num_tiles=np.array([1, 1]))
+    tile_writer.add_points(np.array([[10., 10., 1., 0.], [60., 70., 2., 1.]]))
+    # the tiles are open to the borders, so a far point can be added after the LAS header of its tile was created
+    tile_writer.add_points(np.array([[1e6, 50., 1., 0.]]))
+    tile_writer.close()
+    assert 'Clipping 1 coordinates' in capsys.readouterr().out
+    result = read_tiles(tmp_path, pf.FORMAT_XYZC)
+    assert len(result) == 3
+    assert 100 < result['X'].max() < 1e6
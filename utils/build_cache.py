@@ -0,0 +1,230 @@
+import os
+import ast
+import glob
+import json
+import shutil
+import hashlib
+from utils.processing import StepStatus, is_output_argument, staging_path
+from utils.io import is_txt_cache, is_evaluation_cache
+
+# Returns the paths of all modules from the utils package that are (transitively) imported by the given Python file
+def get_imported_utils_modules(source_path, utils_folder='utils'):
+    imported_modules = set()
+    files_to_visit = [source_path]
+    while files_to_visit:
+        with open(files_to_visit.pop(), 'r', encoding='utf-8') as source_file:
+            tree = ast.parse(source_file.read())
+
+        module_names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                module_names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                if node.level > 0:    # relative imports only occur within the utils package
+                    module_names.append('utils.' + node.module if node.module else 'utils')
+                else:
+                    module_names.append(node.module)
+                module_names.extend(module_names[-1] + '.' + alias.name for alias in node.names)
+
+        for module_name in module_names:
+            parts = module_name.split('.')
+            if parts[0] != 'utils' or len(parts) != 2:
+                continue
+            module_path = os.path.join(utils_folder, parts[1] + '.py')
+            if os.path.isfile(module_path) and module_path not in imported_modules:
+                imported_modules.add(module_path)
+                files_to_visit.append(module_path)
+    return sorted(imported_modules)
+
+
+def hash_file(path):
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+# Describes a file either by its size and modification time, or by a hash of its contents
+def file_signature(path, hash_contents=False):
+    stat = os.stat(path)
+    if hash_contents:
+        return [stat.st_size, hash_file(path)]
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Returns the paths of all files in path (which can also be a file itself), skipping everything for which is_ignored returns True
+# Binary caches of text files (see utils.io.read_txt_columns) and evaluation caches (see utils.io.EvaluationCache) are not listed, as they are derived from the input files
+def list_files(path, is_ignored=lambda path: False):
+    if os.path.isfile(path):
+        return [os.path.normpath(path)]
+
+    files = []
+    for root, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if not is_ignored(os.path.join(root, d)) and not is_evaluation_cache(d))
+        for filename in sorted(filenames):
+            filepath = os.path.join(root, filename)
+            if not is_ignored(filepath) and not is_txt_cache(filepath):
+                files.append(os.path.normpath(filepath))
+    return files
+
+# Moves a staged output (file or folder) to its final location.
+# For folders, each entry is moved separately, so that entries of the output folder not written by the step are kept.
+def commit_staged_output(staged_path, output_path):
+    if not os.path.exists(staged_path):
+        return
+    if not os.path.isdir(staged_path):
+        replace_path(staged_path, output_path)
+        return
+
+    os.makedirs(output_path, exist_ok=True)
+    for entry in os.scandir(staged_path):
+        replace_path(entry.path, os.path.join(output_path, entry.name))
+    os.rmdir(staged_path)
+
+# Moves all files of a staged output folder into the output folder, keeping all other files of the output folder (also within subfolders).
+# This allows multiple steps (e.g., the epochs of a dataset) to write into the same output folder concurrently. Returns the paths of the moved files.
+def merge_staged_output(staged_path, output_path):
+    if not os.path.exists(staged_path):
+        return []
+    if not os.path.isdir(staged_path):
+        replace_path(staged_path, output_path)
+        return [os.path.normpath(output_path)]
+
+    merged_files = []
+    for filepath in list_files(staged_path):
+        target_path = os.path.join(output_path, os.path.relpath(filepath, staged_path))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(filepath, target_path)
+        merged_files.append(os.path.normpath(target_path))
+    shutil.rmtree(staged_path)
+    return merged_files
+
+def replace_path(source, target):
+    if os.path.isdir(target) and not os.path.islink(target):
+        replaced_path = target + '.replaced'
+        if os.path.exists(replaced_path):
+            shutil.rmtree(replaced_path)
+        os.replace(target, replaced_path)
+        os.replace(source, target)
+        shutil.rmtree(replaced_path)
+    else:
+        if os.path.isdir(source) and os.path.exists(target):
+            os.remove(target)
+        os.replace(source, target)
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+# Skips processing steps whose inputs have not changed since their last successful execution and whose outputs are still present.
+# The fingerprint of a step covers the script, all utils modules imported by it, the resolved arguments, and all files in the
+# existing input paths of the step (without the outputs of the dataset's steps).
+# While a step is executed, its outputs are written to staging paths and only moved to their final location (and recorded)
+# after the step has finished successfully. Thus, an interrupted step never looks complete.
+class BuildCache:
+    def __init__(self, cache_folder, hash_contents=False):
+        self.cache_folder = cache_folder
+        self.hash_contents = hash_contents
+
+    def record_path(self, step):
+        return os.path.join(self.cache_folder, step.dataset_name, step.key + '.json')
+
+    # Returns the signatures of all files in the existing input paths of the step (the first entry of each signature is the file size)
+    def input_files(self, step):
+        inputs = {}
+        for input_path in step.input_candidates():
+            if not os.path.exists(input_path):
+                continue
+            is_ignored = lambda path: step.is_ignored_path(path) and os.path.normpath(path) != os.path.normpath(input_path)
+            for filepath in list_files(input_path, is_ignored):
+                inputs[filepath] = file_signature(filepath, self.hash_contents)
+        return inputs
+
+    def fingerprint(self, step, input_files=None):
+        sources = {}
+        for source_path in [step.script_path] + get_imported_utils_modules(step.script_path):
+            sources[source_path] = hash_file(source_path)
+
+        inputs = input_files if input_files is not None else self.input_files(step)
+        fingerprint_data = json.dumps({'arguments' : step.arguments, 'sources' : sources, 'inputs' : inputs}, sort_keys=True)
+        return hashlib.sha256(fingerprint_data.encode('utf-8')).hexdigest()
+
+    # Returns the signatures of all files in the given outputs of the step (outputs can be glob patterns)
+    def output_signatures(self, outputs):
+        signatures = {}
+        for output in outputs:
+            for output_path in glob.glob(output) if glob.has_magic(output) else [output]:
+                for filepath in list_files(output_path):
+                    signatures[filepath] = file_signature(filepath)
+        return signatures
+
+    def load_record(self, step):
+        record_path = self.record_path(step)
+        if not os.path.isfile(record_path):
+            return None
+        with open(record_path, 'r') as record_file:
+            return json.load(record_file)
+
+    def is_up_to_date(self, step, fingerprint):
+        record = self.load_record(step)
+        if record is None or record['fingerprint'] != fingerprint:
+            return False
+
+        for filepath, signature in record['outputs'].items():
+            if not os.path.isfile(filepath) or file_signature(filepath) != signature:
+                return False
+        return True
+
+    def invalidate(self, step):
+        record_path = self.record_path(step)
+        if os.path.isfile(record_path):
+            os.remove(record_path)
+
+    def commit(self, step, fingerprint, output_signatures):
+        record_path = self.record_path(step)
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        temp_path = record_path + '.tmp'
+        with open(temp_path, 'w') as record_file:
+            json.dump({'fingerprint' : fingerprint, 'outputs' : output_signatures}, record_file, indent=2)
+        os.replace(temp_path, record_path)
+
+    # Executes the step with the given run_step callable, unless it is up to date.
+    # Staged outputs of a previous, interrupted execution are removed, unless the step resumes from them.
+    # The outputs of epoch steps are merged into the output folders, and only the files written by the step are recorded as its outputs.
+    # Files recorded by the previous execution of an epoch step that were not written again are removed.
+    # The input files of the step can be passed if they have already been determined (see input_files).
+    def run_step(self, step, run_step, force=False, input_files=None):
+        fingerprint = self.fingerprint(step, input_files)
+        if not force and self.is_up_to_date(step, fingerprint):
+            return StepStatus.SKIPPED
+        previous_record = self.load_record(step)
+        self.invalidate(step)
+
+        staged_step = step.with_output_suffix(step.staging_suffix)
+        output_paths = [value for name, value in step.arguments if is_output_argument(name)]
+        for output_path in output_paths:
+            if not step.resume:
+                remove_path(staging_path(output_path, step.staging_suffix))
+
+        status = run_step(staged_step)
+        if status != StepStatus.SUCCEEDED:
+            return status
+
+        if step.epoch is None:
+            for output_path in output_paths:
+                commit_staged_output(staging_path(output_path, step.staging_suffix), output_path)
+            self.commit(step, fingerprint, self.output_signatures(step.outputs))
+            return status
+
+        merged_files = []
+        for output_path in output_paths:
+            merged_files.extend(merge_staged_output(staging_path(output_path, step.staging_suffix), output_path))
+        if previous_record is not None:
+            for filepath in set(previous_record['outputs']) - set(merged_files):
+                remove_path(filepath)
+        signatures = self.output_signatures([output for output in step.outputs if output not in output_paths])
+        signatures.update({filepath : file_signature(filepath) for filepath in merged_files})
+        self.commit(step, fingerprint, signatures)
+        return status
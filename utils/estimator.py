@@ -0,0 +1,180 @@
+import os
+import glob
+import heapq
+import json
+import statistics
+from dataclasses import dataclass
+from utils.telemetry import count_points_in_header, format_bytes, format_seconds
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.pgm', '.ppm']
+
+
+# The size of the input data of a processing step
+@dataclass
+class InputSize:
+    bytes: int = 0
+    files: int = 0
+    images: int = 0
+    points: int = 0
+
+    # The amount of work is measured in points if the inputs are point clouds with a header (LAS/LAZ/PLY/PCD), and in bytes otherwise (e.g., rosbags or images)
+    def work(self):
+        return ('points', self.points) if self.points > 0 else ('bytes', self.bytes)
+
+
+# Determines the InputSize from the signatures of the input files (see BuildCache.input_files), whose first entry is the file size.
+# Point counts are read from the file headers only.
+def measure_inputs(input_files):
+    size = InputSize()
+    for filepath, signature in input_files.items():
+        size.files += 1
+        size.bytes += signature[0]
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            size.images += 1
+        else:
+            size.points += count_points_in_header(filepath) or 0
+    return size
+
+def report_input_size(report):
+    return InputSize(report['input_bytes'], report['input_files'], report['input_images'], report['input_points'])
+
+
+# The predicted cost of a processing step. Values that cannot be predicted are None.
+# The basis states which previous runs the prediction is derived from: the same step, the same script of the dataset (e.g., other epochs),
+# the script of the same name in other datasets, or none (unknown).
+@dataclass
+class StepEstimate:
+    dataset: str
+    script: str
+    epoch: str
+    inputs: InputSize
+    wall_time: float = None
+    peak_rss: int = None
+    output_bytes: int = None
+    basis: str = 'unknown'
+
+
+# Predicts the cost of processing steps from the sizes of their inputs, using throughputs calibrated from the run reports of previous runs.
+# The wall time and output size are assumed to be proportional to the amount of work (see InputSize.work), while the peak memory is taken from previous runs as is.
+class CostModel:
+    def __init__(self, reports=[]):
+        # only successful steps with recorded input sizes calibrate the model. Later reports replace earlier ones of the same step.
+        self.latest = {}
+        for report in reports:
+            if report.get('status') == 'succeeded' and report.get('input_bytes') is not None:
+                self.latest[(report['dataset'], report['script'], report.get('epoch'))] = report
+
+    @staticmethod
+    def from_report_folder(report_folder):
+        reports = []
+        for report_path in sorted(glob.glob(os.path.join(report_folder, '*.jsonl'))):
+            with open(report_path, 'r') as report_file:
+                for line in report_file:
+                    try:
+                        reports.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass    # e.g., a line of a run that got interrupted while writing
+        return CostModel(reports)
+
+    # Scales the recorded costs of the given reports to the amount of work, with their overall throughput (or the median of their throughputs).
+    # If the work cannot be compared (e.g., the inputs do not exist yet), the mean of the recorded costs is used.
+    @staticmethod
+    def scale(reports, work, use_median=False):
+        unit, amount = work
+        comparable = [(report, report_input_size(report).work()) for report in reports]
+        comparable = [(report, report_work) for report, report_work in comparable if report_work[0] == unit and report_work[1] > 0]
+        def predict(key):
+            if not comparable or amount == 0:
+                return sum(report[key] for report in reports) / len(reports)
+            if use_median:
+                return statistics.median(report[key] / report_work[1] for report, report_work in comparable) * amount
+            return sum(report[key] for report, _ in comparable) / sum(report_work[1] for _, report_work in comparable) * amount
+        return predict('wall_time'), predict('output_bytes')
+
+    def estimate(self, step, inputs):
+        estimate = StepEstimate(step.dataset_name, step.script, step.epoch, inputs)
+        same_step = [report for key, report in self.latest.items() if key == (step.dataset_name, step.script, step.epoch)]
+        same_script = [report for key, report in self.latest.items() if key[:2] == (step.dataset_name, step.script)]
+        other_datasets = [report for key, report in self.latest.items() if key[1] == step.script and key[0] != step.dataset_name]
+        # other datasets have different scripts of the same name, so their median throughput is used
+        for basis, reports, use_median in [('step', same_step, False), ('dataset', same_script, False), ('script', other_datasets, True)]:
+            if reports:
+                estimate.wall_time, estimate.output_bytes = self.scale(reports, inputs.work(), use_median)
+                peaks = [report['peak_rss'] for report in reports if report.get('peak_rss') is not None]
+                if peaks:
+                    estimate.peak_rss = int(statistics.median(peaks)) if use_median else max(peaks)
+                estimate.basis = basis
+                break
+        return estimate
+
+
+# Estimates the wall time of processing the jobs with num_cpus cores (and memory_budget GB), simulating the DatasetScheduler:
+# the stages of each job are executed in order, the steps of a stage concurrently, and each running step occupies the cpu_weight and
+# memory_weight of its job. Jobs are started longest first. Steps with an unknown wall time are assumed to take no time.
+def estimate_makespan(jobs, step_estimates, num_cpus=1, memory_budget=None):
+    wall_time = lambda step: step_estimates[id(step)].wall_time or 0
+    jobs = sorted(jobs, key=lambda job: sum(wall_time(step) for step in job.steps), reverse=True)
+    remaining_stages = [[list(stage) for stage in job.stages()] for job in jobs]
+    running_steps = [0] * len(jobs)
+    free_cpus, free_memory = num_cpus, memory_budget
+    events = []
+    now = 0
+    while True:
+        for index, job in enumerate(jobs):
+            stages = remaining_stages[index]
+            if stages and not stages[0] and running_steps[index] == 0:
+                stages.pop(0)
+            if not stages:
+                continue
+            cpu_demand = min(max(job.cpu_weight, 0), num_cpus)
+            memory_demand = 0 if memory_budget is None else min(max(job.memory_weight, 0), memory_budget)
+            while stages[0] and cpu_demand <= free_cpus + 1e-9 and (memory_budget is None or memory_demand <= free_memory + 1e-9):
+                step = stages[0].pop(0)
+                free_cpus -= cpu_demand
+                if memory_budget is not None:
+                    free_memory -= memory_demand
+                running_steps[index] += 1
+                heapq.heappush(events, (now + wall_time(step), len(events), index, cpu_demand, memory_demand))
+        if not events:
+            return now
+        now, _, index, cpu_demand, memory_demand = heapq.heappop(events)
+        free_cpus += cpu_demand
+        if memory_budget is not None:
+            free_memory += memory_demand
+        running_steps[index] -= 1
+
+
+# Returns a table of the estimated costs per dataset and step. The epochs of a stage are summarized in one row:
+# their wall times and output sizes are summed, and the peak memory is that of the most expensive epoch (i.e., of a single process).
+def estimate_table(jobs, step_estimates):
+    header = ['Dataset', 'Step', 'Epochs', 'Input', 'Files', 'Images', 'Points', 'Wall time', 'Peak RSS', 'Output', 'Basis']
+    rows = [header]
+    def add_row(dataset, step_name, num_epochs, estimates):
+        known = lambda values: None if any(value is None for value in values) else values
+        wall_times = known([estimate.wall_time for estimate in estimates])
+        output_bytes = known([estimate.output_bytes for estimate in estimates])
+        peak_rss = [estimate.peak_rss for estimate in estimates if estimate.peak_rss is not None]
+        bases = sorted(set(estimate.basis for estimate in estimates))
+        rows.append([dataset, step_name, num_epochs,
+                     format_bytes(sum(estimate.inputs.bytes for estimate in estimates)),
+                     str(sum(estimate.inputs.files for estimate in estimates)),
+                     str(sum(estimate.inputs.images for estimate in estimates)),
+                     str(sum(estimate.inputs.points for estimate in estimates)),
+                     format_seconds(sum(wall_times) if wall_times is not None else None),
+                     format_bytes(max(peak_rss) if peak_rss else None),
+                     format_bytes(sum(output_bytes) if output_bytes is not None else None),
+                     '/'.join(bases)])
+
+    for job in jobs:
+        job_estimates = []
+        for stage in job.stages():
+            estimates = [step_estimates[id(step)] for step in stage]
+            add_row(job.name, stage[0].script, '-' if stage[0].epoch is None else str(len(stage)), estimates)
+            job_estimates += estimates
+        add_row(job.name, 'total', '', job_estimates)
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    lines = ['  '.join(value.ljust(width) for value, width in zip(row, widths)) for row in rows]
+    lines.insert(1, '-' * len(lines[0]))
+    return '\n'.join(lines)
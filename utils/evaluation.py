@@ -1,15 +1,16 @@
 from dataclasses import dataclass, field
-from scipy.spatial import cKDTree
-from scipy.spatial.transform import Rotation
+from typing import TYPE_CHECKING
 import numpy as np
-from shapely.geometry import MultiPoint
-from shapely import union_all
-from .pointcloud_processing import reduce_and_remove_outliers
 from tqdm import tqdm
-from .io import read_pointcloud_for_evaluation, read_and_merge_pointclouds_for_evaluation
+from .io import read_pointcloud_for_evaluation, read_and_merge_pointclouds_for_evaluation, iterate_pointclouds_for_evaluation, count_points_from_header, EvaluationCache, EVALUATION_CACHE_FOLDER
+from .threads import thread_budget, prefetch
 from enum import Enum
 import os
 
+# scipy, shapely, and open3d (via pointcloud_processing) are imported within the functions that need them, so that importing this module stays fast
+if TYPE_CHECKING:
+    from scipy.spatial.transform import Rotation
+
 class Statistics(Enum):
     NUM_POINTS = 'Number of points'
     AVG_DISTANCE = 'Average neighbor distance'
@@ -19,6 +20,17 @@ class Statistics(Enum):
 
 # The position_offset can be used to shift a point cloud in order to avoid precision errors due to high coordinate values.
 # The rotation_before_projection (a scipy.spatial.transform.Rotation object) can be used if the point clouds are not axis-aligned, i.e., if they have to be rotated before the convex hull in the xy-plane can be computed
+# If chunk_points is set, LAS/LAZ files are read in blocks of at most chunk_points points, which bounds the memory for very large epochs.
+# The average neighbor distance is then computed per block, i.e., it is slightly overestimated at the borders of the blocks.
+# With txt_cache, text files are cached as binary files next to them, which are read instead when computing the statistics again (see utils.io.read_txt_columns).
+# With evaluation_cache (a folder, usually [dataset root]/.evaluation_cache), each input file is converted once into a binary file of its points, which is
+# memory-mapped when computing the statistics again (see utils.io.EvaluationCache). evaluation_cache_size limits the cache (in GB) by removing the least recently used files.
+# prefetch_tiles is the number of tiles of a tiled epoch that are read in the background while the current tile is analysed
+# (by default, one tile if the thread budget allows more than one thread). Prefetched LAZ files are decompressed with one thread each, and the analysis
+# uses the remaining threads of the thread budget. Otherwise, LAZ files are decompressed with the threads of the thread budget.
+# If the number of points is the only statistic, it is read from the headers of LAS/LAZ, PLY, PCD, and Parquet files (see utils.io.count_points_from_header)
+# instead of reading the points, unless count_points_from_headers is False. Files whose header count can include invalid points that are dropped when reading
+# them (organized or non-dense PCD files) and files without a count in their header (e.g., text files) are read. remove_duplicates requires reading the points anyway.
 @dataclass
 class EvaluationConfig:
     statistics_to_compute: list = None
@@ -29,13 +41,37 @@ class EvaluationConfig:
     txt_has_header: bool = False
     txt_delimiter: str = None
     remove_duplicates: bool = False
-    rotation_before_projection: Rotation = None
+    rotation_before_projection: 'Rotation' = None
+    chunk_points: int = None
+    txt_cache: bool = False
+    evaluation_cache: str = None
+    evaluation_cache_size: float = None
+    prefetch_tiles: int = None
+    count_points_from_headers: bool = True
+
+# Adds the --chunk_points option of the compute_statistics scripts (see EvaluationConfig.chunk_points)
+def add_chunk_points_argument(parser):
+    parser.add_argument('--chunk_points', help='Reads the LAS/LAZ files in chunks of at most this many points, which bounds the memory usage for very large epochs (the average neighbor distance is then approximated per chunk)', default=None, type=int)
+
+# Adds the --txt_cache option of the compute_statistics scripts (see EvaluationConfig.txt_cache)
+def add_txt_cache_argument(parser):
+    parser.add_argument('--txt_cache', help='Caches the parsed text files as binary files next to them, so that they are not parsed again when computing the statistics again', action='store_true')
+
+# Adds the --evaluation_cache and --evaluation_cache_size options of the compute_statistics scripts (see EvaluationConfig.evaluation_cache)
+def add_evaluation_cache_arguments(parser):
+    parser.add_argument('--evaluation_cache', help='Caches the point clouds as memory-mapped binary files in the folder ' + EVALUATION_CACHE_FOLDER + ' of the dataset root, so that each input file is only converted once when computing the statistics again', action='store_true')
+    parser.add_argument('--evaluation_cache_size', help='Limits the size of the evaluation cache (in GB) by removing the least recently used files', default=None, type=float)
 
+# Returns the folder of the evaluation cache in the root folder of a dataset, or None if the cache is not used
+def evaluation_cache_folder(input_folder, evaluation_cache):
+    return os.path.join(input_folder, EVALUATION_CACHE_FOLDER) if evaluation_cache else None
 
 
-def avg_neighbor_distance(pointcloud):
+# workers is the number of threads for the nearest neighbor queries (defaults to the thread budget)
+def avg_neighbor_distance(pointcloud, workers=None):
+    from scipy.spatial import cKDTree
     kdtree = cKDTree(pointcloud)
-    distances, _ = kdtree.query(pointcloud, k=[2], workers=-1)
+    distances, _ = kdtree.query(pointcloud, k=[2], workers=thread_budget() if workers is None else workers)
     return np.mean(distances)
 
 def write_to_log(filepath, message):
@@ -99,20 +135,39 @@ class OverlapApproximator:
     def __init__(self, rotation_before_projection=None, down_sample_factor=0.1, outlier_removal_neighbors=20, outlier_removal_std_ratio=1.0):
         self.reference_epoch_polygon = None
         self.polygons = []
+        self.chunk_polygons = []
         self.down_sample_factor = down_sample_factor
         self.outlier_removal_neighbors = outlier_removal_neighbors
         self.outlier_removal_std_ratio = outlier_removal_std_ratio
         self.rotation_before_projection = rotation_before_projection
     
-    # add tile to the current epoch
-    def add_tile(self, pointcloud):
+    def convex_hull(self, pointcloud):
+        from shapely.geometry import MultiPoint
+        from .pointcloud_processing import reduce_and_remove_outliers
         pointcloud_reduced = reduce_and_remove_outliers(pointcloud, self.down_sample_factor, self.outlier_removal_neighbors, self.outlier_removal_std_ratio)
         if self.rotation_before_projection is not None:
             self.rotation_before_projection.apply(pointcloud_reduced)
-        self.polygons.append(MultiPoint(pointcloud_reduced[:,0:2]).convex_hull)
+        return MultiPoint(pointcloud_reduced[:,0:2]).convex_hull
+
+    # add tile to the current epoch
+    def add_tile(self, pointcloud):
+        self.polygons.append(self.convex_hull(pointcloud))
+
+    # add a chunk of a tile that is read in chunks. Once all chunks have been added, finish_tile adds the convex hull of their hulls to the current epoch.
+    def add_tile_chunk(self, pointcloud):
+        self.chunk_polygons.append(self.convex_hull(pointcloud))
+
+    def finish_tile(self):
+        from shapely.geometry import GeometryCollection
+        if len(self.chunk_polygons) == 1:
+            self.polygons.append(self.chunk_polygons[0])
+        elif len(self.chunk_polygons) > 1:
+            self.polygons.append(GeometryCollection(self.chunk_polygons).convex_hull)
+        self.chunk_polygons = []
         
     # compute overlap of the current epoch to the reference epoch and reset
     def compute_overlap(self):
+        from shapely import union_all
         if self.reference_epoch_polygon is None:
             self.reference_epoch_polygon = union_all([self.polygons])
             self.polygons = []
@@ -124,35 +179,89 @@ class OverlapApproximator:
 
 # Computes the specified statistics for the given epoch and appends them to the statistics dictionary
 def compute_statistics_for_epoch(tiles, statistics, config, overlap_approximator, merge_tiles=False):
+    cache = None
+    if config.evaluation_cache is not None:
+        cache = EvaluationCache(config.evaluation_cache, None if config.evaluation_cache_size is None else int(config.evaluation_cache_size * 1e9))
+
+    if list(statistics) == [Statistics.NUM_POINTS] and config.count_points_from_headers and not config.remove_duplicates:
+        counts = []
+        for tile in tiles:
+            count = count_points_from_header(tile)
+            if count is None:
+                count = len(read_pointcloud_for_evaluation(tile, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, txt_cache=config.txt_cache, cache=cache))
+            counts.append(count)
+        # like below, tiles with less than 2 points are skipped
+        counts = [sum(counts)] if merge_tiles else counts
+        statistics[Statistics.NUM_POINTS].append(sum(count for count in counts if count >= 2))
+        return
+
     overall_num_points = 0
-    points_per_tile = []
     distance_per_tile = []
+    distance_points_per_tile = []
     change_ratios = []
 
-    # compute values per tile
+    # while tiles are prefetched, each of them is decompressed with one thread, and the analysis of the current tile uses the rest of the thread budget
+    analysis_workers = None
+    laz_workers = None
+    if config.chunk_points is None and not merge_tiles:
+        num_prefetched = config.prefetch_tiles if config.prefetch_tiles is not None else int(thread_budget() > 1)
+        if num_prefetched > 0:
+            analysis_workers = max(1, thread_budget() - num_prefetched)
+            laz_workers = 1
+        read_tile = lambda tile: read_pointcloud_for_evaluation(tile, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, remove_duplicates=config.remove_duplicates, txt_cache=config.txt_cache, cache=cache, laz_workers=laz_workers)
+        prefetched_tiles = prefetch(read_tile, tiles, num_prefetched)
+
+    # compute values per tile. If the tile is read in chunks (see EvaluationConfig.chunk_points), the values are accumulated over its chunks.
     for tile in tqdm(tiles, leave=False):
-        if merge_tiles:
-            pointcloud = read_and_merge_pointclouds_for_evaluation(tiles, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, remove_duplicates=config.remove_duplicates)
+        if config.chunk_points is not None:
+            pointclouds = iterate_pointclouds_for_evaluation(tiles if merge_tiles else [tile], config.chunk_points, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, remove_duplicates=config.remove_duplicates, txt_cache=config.txt_cache, cache=cache)
+        elif merge_tiles:
+            pointclouds = [read_and_merge_pointclouds_for_evaluation(tiles, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, remove_duplicates=config.remove_duplicates, txt_cache=config.txt_cache, cache=cache)]
         else:
-            pointcloud = read_pointcloud_for_evaluation(tile, txt_has_header=config.txt_has_header, txt_delimiter=config.txt_delimiter, position_offset=config.position_offset, remove_duplicates=config.remove_duplicates)
+            pointclouds = [next(prefetched_tiles)]
+
+        points_per_chunk = []
+        distance_per_chunk = []
+        distance_points_per_chunk = []
+        num_changes = None
+        for pointcloud in pointclouds:
+            if len(pointcloud) == 0:
+                continue
+
+            points_per_chunk.append(len(pointcloud))
+
+            if Statistics.CHANGE_POINTS in statistics and pointcloud.shape[1] > 3:
+                num_changes = (num_changes or 0) + np.count_nonzero(pointcloud[:,3])
+
+            # a chunk with a single point still counts, but has neither a neighbor distance nor a hull
+            if len(pointcloud) < 2:
+                continue
 
-        num_points = len(pointcloud)
+            if Statistics.AVG_DISTANCE in statistics:
+                distance_per_chunk.append(avg_neighbor_distance(pointcloud, analysis_workers))
+                distance_points_per_chunk.append(len(pointcloud))
+
+            if Statistics.PARTIAL_EPOCHS in statistics:
+                overlap_approximator.add_tile_chunk(pointcloud[:, 0:3])
+
+        if Statistics.PARTIAL_EPOCHS in statistics:
+            overlap_approximator.finish_tile()
+
+        num_points = sum(points_per_chunk)
         if num_points < 2:
             continue
 
         overall_num_points += num_points
-        points_per_tile.append(num_points)
 
-        if Statistics.AVG_DISTANCE in statistics:
-            avg_distance = avg_neighbor_distance(pointcloud)
-            distance_per_tile.append(avg_distance)
+        if Statistics.AVG_DISTANCE in statistics and len(distance_per_chunk) > 0:
+            if len(distance_per_chunk) > 1:
+                distance_per_tile.append(np.average(distance_per_chunk, weights=distance_points_per_chunk))
+            else:
+                distance_per_tile.append(distance_per_chunk[0])
+            distance_points_per_tile.append(sum(distance_points_per_chunk))
 
-        if Statistics.PARTIAL_EPOCHS in statistics:
-            overlap_approximator.add_tile(pointcloud[:, 0:3])
-        
-        if Statistics.CHANGE_POINTS in statistics and pointcloud.shape[1] > 3:
-            change_ratio = np.count_nonzero(pointcloud[:,3]) / len(pointcloud)
-            change_ratios.append(change_ratio)
+        if num_changes is not None:
+            change_ratios.append(num_changes / num_points)
 
         if merge_tiles:
             break
@@ -161,8 +270,9 @@ def compute_statistics_for_epoch(tiles, statistics, config, overlap_approximator
     if Statistics.AVG_DISTANCE in statistics:
         if len(distance_per_tile) > 1:
             overall_avg_distance = 0
+            overall_distance_points = sum(distance_points_per_tile)
             for tile_idx in range(len(distance_per_tile)):
-                overall_avg_distance += distance_per_tile[tile_idx] * (points_per_tile[tile_idx] / overall_num_points)
+                overall_avg_distance += distance_per_tile[tile_idx] * (distance_points_per_tile[tile_idx] / overall_distance_points)
             statistics[Statistics.AVG_DISTANCE].append(overall_avg_distance)
         else:
             statistics[Statistics.AVG_DISTANCE].append(distance_per_tile[0])
@@ -1,28 +1,105 @@
 import numpy as np
-import laspy
-import plyfile
 import os
-from pypcd4 import PointCloud as PCDPointCloud
+import io
+import re
+import struct
+import json
+import hashlib
+import shutil
+import tempfile
+import multiprocessing
+import warnings
 from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
 import utils.pointcloud_format as pf
+from utils.threads import laz_workers, thread_budget, prefetch
+
+# laspy, plyfile, pypcd4, and pyarrow are imported within the functions that need them, so that importing this module stays fast.
+# pyarrow is only required for reading and writing Parquet files.
 
 class FileFormat(str, Enum):
     LAS = 'LAS'
     LAZ = 'LAZ'
     PLY = 'PLY'
     TXT = 'TXT'
+    PARQUET = 'PARQUET'
+
+
+# Names of the PLY property types for numpy dtypes
+PLY_PROPERTY_TYPES = {'i1' : 'char', 'u1' : 'uchar', 'i2' : 'short', 'u2' : 'ushort', 'i4' : 'int', 'u4' : 'uint', 'f4' : 'float', 'f8' : 'double'}
+
+# Returns the column of the field with the given index of a point cloud given as 2-D array or as PointBatch
+def pointcloud_column(pointcloud, idx, field):
+    return pointcloud[field.name] if isinstance(pointcloud, pf.PointBatch) else pointcloud[:, idx]
+
+
+# Writes the point cloud as binary little-endian PLY with one vertex element (the same output as plyfile).
+# The vertices are converted column by column into a structured array of chunk_size points that is reused for all chunks,
+# so that no Python object is created per point and only one chunk is held in memory in addition to the point cloud.
+def write_ply(pointcloud, path, pointcloud_format, chunk_size=1000000):
+    with open(path, 'wb') as ply_file:
+        ply_file.write(ply_header(pointcloud_format, len(pointcloud)))
+        write_ply_vertices(ply_file, pointcloud, pointcloud_format, chunk_size)
+
+def ply_header(pointcloud_format, num_vertices):
+    dtype = pointcloud_format.ply_output_dtypes.newbyteorder('<')
+    header = ['ply', 'format binary_little_endian 1.0', 'element vertex ' + str(num_vertices)]
+    header += ['property ' + PLY_PROPERTY_TYPES[dtype[name].str[1:]] + ' ' + name for name in dtype.names]
+    header += ['end_header']
+    return ('\n'.join(header) + '\n').encode('ascii')
+
+def write_ply_vertices(ply_file, pointcloud, pointcloud_format, chunk_size=1000000):
+    dtype = pointcloud_format.ply_output_dtypes.newbyteorder('<')
+    chunk = np.empty(min(chunk_size, len(pointcloud)), dtype=dtype)
+    for start in range(0, len(pointcloud), chunk_size):
+        points = pointcloud[start:start + chunk_size]
+        vertices = chunk[:len(points)]
+        for idx, field in enumerate(pointcloud_format.fields):
+            vertices[field.name] = pointcloud_column(points, idx, field)
+        vertices.tofile(ply_file)
 
+# The LAS/LAZ files are written in the local CRS of the point clouds (whose origin is at the las_offsets in the world CRS), but each file stores
+# its coordinates relative to an offset of its own near the center of its bounding box (see get_las_header). The las_offsets are stored in a VLR,
+# so that the coordinates can be read in the local CRS again (see las_local_offsets).
+LOCAL_CRS_VLR_USER_ID = 'LocalCRS'
+LOCAL_CRS_VLR_RECORD_ID = 1
 
-def write_ply(pointcloud, path, pointcloud_format):
-    new_pointcloud = np.array(list(map(tuple, pointcloud)), dtype=pointcloud_format.ply_output_dtypes)
-    el = plyfile.PlyElement.describe(new_pointcloud, 'vertex')
-    plyfile.PlyData([el]).write(path)
+# The coordinates of the bounding box a header is derived from are quantized to at most this absolute value, which leaves room in the int32
+# range for points outside of it (e.g., points written to a tile after the first block, or outside the borders of the tile)
+LAS_COORDINATE_RANGE = 2**30
 
-# Constructs a LAS header for a given point cloud format
-def get_las_header(pointcloud_format, offsets=np.array([0, 0, 0]), precision=1000000):
-    las_header = laspy.LasHeader(version='1.4', point_format=2)
-    las_header.offsets = offsets
-    las_header.scales = 1.0 / np.array([precision, precision, precision])
+# Returns the smallest LAS point format that holds the fields of the pointcloud_format besides the extra dimensions:
+# 0 (XYZ and intensity, 20 bytes) or 2 (with RGB, 26 bytes)
+def las_point_format(pointcloud_format):
+    return 2 if any(field in pointcloud_format.fields for field in [pf.R, pf.G, pf.B]) else 0
+
+# Returns the bounding box (a matrix of shape (2,3)) of the coordinates of a point cloud given as 2-D array or PointBatch, ignoring NaN values
+def pointcloud_bbox(pointcloud):
+    xyz = pointcloud.xyz() if isinstance(pointcloud, pf.PointBatch) else pointcloud[:, 0:3]
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        bbox = np.array([np.nanmin(xyz, axis=0), np.nanmax(xyz, axis=0)])
+    return np.nan_to_num(bbox)
+
+# Constructs a LAS header for a given point cloud format.
+# With the bounding box of the points (in the local CRS), the offsets are moved to its center (in whole units), and the scales are derived from the precision
+# (e.g., 1000000 for a scale of 1e-6), but coarsened by powers of ten where the bounding box would not fit into LAS_COORDINATE_RANGE otherwise.
+def get_las_header(pointcloud_format, offsets=np.array([0, 0, 0]), precision=1000000, bbox=None):
+    import laspy
+    las_header = laspy.LasHeader(version='1.4', point_format=las_point_format(pointcloud_format))
+    scales = 1.0 / np.array([precision, precision, precision], dtype=np.float64)
+    if bbox is None:
+        las_header.offsets = offsets
+        las_header.scales = scales
+    else:
+        center = np.round((bbox[0] + bbox[1]) / 2)
+        half_extent = np.maximum(bbox[1] - center, center - bbox[0])
+        with np.errstate(divide='ignore'):
+            exponents = np.maximum(np.ceil(np.log10(half_extent / scales / LAS_COORDINATE_RANGE)), 0)
+        las_header.offsets = np.asarray(offsets, dtype=np.float64) + center
+        las_header.scales = scales * 10.0 ** exponents
+        las_header.vlrs.append(laspy.VLR(user_id=LOCAL_CRS_VLR_USER_ID, record_id=LOCAL_CRS_VLR_RECORD_ID,
+                                         description='Offsets of the local CRS', record_data=struct.pack('<3d', *offsets)))
 
     if pf.SEMANTIC in pointcloud_format.fields:
         las_header.add_extra_dim(laspy.ExtraBytesParams(name='semantic', type=np.uint8))
@@ -35,26 +112,364 @@ def get_las_header(pointcloud_format, offsets=np.array([0, 0, 0]), precision=100
 
     return las_header
 
-# Converts a point cloud stored as numpy array into laspy.LasData for writing it to disk
+# Returns the offsets of a LAS header relative to the local CRS, i.e., the coordinates in the local CRS are X * scale + local offset.
+# For files without the VLR of get_las_header (e.g., files written before it, or by other software), the local offsets are 0, i.e., the offsets are ignored.
+def las_local_offsets(las_header):
+    for vlr in las_header.vlrs:
+        if vlr.user_id == LOCAL_CRS_VLR_USER_ID and vlr.record_id == LOCAL_CRS_VLR_RECORD_ID:
+            return np.asarray(las_header.offsets) - np.array(struct.unpack('<3d', vlr.record_data))
+    return np.zeros(3)
+
+# Quantizes the coordinates of one axis (in the local CRS) for a LAS header, i.e., rounds them to the nearest multiple of its scale.
+# The values (still as float64) are written into the buffer out, if given. Raises a ValueError if a coordinate does not fit into the int32 range
+# (instead of writing a wrapped value). With clip=True, these coordinates are clipped to the border of the range instead (printing their number).
+def quantize_las_coordinates(column, axis, las_header, out=None, clip=False):
+    buffer = np.subtract(column, las_local_offsets(las_header)[axis], out=out, dtype=np.float64)
+    np.divide(buffer, las_header.scales[axis], out=buffer)
+    np.rint(buffer, out=buffer)
+    int32_range = np.iinfo(np.int32)
+    if len(buffer) > 0 and (np.nanmin(buffer) < int32_range.min or np.nanmax(buffer) > int32_range.max):
+        message = 'the range of the LAS file with offset ' + str(las_header.offsets[axis]) + ' and scale ' + str(las_header.scales[axis]) + \
+                  ' (' + pf.COORDINATE_FIELDS[axis].name + ')'
+        if not clip:
+            raise ValueError('The coordinates exceed ' + message + ', consider a lower precision')
+        print('Clipping', np.count_nonzero((buffer < int32_range.min) | (buffer > int32_range.max)), 'coordinates to', message)
+        np.clip(buffer, int32_range.min, int32_range.max, out=buffer)
+    return buffer
+
+# Converts a point cloud stored as numpy array or PointBatch into laspy.LasData for writing it to disk.
+# The coordinates are quantized from float64 (see quantize_las_coordinates) directly into the int32 fields of the point record,
+# using one buffer for all three coordinates. The columns of a PointBatch already have the types of the LAS dimensions and are copied into the record as they are.
 # TODO: according to the LAS/LAZ specifications, color has to be normalized to 16bit
 def las_points_from_pointcloud(pointcloud, pointcloud_format, las_header):
-    las_points = laspy.LasData(las_header)
+    import laspy
+    points = laspy.ScaleAwarePointRecord.zeros(len(pointcloud), header=las_header)
+    is_batch = isinstance(pointcloud, pf.PointBatch)
+    buffer = np.empty(len(pointcloud), dtype=np.float64)
     for idx, field in enumerate(pointcloud_format.fields):
-        if (field is pf.X) or (field is pf.Y) or (field is pf.Z):
-            las_points[field.name] = pointcloud[:, idx].astype(field.dtype) / las_header.scales[0]
+        column = pointcloud_column(pointcloud, idx, field)
+        if field in pf.COORDINATE_FIELDS:
+            quantize_las_coordinates(column, pf.COORDINATE_FIELDS.index(field), las_header, out=buffer)
+            with np.errstate(invalid='ignore'):
+                points.array[field.name] = buffer
         else:
-            las_points[field.name] = pointcloud[:, idx].astype(field.dtype)
-    return las_points
+            points.array[field.name] = column if is_batch else column.astype(field.dtype)
+    return laspy.LasData(las_header, points=points)
+
 
+# Returns the laspy backend for compressing or decompressing LAZ files with the given number of threads (defaults to utils.threads.laz_workers).
+# With more than one thread, lazrs processes the chunks of a file in parallel, which results in the same file as the sequential compression.
+# Its thread pool is created on its first use, so the number of threads of a process is fixed by its first parallel write.
+def get_laz_backend(num_workers=None):
+    import laspy
+    num_workers = laz_workers() if num_workers is None else num_workers
+    available_backends = laspy.LazBackend.detect_available()
+    if num_workers > 1 and laspy.LazBackend.LazrsParallel in available_backends:
+        os.environ['RAYON_NUM_THREADS'] = str(num_workers)
+        return laspy.LazBackend.LazrsParallel
+    sequential_backends = [backend for backend in available_backends if backend != laspy.LazBackend.LazrsParallel]
+    return sequential_backends[0] if sequential_backends else None
 
-def write_las(pointcloud, path, pointcloud_format, offsets = np.array([0, 0, 0]), precision=1000000):
-    las_header = get_las_header(pointcloud_format, offsets, precision)
+def write_las(pointcloud, path, pointcloud_format, offsets = np.array([0, 0, 0]), precision=1000000, laz_workers=None):
+    import laspy
+    las_header = get_las_header(pointcloud_format, offsets, precision, bbox=pointcloud_bbox(pointcloud))
     las_points = las_points_from_pointcloud(pointcloud, pointcloud_format, las_header)
-    with laspy.open(path, mode='w', header=las_header) as outfile:
+    with laspy.open(path, mode='w', header=las_header, laz_backend=get_laz_backend(laz_workers)) as outfile:
         outfile.write_points(las_points.points)
 
 
-def write_pointcloud(pointcloud, folder, filename, file_format, pointcloud_format, las_offsets=np.array([0, 0, 0]), las_precision=1000000):
+# Conversion specifiers of np.savetxt formats that write_txt formats vectorized: fixed-point floats with a precision and integers
+TXT_FORMAT_SPECIFIER = re.compile(r'%1?\.(\d)f|%[diu]')
+
+# The digits of the numbers 0 to 9999 as 4-byte groups, first zero-padded, then with the leading zeros as zero bytes, then only zero bytes.
+# Zero bytes mark characters that are not written (see format_txt_chunk).
+PADDED_DIGITS = (np.arange(10000)[:, None] // np.array([1000, 100, 10, 1]) % 10 + ord('0')).astype(np.uint8)
+DIGIT_GROUPS = np.concatenate([PADDED_DIGITS,
+                               np.where(np.arange(10000)[:, None] >= np.array([1000, 100, 10, 0]), PADDED_DIGITS, 0).astype(np.uint8),
+                               np.zeros((10000, 4), dtype=np.uint8)]).view('V4').ravel()
+# The zero-padded last 1 to 4 digits of the numbers 0 to 9999, for fractions
+FRACTION_GROUPS = {width : np.ascontiguousarray(PADDED_DIGITS[:, 4 - width:]).view('V' + str(width)).ravel() for width in range(1, 5)}
+
+# Writes the decimal digits of non-negative integers right-aligned to chars[:, start:start + 4 * num_groups], with zero bytes instead of leading zeros
+def fill_integer_digits(chars, start, values, num_groups):
+    remaining = values
+    for group_index in range(num_groups):
+        position = start + 4 * (num_groups - group_index - 1)
+        if group_index == num_groups - 1:
+            # the most significant group is smaller than 10000
+            higher, group = None, remaining
+        else:
+            higher = remaining // 10000
+            group = remaining - higher * 10000
+        # the digits of the most significant group of a value are not padded, and groups before it are empty
+        if group_index == 0:
+            index = group + 10000 if higher is None else np.where(higher > 0, group, group + 10000)
+        else:
+            index = np.where(remaining > 0, group + 10000, 20000) if higher is None else np.where(higher > 0, group, np.where(group > 0, group + 10000, 20000))
+        chars[:, position:position + 4].view('V4')[:, 0] = DIGIT_GROUPS[index]
+        remaining = higher
+
+# Writes the zero-padded decimal digits of fractions (integers below 10**precision) to chars[:, start:start + precision]
+def fill_fraction_digits(chars, start, values, precision):
+    position = start + precision
+    remaining = values
+    while position > start:
+        width = min(4, position - start)
+        higher = remaining // 10000
+        chars[:, position - width:position].view('V' + str(width))[:, 0] = FRACTION_GROUPS[width][remaining - higher * 10000]
+        position -= width
+        remaining = higher
+
+# Returns the absolute values multiplied by the scale and rounded to integers (ties to even) like Python's %f formatting, which rounds the exact product.
+# The rounded floating-point product only differs close to a tie. There, the exact product is determined with Dekker's algorithm (product plus error).
+def round_scaled(absolute, scale):
+    scaled = absolute * scale
+    rounded = np.rint(scaled)
+    close = ~(np.abs(scaled - rounded) < 0.5 - scaled * 2**-50) & (scaled < 2**52)
+    if close.any():
+        value, product = absolute[close], scaled[close]
+        split = 134217729.0 * value
+        value_high = split - (split - value)
+        value_low = value - value_high
+        split = 134217729.0 * scale
+        scale_high = split - (split - scale)
+        scale_low = scale - scale_high
+        error = ((value_high * scale_high - product) + value_high * scale_low + value_low * scale_high) + value_low * scale_low
+        integer = np.floor(product)
+        difference = (product - integer - 0.5) + error
+        rounded[close] = integer + ((difference > 0) | ((difference == 0) & (integer % 2 == 1)))
+    return scaled, rounded
+
+# Formats a chunk of a point cloud like np.savetxt, returning the bytes of its lines.
+# The lines are laid out in a matrix of characters with fixed-width columns, in which zero bytes mark the characters that are not written
+# (e.g., leading zeros or the sign of positive values). Values whose formatting cannot be reproduced exactly with integer arithmetic
+# (NaN, infinity, and very large values) are formatted with Python in their row.
+def format_txt_chunk(chunk, fmt):
+    specifiers = list(TXT_FORMAT_SPECIFIER.finditer(fmt))
+    literals = [fmt[:specifiers[0].start()]] + [fmt[previous.end():specifier.start()] for previous, specifier in zip(specifiers, specifiers[1:])] + [fmt[specifiers[-1].end():] + '\n']
+    num_rows = len(chunk)
+    exact = np.ones(num_rows, dtype=bool)
+
+    # the sign, integer part, and fraction of each column
+    columns = []
+    with np.errstate(invalid='ignore'):
+        for column, specifier in enumerate(specifiers):
+            values = chunk[:, column].astype(np.float64, copy=False)
+            if specifier.group(1) is not None:
+                precision = int(specifier.group(1))
+                scaled, rounded = round_scaled(np.abs(values), float(10**precision))
+                exact &= scaled < 2**52
+                negative = np.signbit(values)
+            else:
+                precision = 0
+                rounded = np.trunc(values)
+                exact &= np.abs(rounded) < 2**52
+                negative = rounded < 0
+                rounded = np.abs(rounded)
+            integers = rounded if exact.all() else np.where(exact, rounded, 0)
+            integers = integers.astype(np.int64 if num_rows > 0 and integers.max() >= 2**31 else np.int32)
+            integer_part, fraction = integers, None
+            if precision > 0:
+                integer_part = integers // 10**precision
+                fraction = integers - integer_part * 10**precision
+            num_groups = (len(str(integer_part.max())) + 3) // 4 if num_rows > 0 else 1
+            columns.append((negative, integer_part, num_groups, fraction, precision))
+
+    # the literals are copied from a template line, which only has a sign character for columns with negative values
+    template = bytearray(literals[0].encode())
+    layout = []
+    for (negative, integer_part, num_groups, fraction, precision), literal in zip(columns, literals[1:]):
+        sign_position = len(template) if negative.any() else None
+        template += bytes((sign_position is not None) + 4 * num_groups)
+        layout.append((sign_position, len(template) - 4 * num_groups))
+        if precision > 0:
+            template += b'.' + bytes(precision)
+        template += literal.encode()
+    chars = np.empty((num_rows, len(template)), dtype=np.uint8)
+    chars[:] = np.frombuffer(bytes(template), dtype=np.uint8)
+    for (negative, integer_part, num_groups, fraction, precision), (sign_position, position) in zip(columns, layout):
+        if sign_position is not None:
+            chars[:, sign_position] = np.where(negative, ord('-'), 0)
+        fill_integer_digits(chars, position, integer_part, num_groups)
+        if precision > 0:
+            fill_fraction_digits(chars, position + 4 * num_groups + 1, fraction, precision)
+
+    written = chars != 0
+    data = np.compress(written.ravel(), chars.ravel()).tobytes()
+    if exact.all():
+        return data
+
+    # replace the lines of rows with inexact values by lines formatted with Python
+    line_ends = np.cumsum(written.sum(axis=1))
+    parts = []
+    previous_end = 0
+    for row in np.flatnonzero(~exact):
+        parts.append(data[previous_end:line_ends[row - 1] if row > 0 else 0])
+        parts.append((fmt % tuple(chunk[row]) + '\n').encode())
+        previous_end = line_ends[row]
+    parts.append(data[previous_end:])
+    return b''.join(parts)
+
+# Writes the point cloud as text file with the same content as np.savetxt with the header and format of the pointcloud_format, but much faster:
+# the rows are formatted vectorized in chunks of chunk_size rows (small enough for the characters of a chunk to stay in the CPU cache),
+# which are formatted concurrently by num_workers threads (defaults to the thread budget).
+# Formats other than fixed-point floats (e.g., %1.6f) and integers (%u) are written with np.savetxt. The columns of a PointBatch are stacked chunk by chunk.
+def write_txt(pointcloud, path, pointcloud_format, chunk_size=16384, num_workers=None):
+    with open(path, 'wb') as txt_file:
+        txt_file.write(txt_header(pointcloud_format))
+        write_txt_rows(txt_file, pointcloud, pointcloud_format, chunk_size, num_workers)
+
+def txt_header(pointcloud_format):
+    return ('# ' + pointcloud_format.txt_output_header.replace('\n', '\n# ') + '\n').encode()
+
+def write_txt_rows(txt_file, pointcloud, pointcloud_format, chunk_size=16384, num_workers=None):
+    fmt = pointcloud_format.txt_output_dtypes
+    is_batch = isinstance(pointcloud, pf.PointBatch)
+    num_columns = len(pointcloud.columns) if is_batch else (pointcloud.shape[1] if pointcloud.ndim == 2 else None)
+    if len(TXT_FORMAT_SPECIFIER.findall(fmt)) != fmt.count('%') or fmt.count('%') != num_columns:
+        np.savetxt(txt_file, pointcloud.to_array() if is_batch else pointcloud, fmt=fmt)
+        return
+
+    def format_chunk(start):
+        chunk = pointcloud[start:start + chunk_size]
+        return format_txt_chunk(chunk.to_array() if is_batch else chunk, fmt)
+
+    starts = range(0, len(pointcloud), chunk_size)
+    num_workers = thread_budget() if num_workers is None else num_workers
+    if num_workers > 1 and len(starts) > 1:
+        # at most num_workers chunks are formatted ahead of the writing
+        for data in prefetch(format_chunk, starts, num_workers):
+            txt_file.write(data)
+    else:
+        for start in starts:
+            txt_file.write(format_chunk(start))
+
+
+# Returns the pyarrow schema of Parquet files with the fields of the pointcloud_format: one column per field with the type of the PointBatch column
+def parquet_schema(pointcloud_format):
+    import pyarrow as pa
+    return pa.schema([(field.name, pa.from_numpy_dtype(pf.column_dtype(field))) for field in pointcloud_format.fields])
+
+def open_parquet_writer(path, pointcloud_format):
+    import pyarrow.parquet as pq
+    return pq.ParquetWriter(path, parquet_schema(pointcloud_format), compression='zstd')
+
+# Returns the indices of the points sorted by the tile of a grid on the ground plane and the start index of each (non-empty) tile in this order.
+# The grid divides the bounding box of the points into equal tiles with row_group_size points each on average.
+def parquet_tile_order(pointcloud, row_group_size):
+    xy = pointcloud.xyz()[:, :2]
+    num_tiles = int(np.ceil(np.sqrt(len(pointcloud) / row_group_size)))
+    if num_tiles <= 1:
+        return np.arange(len(pointcloud)), np.array([0])
+    bbox = pointcloud_bbox(pointcloud)[:, :2]
+    tile_size = np.maximum(bbox[1] - bbox[0], np.finfo(np.float64).tiny) / num_tiles
+    with np.errstate(invalid='ignore'):
+        tile_idx = np.clip(((xy - bbox[0]) / tile_size).astype(int), 0, num_tiles - 1)
+    tile_keys = tile_idx[:, 0] * num_tiles + tile_idx[:, 1]
+    order = np.argsort(tile_keys, kind='stable')
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(tile_keys[order])) + 1])
+    return order, starts
+
+# Writes the points (a 2-D array or PointBatch) with an open ParquetWriter. The points are sorted into tiles (see parquet_tile_order), and each tile is
+# written as row groups of at most row_group_size points, so that no row group spans multiple tiles. With the min/max statistics of the row groups,
+# readers can skip the row groups outside a bounding box (or without changes) entirely.
+def write_parquet_row_groups(parquet_writer, pointcloud, pointcloud_format, row_group_size=1000000):
+    import pyarrow as pa
+    if not isinstance(pointcloud, pf.PointBatch):
+        pointcloud = pf.PointBatch.from_array(pointcloud, pointcloud_format)
+    order, starts = parquet_tile_order(pointcloud, row_group_size)
+    for start, end in zip(starts, np.append(starts[1:], len(pointcloud))):
+        tile = pointcloud[order[start:end]]
+        parquet_writer.write_table(pa.table(tile.columns, schema=parquet_writer.schema), row_group_size=row_group_size)
+
+# Writes the point cloud as Parquet file with zstd compression, typed columns (see parquet_schema), and tile-aligned row groups (see write_parquet_row_groups)
+def write_parquet(pointcloud, path, pointcloud_format, row_group_size=1000000):
+    with open_parquet_writer(path, pointcloud_format) as parquet_writer:
+        write_parquet_row_groups(parquet_writer, pointcloud, pointcloud_format, row_group_size)
+
+
+# Writes a point cloud block by block, so that it never has to be held in memory completely, with the same result as write_pointcloud for the whole point cloud.
+# LAS/LAZ and text files are written directly. As the header of a LAS/LAZ file is written before the points, the offsets and scales are derived from the bbox
+# of the whole point cloud (a matrix of shape (2,3) in the local CRS) if it is given, which results in the same file as write_pointcloud. Otherwise, the
+# coordinates are stored relative to the las_offsets with the las_precision (like get_las_header without bbox), as later blocks can be far from the first one.
+# As the header of a PLY file contains the number of vertices, the vertices are written to a temporary file in the output folder first, which is copied
+# behind the header when closing the writer.
+# Parquet files get the row groups of each block (i.e., the tiles of a block are not merged with the tiles of other blocks).
+class PointcloudWriter:
+    def __init__(self, folder, filename, file_format, pointcloud_format, las_offsets=np.array([0, 0, 0]), las_precision=1000000, laz_workers=None, bbox=None):
+        self.path = os.path.join(folder, filename + '.' + file_format.value.lower())
+        self.bbox = bbox
+        self.filename = filename
+        self.file_format = file_format
+        self.pointcloud_format = pointcloud_format
+        self.las_offsets = las_offsets
+        self.las_precision = las_precision
+        self.laz_workers = laz_workers
+        self.file = None    # opened when the first points are written
+        self.num_points = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def open(self):
+        if self.file_format == FileFormat.LAS or self.file_format == FileFormat.LAZ:
+            import laspy
+            self.las_header = get_las_header(self.pointcloud_format, self.las_offsets, self.las_precision, bbox=self.bbox)
+            self.file = laspy.open(self.path, mode='w', header=self.las_header, laz_backend=get_laz_backend(self.laz_workers))
+        elif self.file_format == FileFormat.PLY:
+            self.file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)))
+        elif self.file_format == FileFormat.TXT:
+            self.file = open(self.path, 'wb')
+            self.file.write(txt_header(self.pointcloud_format))
+        elif self.file_format == FileFormat.PARQUET:
+            self.file = open_parquet_writer(self.path, self.pointcloud_format)
+
+    def write(self, points):
+        if not isinstance(points, pf.PointBatch):
+            points = np.asarray(points)
+        if len(points) == 0:
+            return
+        if self.file is None:
+            self.open()
+
+        if self.file_format == FileFormat.LAS or self.file_format == FileFormat.LAZ:
+            self.file.write_points(las_points_from_pointcloud(points, self.pointcloud_format, self.las_header).points)
+        elif self.file_format == FileFormat.PLY:
+            write_ply_vertices(self.file, points, self.pointcloud_format)
+        elif self.file_format == FileFormat.TXT:
+            write_txt_rows(self.file, points, self.pointcloud_format)
+        elif self.file_format == FileFormat.PARQUET:
+            write_parquet_row_groups(self.file, points, self.pointcloud_format)
+        self.num_points += len(points)
+
+    def close(self):
+        if self.file is None:
+            print('Pointcloud', self.filename, 'is empty')
+            return
+
+        if self.file_format == FileFormat.PLY:
+            self.file.seek(0)
+            with open(self.path, 'wb') as ply_file:
+                ply_file.write(ply_header(self.pointcloud_format, self.num_points))
+                shutil.copyfileobj(self.file, ply_file, 2**24)
+        self.file.close()
+        self.file = None
+
+
+# Writes the point cloud (a numpy array with the fields of the pointcloud_format as columns, or a PointBatch) in the given format.
+# Instead of an array, an iterable of point blocks (e.g., a generator yielding the points of each scan) can be given, which are written one after
+# the other with bounded memory (see PointcloudWriter, which also describes the bbox of the blocks).
+def write_pointcloud(pointcloud, folder, filename, file_format, pointcloud_format, las_offsets=np.array([0, 0, 0]), las_precision=1000000, laz_workers=None, bbox=None):
+    if not isinstance(pointcloud, (np.ndarray, pf.PointBatch)):
+        with PointcloudWriter(folder, filename, file_format, pointcloud_format, las_offsets, las_precision, laz_workers, bbox) as writer:
+            for points in pointcloud:
+                writer.write(points)
+        return
+
     if len(pointcloud) == 0:
         print('Pointcloud', filename, 'is empty')
         return
@@ -62,57 +477,605 @@ def write_pointcloud(pointcloud, folder, filename, file_format, pointcloud_forma
     if file_format == FileFormat.LAS:
         write_las(pointcloud, os.path.join(folder, filename + '.las'), pointcloud_format, offsets=las_offsets, precision=las_precision)
     elif file_format == FileFormat.LAZ:
-        write_las(pointcloud, os.path.join(folder, filename + '.laz'), pointcloud_format, offsets=las_offsets, precision=las_precision)
+        write_las(pointcloud, os.path.join(folder, filename + '.laz'), pointcloud_format, offsets=las_offsets, precision=las_precision, laz_workers=laz_workers)
     elif file_format == FileFormat.PLY:
         write_ply(pointcloud, os.path.join(folder, filename + '.ply'), pointcloud_format)
     elif file_format == FileFormat.TXT:
-        output_path = os.path.join(folder, filename + '.txt')
-        np.savetxt(output_path, 
-                   pointcloud, 
-                   header=pointcloud_format.txt_output_header, 
-                   fmt=pointcloud_format.txt_output_dtypes)
+        write_txt(pointcloud, os.path.join(folder, filename + '.txt'), pointcloud_format)
+    elif file_format == FileFormat.PARQUET:
+        write_parquet(pointcloud, os.path.join(folder, filename + '.parquet'), pointcloud_format)
 
 
 # Ignores offset for avoiding precision errors during later computations
-def read_las_in_local_crs(path):
-    pointcloud = laspy.read(path)
+# (only the offsets relative to the local CRS are applied, see las_local_offsets)
+# laz_workers is the number of threads for decompressing LAZ files (see get_laz_backend).
+def read_las_in_local_crs(path, laz_workers=None):
+    import laspy
+    pointcloud = laspy.read(path, laz_backend=get_laz_backend(laz_workers))
     scales = pointcloud.header.scales
+    offsets = las_local_offsets(pointcloud.header)
+    xyz = (pointcloud.X * scales[0] + offsets[0], pointcloud.Y * scales[1] + offsets[1], pointcloud.Z * scales[2] + offsets[2])
     if "change" in pointcloud.point_format.dimension_names:
-        pointcloud = np.column_stack((pointcloud.X * scales[0], pointcloud.Y * scales[1], pointcloud.Z * scales[2], pointcloud.change))
+        pointcloud = np.column_stack(xyz + (pointcloud.change,))
     else:
-        pointcloud = np.column_stack((pointcloud.X * scales[0], pointcloud.Y * scales[1], pointcloud.Z * scales[2]))
+        pointcloud = np.column_stack(xyz)
     return pointcloud
 
+# Reads a LAS/LAZ file like read_las_in_local_crs, but yields blocks of at most chunk_points points, so that the file is never held in memory completely
+def iterate_las_in_local_crs(path, chunk_points):
+    import laspy
+    with laspy.open(path, laz_backend=get_laz_backend()) as las_file:
+        scales = las_file.header.scales
+        offsets = las_local_offsets(las_file.header)
+        has_change = "change" in las_file.header.point_format.dimension_names
+        for points in las_file.chunk_iterator(chunk_points):
+            xyz = (points.X * scales[0] + offsets[0], points.Y * scales[1] + offsets[1], points.Z * scales[2] + offsets[2])
+            if has_change:
+                yield np.column_stack(xyz + (points.change,))
+            else:
+                yield np.column_stack(xyz)
+
+
+# The layers of LAZ files with point formats 6 to 10 that contain the standard dimensions (other than X, Y, and the returns, which are always decompressed)
+LAZ_DIMENSION_LAYERS = {'z' : 'Z', 'classification' : 'CLASSIFICATION', 'synthetic' : 'FLAGS', 'key_point' : 'FLAGS', 'withheld' : 'FLAGS', 'overlap' : 'FLAGS',
+                        'intensity' : 'INTENSITY', 'scan_angle' : 'SCAN_ANGLE', 'user_data' : 'USER_DATA', 'point_source_id' : 'POINT_SOURCE_ID',
+                        'gps_time' : 'GPS_TIME', 'red' : 'RGB', 'green' : 'RGB', 'blue' : 'RGB', 'nir' : 'NIR'}
+LAZ_BASE_DIMENSIONS = ['x', 'y', 'return_number', 'number_of_returns', 'scan_direction_flag', 'edge_of_flight_line', 'scanner_channel']
+
+def laz_decompression_selection(dimensions, extra_dimensions):
+    from laspy import DecompressionSelection
+    selection = DecompressionSelection.base()
+    for dimension in dimensions:
+        if dimension in extra_dimensions:
+            selection |= DecompressionSelection.ALL_EXTRA_BYTES
+        elif dimension.lower() in LAZ_DIMENSION_LAYERS:
+            selection |= DecompressionSelection[LAZ_DIMENSION_LAYERS[dimension.lower()]]
+        elif dimension.lower() not in LAZ_BASE_DIMENSIONS:
+            return DecompressionSelection.all()
+    return selection
+
+# Reads the given dimensions of a LAS/LAZ file as dictionary of columns with the types of the file (e.g., an extra dimension change of type uint8 stays uint8),
+# instead of converting all of them to one float64 matrix. The coordinates x, y, and z are returned in the local CRS (see read_las_in_local_crs), X, Y, and Z as stored.
+# Uncompressed files are memory-mapped, so only the requested dimensions are read. Of LAZ files, only the layers that contain the requested dimensions
+# are decompressed (for point formats 6 to 10, other formats are always decompressed completely).
+def read_las_columns(path, dimensions):
+    import laspy
+    with laspy.open(path) as las_file:
+        header = las_file.header
+    extra_dimensions = list(header.point_format.extra_dimension_names)
+    dtype = header.point_format.dtype()
+    if not header.are_points_compressed and dtype.itemsize == header.point_format.size:
+        data = np.memmap(path, dtype=dtype, mode='r', offset=header.offset_to_point_data, shape=(header.point_count,)) if header.point_count > 0 else np.empty(0, dtype=dtype)
+        points = laspy.ScaleAwarePointRecord(data, header.point_format, header.scales, header.offsets)
+    else:
+        with laspy.open(path, laz_backend=get_laz_backend(), decompression_selection=laz_decompression_selection(dimensions, extra_dimensions)) as las_file:
+            points = las_file.read_points(header.point_count)
+
+    columns = {}
+    for dimension in dimensions:
+        if dimension in ['x', 'y', 'z']:
+            axis = 'xyz'.index(dimension)
+            columns[dimension] = points[dimension.upper()] * header.scales[axis] + las_local_offsets(header)[axis]
+        else:
+            columns[dimension] = np.asarray(points[dimension])
+    return columns
+
+# Reads the given columns of a Parquet file as dictionary of numpy arrays. Only the requested columns are read and decompressed.
+# With a bbox (a matrix of shape (2,2) on the ground plane), only the row groups whose statistics overlap it are read, and the points outside it are dropped.
+def read_parquet_columns(path, dimensions, bbox=None):
+    import pyarrow.parquet as pq
+    filters = None
+    if bbox is not None:
+        filters = [('X', '>=', bbox[0][0]), ('X', '<=', bbox[1][0]), ('Y', '>=', bbox[0][1]), ('Y', '<=', bbox[1][1])]
+    table = pq.read_table(path, columns=list(dimensions), filters=filters)
+    return {dimension : table.column(dimension).to_numpy() for dimension in dimensions}
+
+# Yields the given columns of a Parquet file as float64 arrays with at most chunk_points rows (see iterate_las_in_local_crs)
+def iterate_parquet(path, columns, chunk_points):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_points, columns=columns):
+        yield np.column_stack([batch.column(name).to_numpy() for name in columns]).astype(np.float64, copy=False)
+
+# Reads the given dimensions of a LAS/LAZ (see read_las_columns), PLY (properties of the vertex element), PCD, or Parquet file as dictionary of typed columns.
+# Except for the coordinates of LAS/LAZ files, the columns are views of the file data (memory-mapped for binary files).
+def read_pointcloud_columns(filepath, dimensions):
+    if filepath.endswith('.las') or filepath.endswith('.laz'):
+        return read_las_columns(filepath, dimensions)
+    elif filepath.endswith('.ply'):
+        data = read_ply_fields(filepath, dimensions, element='vertex')
+    elif filepath.endswith('.pcd'):
+        data = read_pcd_fields(filepath, dimensions)
+    elif filepath.endswith('.parquet'):
+        return read_parquet_columns(filepath, dimensions)
+    else:
+        raise ValueError('Reading columns is not supported for ' + filepath)
+    return {dimension : data[dimension] for dimension in dimensions}
+
+# Reads the fields of the pointcloud_format from a LAS/LAZ, PLY, PCD, or Parquet file as PointBatch (see read_pointcloud_columns), e.g., to read a point cloud
+# written by write_pointcloud. The coordinates of LAS/LAZ files are read in the local CRS. Columns of the type of their field are not copied.
+def read_point_batch(filepath, pointcloud_format):
+    is_las = filepath.endswith('.las') or filepath.endswith('.laz')
+    dimensions = [field.name.lower() if is_las and field in pf.COORDINATE_FIELDS else field.name for field in pointcloud_format.fields]
+    columns = read_pointcloud_columns(filepath, dimensions)
+    return pf.PointBatch(pointcloud_format, {field.name : columns[dimension] for field, dimension in zip(pointcloud_format.fields, dimensions)})
+
+
+# numpy dtypes of the PLY property types (including the alternative names of the types)
+PLY_DTYPES = {'char' : 'i1', 'uchar' : 'u1', 'short' : 'i2', 'ushort' : 'u2', 'int' : 'i4', 'uint' : 'u4', 'float' : 'f4', 'double' : 'f8',
+              'int8' : 'i1', 'uint8' : 'u1', 'int16' : 'i2', 'uint16' : 'u2', 'int32' : 'i4', 'uint32' : 'u4', 'float32' : 'f4', 'float64' : 'f8'}
+
+# Parses the header of a PLY file. Returns the format (e.g., binary_little_endian), the size of the header in bytes, and a list of
+# (name, count, properties) for each element, where properties is a list of (name, type), with type being None for list properties.
+def read_ply_header(path):
+    ply_format = None
+    elements = []
+    with open(path, 'rb') as ply_file:
+        if ply_file.readline().strip() != b'ply':
+            raise ValueError(path + ' is not a PLY file')
+        for line in ply_file:
+            words = line.decode('ascii', errors='replace').split()
+            if not words:
+                continue
+            if words[0] == 'format':
+                ply_format = words[1]
+            elif words[0] == 'element':
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == 'property':
+                elements[-1][2].append((words[-1], None if words[1] == 'list' else PLY_DTYPES[words[1]]))
+            elif words[0] == 'end_header':
+                return ply_format, ply_file.tell(), elements
+    raise ValueError(path + ' has no complete PLY header')
+
+# Reads an element of a PLY file (by default, the first one) as structured array. For binary files, the array is memory-mapped,
+# and fields only selects a view of the requested properties, i.e., no data is read until it is accessed (e.g., by np.column_stack).
+# ASCII files and elements that follow an element with list properties (whose size is unknown without reading it) are read with plyfile.
+def read_ply_fields(path, fields=None, element=None):
+    ply_format, header_size, elements = read_ply_header(path)
+    element_names = [name for name, _, _ in elements]
+    if element is None:
+        element = element_names[0]
+    if element not in element_names:
+        raise ValueError(path + ' has no element ' + element)
+
+    byte_order = {'binary_little_endian' : '<', 'binary_big_endian' : '>'}.get(ply_format)
+    preceding_elements = elements[:element_names.index(element) + 1]
+    if byte_order is not None and all(dtype is not None for _, _, properties in preceding_elements for _, dtype in properties):
+        offset = header_size
+        for name, count, properties in preceding_elements:
+            dtype = np.dtype([(property_name, byte_order + property_dtype) for property_name, property_dtype in properties])
+            if name == element:
+                break
+            offset += count * dtype.itemsize
+        data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,)) if count > 0 else np.empty(0, dtype=dtype)
+    else:
+        import plyfile
+        data = plyfile.PlyData.read(path)[element].data
+    return data if fields is None else data[list(fields)]
+
+# numpy dtypes of the PCD types (TYPE) and sizes (SIZE)
+PCD_DTYPES = {('F', '4') : 'f4', ('F', '8') : 'f8', ('U', '1') : 'u1', ('U', '2') : 'u2', ('U', '4') : 'u4', ('U', '8') : 'u8',
+              ('I', '1') : 'i1', ('I', '2') : 'i2', ('I', '4') : 'i4', ('I', '8') : 'i8'}
+
+# Returns the header of a PCD file as dictionary of its keywords (e.g., FIELDS or POINTS) and their values, and the size of the header in bytes
+def read_pcd_header(path):
+    header = {}
+    with open(path, 'rb') as pcd_file:
+        for line in pcd_file:
+            words = line.decode('ascii', errors='replace').split()
+            if not words or words[0].startswith('#'):
+                continue
+            header[words[0].upper()] = words[1:]
+            if words[0].upper() == 'DATA':
+                return header, pcd_file.tell()
+    raise ValueError(path + ' has no complete PCD header')
+
+def pcd_point_count(header):
+    return int(header['POINTS'][0]) if 'POINTS' in header else int(header['WIDTH'][0]) * int(header['HEIGHT'][0])
+
+# Reads the points of a PCD file as structured array (see read_ply_fields). Files with binary data are memory-mapped,
+# while ASCII and compressed files are read with pypcd4. Padding fields (named _) are dropped.
+def read_pcd_fields(path, fields=None):
+    header, header_size = read_pcd_header(path)
+    names = header['FIELDS']
+    if fields is None:
+        fields = [name for name in names if name != '_']
+    if header['DATA'][0] == 'binary':
+        counts = header.get('COUNT', ['1'] * len(names))
+        dtype = np.dtype([(name if name != '_' else '_' + str(idx), '<' + PCD_DTYPES[(type, size)], (int(count),) if int(count) > 1 else ())
+                          for idx, (name, type, size, count) in enumerate(zip(names, header['TYPE'], header['SIZE'], counts))])
+        num_points = pcd_point_count(header)
+        data = np.memmap(path, dtype=dtype, mode='r', offset=header_size, shape=(num_points,)) if num_points > 0 else np.empty(0, dtype=dtype)
+    else:
+        from pypcd4 import PointCloud as PCDPointCloud
+        data = PCDPointCloud.from_path(path).pc_data
+    return data[list(fields)]
+
+
+# Returns the number of points of a LAS/LAZ, PLY (the vertex element, else the first element), PCD, or Parquet file by reading only its header (or footer),
+# or None for other files (e.g., text files). Unlike read_pointcloud_for_evaluation, points with NaN coordinates are counted as well.
+def count_points(filepath):
+    if filepath.endswith('.las') or filepath.endswith('.laz'):
+        with open(filepath, 'rb') as las_file:
+            header = las_file.read(255)
+        if header[:4] != b'LASF':
+            raise ValueError(filepath + ' is not a LAS file')
+        # LAS 1.4 stores the number of points as 64-bit integer, the legacy 32-bit field can be 0
+        if header[25] >= 4 and len(header) >= 255:
+            return struct.unpack_from('<Q', header, 247)[0]
+        return struct.unpack_from('<I', header, 107)[0]
+    elif filepath.endswith('.ply'):
+        _, _, elements = read_ply_header(filepath)
+        counts = {name : count for name, count, _ in elements}
+        return counts.get('vertex', elements[0][1] if elements else 0)
+    elif filepath.endswith('.pcd'):
+        return pcd_point_count(read_pcd_header(filepath)[0])
+    elif filepath.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return None
+        return pq.ParquetFile(filepath).metadata.num_rows
+    return None
+
+# Returns the bounding box (a matrix of shape (2,3) in the local CRS, see las_local_offsets) of a LAS/LAZ or Parquet file from its header
+# (or the column statistics in its footer), or None for other files
+def read_bbox_from_header(filepath):
+    if filepath.endswith('.las') or filepath.endswith('.laz'):
+        import laspy
+        with laspy.open(filepath) as las_file:
+            header = las_file.header
+        base = np.asarray(header.offsets) - las_local_offsets(header)
+        return np.array([header.mins - base, header.maxs - base])
+    elif filepath.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(filepath).metadata
+        names = [metadata.schema.column(idx).name for idx in range(metadata.num_columns)]
+        bbox = np.array([[np.inf] * 3, [-np.inf] * 3])
+        for row_group in range(metadata.num_row_groups):
+            for axis, field in enumerate(pf.COORDINATE_FIELDS):
+                statistics = metadata.row_group(row_group).column(names.index(field.name)).statistics
+                bbox[0, axis] = min(bbox[0, axis], statistics.min)
+                bbox[1, axis] = max(bbox[1, axis], statistics.max)
+        return bbox
+    return None
+
+# Returns the number of points of a file from its header like count_points, but None for PCD files that can contain invalid (NaN) points, which are
+# dropped when reading them: organized point clouds (HEIGHT > 1) and point clouds that are not declared to be dense
+def count_points_from_header(filepath):
+    if filepath.endswith('.pcd'):
+        header = read_pcd_header(filepath)[0]
+        if int(header.get('HEIGHT', ['1'])[0]) > 1 or header.get('IS_DENSE', ['1'])[0].lower() in ['0', 'false']:
+            return None
+    return count_points(filepath)
+
+# Binary caches of text files are stored next to them as [filename].cache-[hash of the parameters].npy (see read_txt_columns)
+TXT_CACHE_INFIX = '.cache-'
+
+def is_txt_cache(path):
+    return TXT_CACHE_INFIX in os.path.basename(path) and path.endswith('.npy')
+
+# Detects the number of header lines (0 or 1, i.e., whether the first line contains non-numeric values) and the delimiter (',', ';', tab, or whitespace) of a text file
+def detect_txt_format(path):
+    with open(path, 'r', errors='replace') as txt_file:
+        lines = [line for line in (txt_file.readline() for _ in range(2)) if line.strip()]
+    if not lines:
+        return 0, None
+    delimiter = next((candidate for candidate in [',', ';', '\t'] if candidate in lines[-1]), None)
+    try:
+        [float(value) for value in lines[0].split(delimiter) if value.strip()]
+        return 0, delimiter
+    except ValueError:
+        return 1, delimiter
+
+def parse_txt_chunk(path, start, end, usecols, dtype, delimiter, ndmin):
+    with open(path, 'rb') as txt_file:
+        txt_file.seek(start)
+        data = txt_file.read(end - start).decode()
+    return np.loadtxt(io.StringIO(data), usecols=usecols, dtype=dtype, delimiter=delimiter, ndmin=ndmin)
+
+# Returns the offsets at which the text file is split into chunks of about chunk_bytes, such that each chunk starts at a line
+def txt_chunk_offsets(path, start, chunk_bytes):
+    file_size = os.path.getsize(path)
+    offsets = [start]
+    with open(path, 'rb') as txt_file:
+        while offsets[-1] + chunk_bytes < file_size:
+            txt_file.seek(offsets[-1] + chunk_bytes)
+            txt_file.readline()
+            if txt_file.tell() >= file_size:
+                break
+            offsets.append(txt_file.tell())
+    return offsets + [file_size]
+
+# The value of skiprows and delimiter of read_txt_columns for detecting them from the file
+DETECT_TXT_FORMAT = 'detect'
+
+# Reads the columns of a text file (e.g., a point cloud or poses with one entry per line) like np.loadtxt, but faster for large files:
+# - skiprows (number of header lines) and delimiter are detected from the first lines if they are DETECT_TXT_FORMAT (see detect_txt_format).
+#   Like for np.loadtxt, a delimiter of None means whitespace.
+# - usecols selects the columns to read, and dtype can be a structured dtype for specifying the type of each selected column
+# - files larger than chunk_bytes are split into chunks at line boundaries, which are parsed concurrently by num_workers processes (defaults to the thread budget).
+#   The processes are spawned instead of forked, as forking a process with multiple threads (e.g., when reading tiles in the background) can deadlock.
+# - with cache, the result is stored in a .npy file next to the text file (if the folder is writable), which is memory-mapped instead of
+#   parsing the text file again, as long as the text file has not been modified and the same parameters are used
+def read_txt_columns(path, usecols=None, dtype=np.float64, skiprows=DETECT_TXT_FORMAT, delimiter=DETECT_TXT_FORMAT, cache=False, chunk_bytes=2**26, num_workers=None):
+    if skiprows == DETECT_TXT_FORMAT or delimiter == DETECT_TXT_FORMAT:
+        detected_skiprows, detected_delimiter = detect_txt_format(path)
+        skiprows = detected_skiprows if skiprows == DETECT_TXT_FORMAT else skiprows
+        delimiter = detected_delimiter if delimiter == DETECT_TXT_FORMAT else delimiter
+    dtype = np.dtype(dtype)
+    usecols = list(usecols) if usecols is not None and not np.isscalar(usecols) else usecols
+
+    if cache:
+        parameters = json.dumps([usecols, dtype.descr, skiprows, delimiter])
+        cache_path = path + TXT_CACHE_INFIX + hashlib.sha1(parameters.encode()).hexdigest()[:12] + '.npy'
+        if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return np.load(cache_path, mmap_mode='r')
 
-# Reads the point positions and potential change attribute (in the case of LAS/LAZ). 
-# For .txt files assumes that the position is stored in the first three columns.
+    with open(path, 'rb') as txt_file:
+        for _ in range(skiprows):
+            txt_file.readline()
+        start = txt_file.tell()
+    # single columns are returned as 1D arrays, multiple columns as 2D arrays (even if a chunk contains just one line)
+    ndmin = 1 if np.isscalar(usecols) or dtype.names is not None else 2
+    offsets = txt_chunk_offsets(path, start, chunk_bytes)
+    chunks = [(path, chunk_start, chunk_end, usecols, dtype, delimiter, ndmin) for chunk_start, chunk_end in zip(offsets[:-1], offsets[1:])]
+    num_workers = min(thread_budget() if num_workers is None else num_workers, len(chunks))
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            parts = list(executor.map(parse_txt_chunk, *zip(*chunks)))
+    else:
+        parts = [parse_txt_chunk(*chunk) for chunk in chunks]
+    data = np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    if cache:
+        try:
+            np.save(cache_path + '.tmp.npy', data)
+            os.replace(cache_path + '.tmp.npy', cache_path)
+        except OSError:
+            pass    # e.g., a read-only dataset folder
+    return data
+
+
+# The evaluation cache stores the point clouds read by read_pointcloud_for_evaluation in a folder (e.g., [dataset root]/.evaluation_cache),
+# so that each input file is converted only once. Each entry is a folder with one little-endian .npy file of the points (a row-major 2-D array with the
+# columns x, y, z, and change if available) and a metadata JSON that records the source file and its size and modification time. Entries are keyed by the
+# absolute path of the source file and the parameters of reading it, and are only used as long as the source file has the recorded size and modification time.
+# Cached point clouds are memory-mapped (read-only) instead of being read from the source file again, so they are not copied until they are used.
+# With max_bytes, the least recently used entries (by the modification time of their metadata file, which is updated on each use) are removed
+# whenever an entry is added and the cache would exceed max_bytes.
+EVALUATION_CACHE_FOLDER = '.evaluation_cache'
+EVALUATION_CACHE_COLUMNS = ['x', 'y', 'z', 'change']
+EVALUATION_CACHE_DTYPE = np.dtype('<f8')
+EVALUATION_CACHE_POINTS_FILENAME = 'points.npy'
+
+def is_evaluation_cache(path):
+    return os.path.basename(os.path.normpath(path)) == EVALUATION_CACHE_FOLDER
+
+# Returns the header of a .npy file of a row-major array. numpy pads the header such that its length does not depend on the first dimension of the shape.
+def npy_header(dtype, shape):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr' : np.lib.format.dtype_to_descr(dtype), 'fortran_order' : False, 'shape' : tuple(shape)})
+    return header.getvalue()
+
+class EvaluationCache:
+    def __init__(self, folder, max_bytes=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def entry_folder(self, filepath, parameters):
+        key = json.dumps([os.path.abspath(filepath), parameters])
+        return os.path.join(self.folder, hashlib.sha1(key.encode()).hexdigest())
+
+    # Returns the memory-mapped points of the cached point cloud, or None if there is no valid entry for the file
+    def load(self, filepath, parameters):
+        entry_folder = self.entry_folder(filepath, parameters)
+        metadata_path = os.path.join(entry_folder, 'metadata.json')
+        try:
+            with open(metadata_path, 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+            stat = os.stat(filepath)
+            if metadata['size'] != stat.st_size or metadata['mtime_ns'] != stat.st_mtime_ns:
+                return None
+            points = np.load(os.path.join(entry_folder, EVALUATION_CACHE_POINTS_FILENAME), mmap_mode='r')
+            os.utime(metadata_path)    # marks the entry as recently used
+        except (OSError, ValueError, KeyError):
+            return None    # e.g., an entry that is being replaced or removed by another process
+        return points
+
+    # Returns an EvaluationCacheWriter for adding the point cloud of the file in blocks
+    def writer(self, filepath, parameters):
+        return EvaluationCacheWriter(self, filepath, parameters)
+
+    def store(self, filepath, parameters, pointcloud):
+        with self.writer(filepath, parameters) as writer:
+            writer.append(pointcloud)
+
+    # Returns the entries as (time of last use, size in bytes, folder), ignoring incomplete ones
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.folder) if os.path.isdir(self.folder) else []:
+            entry_folder = os.path.join(self.folder, name)
+            try:
+                with open(os.path.join(entry_folder, 'metadata.json'), 'r') as metadata_file:
+                    num_bytes = json.load(metadata_file)['bytes']
+                entries.append((os.path.getmtime(os.path.join(entry_folder, 'metadata.json')), num_bytes, entry_folder))
+            except (OSError, ValueError, KeyError):
+                pass
+        return entries
+
+    # Removes the least recently used entries until the cache does not exceed max_bytes. The entry in the folder keep is not removed.
+    def evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        entries = sorted(self.entries())
+        total_bytes = sum(num_bytes for _, num_bytes, _ in entries)
+        for _, num_bytes, entry_folder in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if entry_folder != keep:
+                shutil.rmtree(entry_folder, ignore_errors=True)
+                total_bytes -= num_bytes
+
+# Writes an entry of the EvaluationCache. The points are appended to a .npy file in a temporary folder, which replaces the entry when the writer
+# is closed without an exception. Otherwise (e.g., if an iteration over the point cloud is stopped early), the temporary folder is removed.
+class EvaluationCacheWriter:
+    def __init__(self, cache, filepath, parameters):
+        self.cache = cache
+        self.entry_folder = cache.entry_folder(filepath, parameters)
+        # the source file is checked before reading, so that an entry of a file that is modified while being read is not valid
+        stat = os.stat(filepath)
+        self.metadata = {'source' : os.path.abspath(filepath), 'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns, 'parameters' : parameters}
+        try:
+            os.makedirs(cache.folder, exist_ok=True)
+            self.temp_folder = tempfile.mkdtemp(dir=cache.folder, prefix=os.path.basename(self.entry_folder) + '.tmp-')
+        except OSError:
+            self.temp_folder = None    # e.g., a read-only dataset folder, in which case nothing is cached
+        self.points_file = None
+        self.num_points = 0
+
+    def __enter__(self):
+        return self
+
+    def append(self, pointcloud):
+        if self.temp_folder is None:
+            return
+        if self.points_file is None:
+            self.metadata['columns'] = EVALUATION_CACHE_COLUMNS[:pointcloud.shape[1]]
+            self.points_file = open(os.path.join(self.temp_folder, EVALUATION_CACHE_POINTS_FILENAME), 'wb')
+            self.points_file.write(npy_header(EVALUATION_CACHE_DTYPE, (0, len(self.metadata['columns']))))
+        np.ascontiguousarray(pointcloud, dtype=EVALUATION_CACHE_DTYPE).tofile(self.points_file)
+        self.num_points += len(pointcloud)
+
+    def commit(self):
+        if self.temp_folder is None:
+            return
+        if self.points_file is None:
+            self.append(np.empty((0, 3)))
+        self.points_file.seek(0)
+        self.points_file.write(npy_header(EVALUATION_CACHE_DTYPE, (self.num_points, len(self.metadata['columns']))))
+        self.points_file.close()
+        self.metadata['num_points'] = self.num_points
+        self.metadata['bytes'] = sum(os.path.getsize(os.path.join(self.temp_folder, name)) for name in os.listdir(self.temp_folder))
+        with open(os.path.join(self.temp_folder, 'metadata.json'), 'w') as metadata_file:
+            json.dump(self.metadata, metadata_file)
+        # a stale entry of the file is replaced. If another process has added the entry concurrently, its entry is kept.
+        if os.path.isdir(self.entry_folder):
+            shutil.rmtree(self.entry_folder, ignore_errors=True)
+        try:
+            os.rename(self.temp_folder, self.entry_folder)
+        except OSError:
+            shutil.rmtree(self.temp_folder, ignore_errors=True)
+        self.cache.evict(keep=self.entry_folder)
+
+    def discard(self):
+        if self.points_file is not None:
+            self.points_file.close()
+        if self.temp_folder is not None:
+            shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+# Returns the parameters of read_pointcloud_for_evaluation that determine the point cloud read from a file (see EvaluationCache)
+def evaluation_cache_parameters(position_offset, txt_has_header, txt_delimiter, remove_duplicates):
+    return {'position_offset' : [float(value) for value in np.asarray(position_offset).ravel()], 'txt_has_header' : bool(txt_has_header),
+            'txt_delimiter' : txt_delimiter, 'remove_duplicates' : bool(remove_duplicates)}
+
+
+# Returns the columns of a Parquet file that are read for the evaluation: the coordinates and, like for LAS/LAZ files, the change attribute (if available)
+def parquet_evaluation_columns(path):
+    import pyarrow.parquet as pq
+    names = pq.read_schema(path).names
+    return [field.name for field in pf.COORDINATE_FIELDS] + (['change'] if 'change' in names else [])
+
+# Reads the point positions and potential change attribute (in the case of LAS/LAZ and Parquet). 
+# For .txt files assumes that the position is stored in the first three columns. With txt_cache, they are cached in a binary file next to the text file (see read_txt_columns).
 # The position_offset gets applied to all data read from file formats other than LAS/LAZ (where we just ignore the global offset). It can be used to avoid coordinate precision errors.
-def read_pointcloud_for_evaluation(filepath, position_offset=np.array([0,0,0]), txt_has_header=False, txt_delimiter=None, remove_duplicates=False):
+# With an EvaluationCache, the point cloud is memory-mapped (read-only) from the cache if available, and added to the cache otherwise.
+# laz_workers is the number of threads for decompressing LAZ files (defaults to utils.threads.laz_workers).
+def read_pointcloud_for_evaluation(filepath, position_offset=np.array([0,0,0]), txt_has_header=False, txt_delimiter=None, remove_duplicates=False, txt_cache=False, cache=None, laz_workers=None):
     if not os.path.isfile(filepath):
         print(filepath, ' does not exist!')
         exit()
 
+    if cache is not None:
+        parameters = evaluation_cache_parameters(position_offset, txt_has_header, txt_delimiter, remove_duplicates)
+        pointcloud = cache.load(filepath, parameters)
+        if pointcloud is not None:
+            return pointcloud
+
     if filepath.endswith('.las') or filepath.endswith('.laz'):
-        pointcloud = read_las_in_local_crs(filepath)
+        pointcloud = read_las_in_local_crs(filepath, laz_workers)
     elif filepath.endswith('.ply'):
-        pointcloud = plyfile.PlyData.read(filepath)
-        pointcloud = np.vstack([pointcloud['vertex']['x'], pointcloud['vertex']['y'], pointcloud['vertex']['z']]).transpose() + position_offset
+        vertices = read_ply_fields(filepath, ['x', 'y', 'z'], element='vertex')
+        pointcloud = np.column_stack([vertices['x'], vertices['y'], vertices['z']]) + position_offset
     elif filepath.endswith('.pcd'):
-        pointcloud = PCDPointCloud.from_path(filepath).numpy()[:, 0:3] + position_offset
+        points = read_pcd_fields(filepath)
+        pointcloud = np.column_stack([points[name] for name in points.dtype.names[0:3]]) + position_offset
     elif filepath.endswith('.txt') or filepath.endswith('.xyz'):
-        pointcloud = np.loadtxt(filepath, skiprows=(1 if txt_has_header else 0), delimiter=txt_delimiter)[:, 0:3] + position_offset
+        pointcloud = read_txt_columns(filepath, usecols=(0, 1, 2), skiprows=(1 if txt_has_header else 0), delimiter=txt_delimiter, cache=txt_cache) + position_offset
+    elif filepath.endswith('.parquet'):
+        columns = read_parquet_columns(filepath, parquet_evaluation_columns(filepath))
+        pointcloud = np.column_stack(list(columns.values()))
+        pointcloud[:, 0:3] += position_offset
 
     pointcloud = pointcloud[~np.isnan(pointcloud).any(axis=1)]  # remove rows with NaN values
 
     if remove_duplicates:
         pointcloud = np.unique(pointcloud, axis=0)
 
+    if cache is not None:
+        cache.store(filepath, parameters, pointcloud)
     return pointcloud
 
+# Returns the number of points that read_pointcloud_for_evaluation returns for a file (with the default parameters), from its header if possible
+# (see count_points_from_header), otherwise by reading the points
+def count_points_for_evaluation(filepath):
+    count = count_points_from_header(filepath)
+    return count if count is not None else len(read_pointcloud_for_evaluation(filepath))
+
+# Reads all files in filepaths like read_pointcloud_for_evaluation, but yields blocks of at most chunk_points points instead of whole files.
+# Only LAS/LAZ and Parquet files are read in chunks, other files are yielded as one block each. With remove_duplicates, each file is one block as well,
+# as duplicates can only be found within the whole file. With an EvaluationCache, the blocks of cached files are views of the memory-mapped points,
+# and files that are read in chunks are added to the cache block by block (if all blocks are consumed).
+def iterate_pointclouds_for_evaluation(filepaths, chunk_points, position_offset=[0,0,0], txt_has_header=False, txt_delimiter=None, remove_duplicates=False, txt_cache=False, cache=None):
+    for filepath in filepaths:
+        chunked = (filepath.endswith('.las') or filepath.endswith('.laz') or filepath.endswith('.parquet')) and not remove_duplicates
+        if chunked and cache is not None:
+            parameters = evaluation_cache_parameters(position_offset, txt_has_header, txt_delimiter, remove_duplicates)
+            pointcloud = cache.load(filepath, parameters)
+            if pointcloud is not None:
+                for start in range(0, len(pointcloud), chunk_points):
+                    yield pointcloud[start:start + chunk_points]
+                continue
+            with cache.writer(filepath, parameters) as writer:
+                for pointcloud in iterate_source_pointcloud_for_evaluation(filepath, chunk_points, position_offset):
+                    writer.append(pointcloud)
+                    yield pointcloud
+        elif chunked:
+            yield from iterate_source_pointcloud_for_evaluation(filepath, chunk_points, position_offset)
+        else:
+            yield read_pointcloud_for_evaluation(filepath, txt_has_header=txt_has_header, txt_delimiter=txt_delimiter, position_offset=np.asarray(position_offset), remove_duplicates=remove_duplicates, txt_cache=txt_cache, cache=cache)
+
+# Reads a LAS/LAZ or Parquet file in blocks of at most chunk_points points (see iterate_pointclouds_for_evaluation)
+def iterate_source_pointcloud_for_evaluation(filepath, chunk_points, position_offset):
+    if filepath.endswith('.parquet'):
+        for pointcloud in iterate_parquet(filepath, parquet_evaluation_columns(filepath), chunk_points):
+            pointcloud[:, 0:3] += np.asarray(position_offset)
+            yield pointcloud[~np.isnan(pointcloud).any(axis=1)]
+    else:
+        for pointcloud in iterate_las_in_local_crs(filepath, chunk_points):
+            yield pointcloud[~np.isnan(pointcloud).any(axis=1)]  # remove rows with NaN values
+
 # Reads all files in filepaths and merges them into one point cloud
-def read_and_merge_pointclouds_for_evaluation(filepaths, position_offset=[0,0,0], txt_has_header=False, txt_delimiter=None, remove_duplicates=False):
+def read_and_merge_pointclouds_for_evaluation(filepaths, position_offset=[0,0,0], txt_has_header=False, txt_delimiter=None, remove_duplicates=False, txt_cache=False, cache=None):
     pointcloud_parts = []
     for filepath in filepaths:
-        pointcloud = read_pointcloud_for_evaluation(filepath, txt_has_header=txt_has_header, txt_delimiter=txt_delimiter, position_offset=np.asarray(position_offset), remove_duplicates=remove_duplicates)
+        pointcloud = read_pointcloud_for_evaluation(filepath, txt_has_header=txt_has_header, txt_delimiter=txt_delimiter, position_offset=np.asarray(position_offset), remove_duplicates=remove_duplicates, txt_cache=txt_cache, cache=cache)
         pointcloud_parts.append(pointcloud)
     return np.concatenate(pointcloud_parts)
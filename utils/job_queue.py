@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from dataclasses import asdict
+from utils.processing import ProcessingStep
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+# A queue of processing steps stored in an SQLite database, which can be placed on a shared filesystem for distributing the work
+# across several nodes (the filesystem has to support file locking).
+# Each job is a ProcessingStep that can only be claimed when all jobs it depends on are done (e.g., the previous steps of the dataset).
+# Workers claim jobs with a lease that they have to renew periodically (heartbeat). Jobs whose lease expired (e.g., because the worker died)
+# are re-queued until max_attempts is reached. Leases are compared using the wall clock, so the clocks of the nodes should be synchronized.
+# Workers are registered while they use the queue (renewed with each claim and heartbeat), so that the coordinator only removes the queue
+# file when no worker accesses it anymore (see active_workers).
+class JobQueue:
+    def __init__(self, path, lease_duration=120, max_attempts=3):
+        self.path = path
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=600, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                dataset TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT
+            );
+            CREATE TABLE IF NOT EXISTS dependencies (
+                job_id INTEGER NOT NULL,
+                depends_on INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE INDEX IF NOT EXISTS dependencies_job ON dependencies (job_id);
+        ''')
+
+    # Executes the given function within an exclusive transaction
+    def transaction(self, function):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(self.connection)
+                self.connection.execute('COMMIT')
+                return result
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        self.connection.close()
+
+    # Adds a ProcessingStep to the queue and returns its job id. Jobs with higher priority are claimed first.
+    def add_job(self, step, depends_on=[], priority=0):
+        def add(connection):
+            cursor = connection.execute('INSERT INTO jobs (dataset, payload, priority) VALUES (?, ?, ?)',
+                                        (step.dataset_name, json.dumps(asdict(step)), priority))
+            connection.executemany('INSERT INTO dependencies (job_id, depends_on) VALUES (?, ?)',
+                                   [(cursor.lastrowid, dependency) for dependency in depends_on])
+            return cursor.lastrowid
+        return self.transaction(add)
+
+    # Puts jobs with expired leases back into the queue (or marks them as failed after max_attempts)
+    def requeue_expired(self, connection=None):
+        def requeue(connection):
+            now = time.time()
+            expired = connection.execute('SELECT id, attempts FROM jobs WHERE status = ? AND lease_expires < ?', (RUNNING, now)).fetchall()
+            for job_id, attempts in expired:
+                if attempts >= self.max_attempts:
+                    self.fail(connection, job_id, {'error' : 'lease expired ' + str(attempts) + ' times'})
+                else:
+                    connection.execute('UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL WHERE id = ?', (PENDING, job_id))
+            return len(expired)
+        return requeue(connection) if connection is not None else self.transaction(requeue)
+
+    # Marks a job and all jobs that (transitively) depend on it as failed. Each dependent is marked once, with the first failed dependency
+    # that reaches it (jobs can depend on several jobs, e.g., all epochs of the previous stage).
+    def fail(self, connection, job_id, result):
+        connection.execute('UPDATE jobs SET status = ?, lease_expires = NULL, result = ? WHERE id = ?', (FAILED, json.dumps(result), job_id))
+        failed = {job_id}
+        worklist = [job_id]
+        while worklist:
+            failed_id = worklist.pop()
+            for (dependent,) in connection.execute('SELECT job_id FROM dependencies WHERE depends_on = ?', (failed_id,)).fetchall():
+                if dependent in failed:
+                    continue
+                failed.add(dependent)
+                worklist.append(dependent)
+                connection.execute('UPDATE jobs SET status = ?, lease_expires = NULL, result = ? WHERE id = ?',
+                                   (FAILED, json.dumps({'error' : 'dependency ' + str(failed_id) + ' failed'}), dependent))
+
+    # Claims the pending job with the highest priority whose dependencies are done.
+    # Returns (job_id, ProcessingStep), or None if no job can be claimed at the moment.
+    def claim(self, worker_id):
+        def claim(connection):
+            self.register_worker(worker_id, connection)
+            self.requeue_expired(connection)
+            row = connection.execute('''
+                SELECT id, payload FROM jobs
+                WHERE status = ? AND NOT EXISTS (
+                    SELECT 1 FROM dependencies JOIN jobs AS dependency ON dependency.id = dependencies.depends_on
+                    WHERE dependencies.job_id = jobs.id AND dependency.status != ?)
+                ORDER BY priority DESC, id LIMIT 1''', (PENDING, DONE)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?',
+                               (RUNNING, worker_id, time.time() + self.lease_duration, row[0]))
+            return row[0], ProcessingStep(**json.loads(row[1]))
+        return self.transaction(claim)
+
+    # Renews the lease of a claimed job. Returns False if the job is no longer claimed by the worker (e.g., because its lease expired).
+    def heartbeat(self, job_id, worker_id):
+        def renew(connection):
+            self.register_worker(worker_id, connection)
+            cursor = connection.execute('UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?',
+                                        (time.time() + self.lease_duration, job_id, worker_id, RUNNING))
+            return cursor.rowcount == 1
+        return self.transaction(renew)
+
+    # Reports the result (a JSON-serializable dict) of a claimed job
+    def complete(self, job_id, worker_id, success, result):
+        def complete(connection):
+            if connection.execute('SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = ?', (job_id, worker_id, RUNNING)).fetchone() is None:
+                return False
+            if success:
+                connection.execute('UPDATE jobs SET status = ?, lease_expires = NULL, result = ? WHERE id = ?', (DONE, json.dumps(result), job_id))
+            else:
+                self.fail(connection, job_id, result)
+            return True
+        return self.transaction(complete)
+
+    # Registers a worker as active or renews its registration
+    def register_worker(self, worker_id, connection=None):
+        def register(connection):
+            connection.execute('INSERT OR REPLACE INTO workers (id, last_seen) VALUES (?, ?)', (worker_id, time.time()))
+        return register(connection) if connection is not None else self.transaction(register)
+
+    def unregister_worker(self, worker_id):
+        self.transaction(lambda connection: connection.execute('DELETE FROM workers WHERE id = ?', (worker_id,)))
+
+    # Returns the number of workers that are registered and were seen within the lease duration (workers that died without unregistering expire like their jobs)
+    def active_workers(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM workers WHERE last_seen >= ?', (time.time() - self.lease_duration,)).fetchone()[0]
+
+    # Returns the number of jobs per status
+    def status_counts(self):
+        counts = {PENDING : 0, RUNNING : 0, DONE : 0, FAILED : 0}
+        with self.lock:
+            for status, count in self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+                counts[status] = count
+        return counts
+
+    def is_finished(self):
+        counts = self.status_counts()
+        return counts[PENDING] == 0 and counts[RUNNING] == 0
+
+    # Returns (ProcessingStep, status, result) for all jobs
+    def results(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT payload, status, result FROM jobs ORDER BY id').fetchall()
+        return [(ProcessingStep(**json.loads(payload)), status, json.loads(result) if result else None) for payload, status, result in rows]
+
+
+def default_worker_id():
+    return socket.gethostname() + ':' + str(os.getpid())
+
+
+# Claims and executes jobs until the queue is finished. execute_job gets a ProcessingStep and returns (success, result).
+# While a job is executed, its lease is renewed in a background thread. The worker is registered until it exits.
+def run_worker(queue, execute_job, worker_id=None, poll_interval=5):
+    worker_id = worker_id or default_worker_id()
+    queue.register_worker(worker_id)
+    try:
+        process_jobs(queue, execute_job, worker_id, poll_interval)
+    finally:
+        queue.unregister_worker(worker_id)
+
+def process_jobs(queue, execute_job, worker_id, poll_interval):
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            if queue.is_finished():
+                return
+            time.sleep(poll_interval)    # the remaining jobs wait for dependencies that are processed by other workers
+            continue
+
+        job_id, step = claimed
+        stop_heartbeat = threading.Event()
+        def send_heartbeats():
+            while not stop_heartbeat.wait(queue.lease_duration / 3):
+                queue.heartbeat(job_id, worker_id)
+        heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+        try:
+            success, result = execute_job(step)
+        except Exception as exception:
+            success, result = False, {'error' : repr(exception)}
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+
+        if not queue.complete(job_id, worker_id, success, result):
+            print('The lease of job', job_id, 'expired before it was completed. The result is discarded.')
@@ -1,13 +1,14 @@
 import numpy as np
-import cv2
 import math
-from scipy.spatial.transform import Slerp, Rotation as R
 import os
 from pathlib import Path
-import tifffile
+from utils.pointcloud_format import PointBatch
+
+# OpenCV, tifffile, and scipy are imported within the functions that need them, so that importing this module stays fast
 
 # Resizes the the input_image to the size of the target_image
 def match_image_size(input_image, target_image):
+	import cv2
 	if input_image.shape[0:2] != target_image.shape[0:2]:
 		input_image = cv2.resize(input_image, (target_image.shape[1], target_image.shape[0]))
 	return input_image
@@ -16,8 +17,10 @@ def match_image_size(input_image, target_image):
 # tifffile is more robust in the case of incorrectly specified metadata (e.g., channel contents) in TIF files.
 def read_image(filepath):
 	if filepath.endswith('.tif'):
+		import tifffile
 		return tifffile.imread(filepath)
 	else:
+		import cv2
 		return cv2.imread(filepath, cv2.IMREAD_UNCHANGED)
 
 # Combines DSM, color, and label images to obtain a point cloud
@@ -32,6 +35,7 @@ def dsm_to_pointcloud(dsm_path, color_path=None, annotation_path=None, annotatio
 	if annotation_path:
 		annotation = match_image_size(read_image(annotation_path), dsm)
 		if annotation_binary_threshold:
+			import cv2
 			_, annotation = cv2.threshold(annotation, annotation_binary_threshold, 1.0, cv2.THRESH_BINARY)
 
 	x, y = np.meshgrid(np.arange(dsm.shape[1]), np.arange(dsm.shape[0]))
@@ -55,12 +59,15 @@ def dsm_to_pointcloud(dsm_path, color_path=None, annotation_path=None, annotatio
 # Incrementally reconstructs a point cloud by backprojecting depth/color/label images
 class RGBDReconstruction:
 	# intrinsics is an array of the form: np.array([[fx, 0, Cu], [0, fy, Cv], [0, 0, 1]])
-	def __init__(self, intrinsics, image_resolution, map_color_to_segmentation_id=False, depth_threshold=math.inf):
+	# If a pointcloud_format is given (e.g., FORMAT_XYZRGB, or FORMAT_XYZRGBS with segmentation), the results are PointBatches with its fields
+	# (coordinates, colors, and the segmentation ID, in this order). Otherwise, they are float64 arrays.
+	def __init__(self, intrinsics, image_resolution, map_color_to_segmentation_id=False, depth_threshold=math.inf, pointcloud_format=None):
 		self.intrinsics = np.linalg.inv(intrinsics)
 		self.depth_threshold = depth_threshold
 		self.image_resolution = image_resolution
 		self.map_color_to_segmentation_id = map_color_to_segmentation_id
 		self.color_to_segmentation_map = {}
+		self.pointcloud_format = pointcloud_format
 		self.result = []
 
 	# Maps the pixel colors of a segmentation image to a running index of segmentation IDs
@@ -101,16 +108,25 @@ class RGBDReconstruction:
 				seg = np.apply_along_axis(self.__color_to_segID__, axis=1, arr=seg).reshape(-1, 1)
 			columns.append(seg.flatten())
 
+		if self.pointcloud_format is not None:
+			names = [field.name for field in self.pointcloud_format.fields]
+			points = PointBatch(self.pointcloud_format, dict(zip(names, [xyz[:, 0], xyz[:, 1], xyz[:, 2], rgb[:, 0], rgb[:, 1], rgb[:, 2]] + columns[2:])))
+		else:
+			points = np.column_stack(columns)
+
 		if direct_result:
-			return np.column_stack(columns)
+			return points
 		else:
-			self.result.extend(np.column_stack(columns))
+			self.result.append(points)
 
 	def get_result(self):
-		return np.array(self.result)
+		if self.pointcloud_format is not None:
+			return PointBatch.concatenate(self.result) if self.result else PointBatch.empty(self.pointcloud_format, 0)
+		return np.concatenate(self.result) if self.result else np.array([])
 	
 # Interpolates between two poses using the given timestamp
 def get_pose_matrix_interpolated(pose1, pose2, t1, t2, timestamp):
+	from scipy.spatial.transform import Slerp, Rotation as R
 	alpha = (timestamp - t1) / (t2 - t1)
 	position = (1 - alpha) * pose1[:3] + alpha * pose2[:3]
 	slerp = Slerp([0, 1], R.from_quat([pose1[3:], pose2[3:]]))
@@ -122,6 +138,7 @@ def get_pose_matrix_interpolated(pose1, pose2, t1, t2, timestamp):
 
 # Converts a pose of the form [x, y, z, qx, qy, qz, qw] into a pose matrix
 def get_pose_matrix_from_pose(pose):
+	from scipy.spatial.transform import Rotation as R
 	pose_matrix = np.eye(4)
 	pose_matrix[:3, :3] = R.from_quat(pose[3:]).as_matrix()
 	pose_matrix[:3, 3] = pose[:3]
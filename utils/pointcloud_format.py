@@ -44,4 +44,76 @@ FORMAT_XYZRGB = PointcloudFormat([X, Y, Z, R, G, B])
 FORMAT_XYZRGBC = PointcloudFormat([X, Y, Z, R, G, B, CHANGE])
 FORMAT_XYZRGBS = PointcloudFormat([X, Y, Z, R, G, B, SEMANTIC])
 FORMAT_XYZRGBSC = PointcloudFormat([X, Y, Z, R, G, B, SEMANTIC, CHANGE])
-FORMAT_XYZRGBSIC = PointcloudFormat([X, Y, Z, R, G, B, SEMANTIC, INSTANCE, CHANGE])
\ No newline at end of file
+FORMAT_XYZRGBSIC = PointcloudFormat([X, Y, Z, R, G, B, SEMANTIC, INSTANCE, CHANGE])
+
+# The fields of the coordinates. In a PointBatch, they are stored as float64 (their dtype is the type they are written with),
+# as world coordinates (e.g., UTM) lose their precision as float32
+COORDINATE_FIELDS = [X, Y, Z]
+
+def column_dtype(field):
+    return np.dtype(np.float64) if field in COORDINATE_FIELDS else np.dtype(field.dtype)
+
+# Points stored as structure of arrays: one column per field of the pointcloud_format with the type of the field (see column_dtype),
+# instead of one 2-D array whose columns all share one type. E.g., a point of FORMAT_XYZRGBS takes 28 bytes instead of 56 as float64 array
+# (the same as a float32 array, which loses the precision of world coordinates).
+# Columns that already have the type of their field are not copied, so a batch can be a view of a structured array (see from_records),
+# e.g., the memory-mapped vertices of a PLY file. Indexing a batch with a field name returns the column, any other index (e.g., a slice
+# or a mask) selects points of all columns. A PointBatch is accepted wherever a point cloud is written (see utils.io and utils.tile_writer).
+class PointBatch:
+    def __init__(self, pointcloud_format, columns):
+        self.pointcloud_format = pointcloud_format
+        self.columns = {field.name : np.asarray(columns[field.name], dtype=column_dtype(field)) for field in pointcloud_format.fields}
+        lengths = set(len(column) for column in self.columns.values())
+        if len(lengths) > 1:
+            raise ValueError('The columns of a PointBatch must have the same length')
+
+    @staticmethod
+    def empty(pointcloud_format, num_points):
+        return PointBatch(pointcloud_format, {field.name : np.empty(num_points, dtype=column_dtype(field)) for field in pointcloud_format.fields})
+
+    # Converts a 2-D array with the fields of the pointcloud_format as columns (the previous representation of point clouds)
+    @staticmethod
+    def from_array(array, pointcloud_format):
+        return PointBatch(pointcloud_format, {field.name : array[:, idx] for idx, field in enumerate(pointcloud_format.fields)})
+
+    # Uses the fields of a structured array (e.g., LAS or PLY records) with the names of the fields of the pointcloud_format as columns
+    @staticmethod
+    def from_records(records, pointcloud_format):
+        return PointBatch(pointcloud_format, {field.name : records[field.name] for field in pointcloud_format.fields})
+
+    @staticmethod
+    def concatenate(batches):
+        batches = list(batches)
+        pointcloud_format = batches[0].pointcloud_format
+        return PointBatch(pointcloud_format, {field.name : np.concatenate([batch.columns[field.name] for batch in batches])
+                                              for field in pointcloud_format.fields})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return self.columns[index]
+        return PointBatch(self.pointcloud_format, {name : column[index] for name, column in self.columns.items()})
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    # Returns the coordinates as (n, 3) float64 array
+    def xyz(self):
+        return np.column_stack([self.columns[field.name] for field in COORDINATE_FIELDS])
+
+    # Returns the points as 2-D array with the fields as columns (e.g., for code that expects the previous representation)
+    def to_array(self, dtype=np.float64):
+        array = np.empty((len(self), len(self.columns)), dtype=dtype)
+        for idx, column in enumerate(self.columns.values()):
+            array[:, idx] = column
+        return array
+
+    # Returns the points as structured array with the given dtype (defaults to the PLY vertex type of the pointcloud_format)
+    def to_records(self, dtype=None):
+        records = np.empty(len(self), dtype=self.pointcloud_format.ply_output_dtypes if dtype is None else dtype)
+        for name in records.dtype.names:
+            records[name] = self.columns[name]
+        return records
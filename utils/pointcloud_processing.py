@@ -1,9 +1,11 @@
 import numpy as np
-import open3d as o3d
-from scipy.spatial.transform import Rotation as R
+from utils.pointcloud_format import PointBatch
+
+# open3d and scipy are imported within the functions that need them, so that importing this module stays fast
 
 # Downsamples a point cloud and removes statistical outliers
 def reduce_and_remove_outliers(pointcloud, down_sample_factor=0.1, outlier_removal_neighbors=20, outlier_removal_std_ratio=1.0):
+	import open3d as o3d
 	pointcloud_o3d = o3d.geometry.PointCloud()
 	pointcloud_o3d.points = o3d.utility.Vector3dVector(pointcloud)
 
@@ -17,11 +19,13 @@ def reduce_and_remove_outliers(pointcloud, down_sample_factor=0.1, outlier_remov
 # Returns a rotation for aligning a vector with the z-axis. 
 # Useful for transforming the ground plane of a point cloud that is not axis-aligned into the xy-plane
 def rotation_for_alignment_with_z(vector):
+	from scipy.spatial.transform import Rotation as R
 	vector /= np.linalg.norm(vector)
 	rotation, _ = R.align_vectors([vector], [np.array([0, 0, 1])])
 	return rotation
 
-# Removes duplicates from pointclouds w.r.t. coordinates. Note that the order of points might change.
+# Removes duplicates from pointclouds (2-D arrays or PointBatches) w.r.t. coordinates. Note that the order of points might change.
 def remove_duplicates(pointcloud):
-	_, indices = np.unique(pointcloud[:, 0:3], axis=0, return_index=True)
+	coordinates = pointcloud.xyz() if isinstance(pointcloud, PointBatch) else pointcloud[:, 0:3]
+	_, indices = np.unique(coordinates, axis=0, return_index=True)
 	return pointcloud[indices]
\ No newline at end of file
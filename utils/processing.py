@@ -0,0 +1,257 @@
+import os
+import re
+import ast
+import glob
+import fnmatch
+import yaml
+from dataclasses import dataclass, field, replace
+from enum import Enum
+
+class StepStatus(str, Enum):
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'    # the outputs of the step are up to date
+
+
+# A single script invocation for a dataset, e.g., datasets/NCLT/create_pointclouds.py with its resolved arguments.
+# The arguments are stored as [name, value] pairs in the order of the configuration.
+# outputs contains the paths written by the step: the values of all output arguments (see OUTPUT_ARGUMENTS), plus the paths declared with "outputs" in the configuration.
+# ignored_paths contains the outputs of all steps of the dataset, which are not considered as inputs of any step (may contain glob patterns).
+# Steps that process a single epoch of a dataset (see expand_epochs) have the epoch name and its path set.
+# If resume is set, the script is called with --resume and its staged outputs of an interrupted execution are kept (see BuildCache.run_step).
+# If threads is set, the script is limited to this number of threads (see utils.threads).
+@dataclass
+class ProcessingStep:
+    dataset_name: str
+    script: str
+    arguments: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    ignored_paths: list = field(default_factory=list)
+    epoch: str = None
+    epoch_path: str = None
+    resume: bool = False
+    threads: int = None
+
+    @property
+    def module(self):
+        return '.'.join(['datasets', self.dataset_name, self.script])
+
+    @property
+    def script_path(self):
+        return os.path.join('datasets', self.dataset_name, self.script + '.py')
+
+    # Identifies the step within its dataset (e.g., for caching)
+    @property
+    def key(self):
+        return self.script if self.epoch is None else self.script + '/' + self.epoch
+
+    def command(self):
+        command_parts = ['python', '-m', self.module]
+        for name, value in self.arguments:
+            if name.startswith('--'):
+                command_parts.append(name)
+            command_parts.append(value)
+        if self.resume:
+            command_parts.append('--resume')
+        return command_parts
+
+    # Checks whether the argument parser of the script defines the given option (without importing the script)
+    def accepts_option(self, option):
+        with open(self.script_path, 'r', encoding='utf-8') as script_file:
+            tree = ast.parse(script_file.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'add_argument':
+                if any(isinstance(arg, ast.Constant) and arg.value == option for arg in node.args):
+                    return True
+        return False
+
+    # The argument values that might be paths to input data (they are only considered as inputs if they exist)
+    def input_candidates(self):
+        candidates = [value for name, value in self.arguments if not is_output_argument(name) and value != '']
+        return candidates if self.epoch_path is None else candidates + [self.epoch_path]
+
+    # Outputs can be written to a staging path first (the output path plus this suffix) and moved to their final location when the step has finished
+    @property
+    def staging_suffix(self):
+        return STAGING_SUFFIX + re.sub(r'[^\w.-]', '_', self.key)
+
+    # Ignored paths also cover the staging paths of the outputs, but never the epoch of the step
+    def is_ignored_path(self, path):
+        path = os.path.normpath(path)
+        if self.epoch_path is not None and (path == self.epoch_path or path.startswith(self.epoch_path + os.sep)):
+            return False
+        for pattern in self.ignored_paths:
+            pattern = os.path.normpath(pattern)
+            if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(path, pattern + STAGING_SUFFIX + '*'):
+                return True
+        return False
+
+    # Returns a copy of the step in which every output argument is replaced by its value with the given suffix
+    def with_output_suffix(self, suffix):
+        arguments = [[name, staging_path(value, suffix) if is_output_argument(name) else value] for name, value in self.arguments]
+        return replace(self, arguments=arguments, outputs=list(self.outputs), ignored_paths=list(self.ignored_paths))
+
+
+# All processing steps of one dataset (executed in order), together with the resources the dataset occupies while being processed.
+# The cpu_weight is given in number of cores, the memory_weight in GB.
+@dataclass
+class DatasetJob:
+    name: str
+    dataset_root: str
+    steps: list = field(default_factory=list)
+    cpu_weight: float = 1
+    memory_weight: float = 0
+    threads: int = None
+
+    # Groups the steps into stages that are executed in order. The epoch steps created from one configured step form a single stage,
+    # whose steps are independent of each other and can be executed concurrently.
+    def stages(self):
+        stages = []
+        for step in self.steps:
+            previous_step = stages[-1][-1] if stages else None
+            if previous_step is not None and step.epoch is not None and previous_step.epoch is not None and previous_step.script == step.script:
+                stages[-1].append(step)
+            else:
+                stages.append([step])
+        return stages
+
+
+# Names of script arguments that specify where the results of a script are written to
+OUTPUT_ARGUMENTS = ['output_folder', 'output_log']
+
+STAGING_SUFFIX = '.partial-'
+
+def is_output_argument(name):
+    return name.lstrip('-') in OUTPUT_ARGUMENTS
+
+def staging_path(output_path, suffix):
+    return os.path.normpath(output_path) + suffix
+
+def placeholder_replacement(input, dataset_name, dataset_root, has_create_pointcloud_script):
+    result = input.replace('${{dataset_name}}', dataset_name)
+    result = result.replace('${{dataset_root}}', dataset_root)
+    result = result.replace('${{pointclouds}}', 'pointclouds' if has_create_pointcloud_script else '')
+    return result
+
+def get_command_for_processing_step(step, dataset_name, dataset_root, has_create_pointcloud_script):
+    script_name = step['script']
+    script_path_parts = ['datasets', dataset_name, script_name]
+    script_path = os.path.join(*script_path_parts) + '.py'
+    if not os.path.exists(script_path):
+        return None
+
+    arguments = []
+    outputs = []
+    for argument in step['arguments']:
+        argument_value = step['arguments'][argument]
+        if isinstance(argument_value, str):
+            argument_value = placeholder_replacement(argument_value,
+                                                    dataset_name,
+                                                    dataset_root,
+                                                    has_create_pointcloud_script)
+        else:
+            argument_value = str(argument_value)
+
+        arguments.append([argument, argument_value])
+        if is_output_argument(argument):
+            outputs.append(argument_value)
+
+    for output in step.get('outputs', []):
+        outputs.append(placeholder_replacement(output, dataset_name, dataset_root, has_create_pointcloud_script))
+    return ProcessingStep(dataset_name, script_name, arguments, outputs)
+
+
+# Returns the EPOCHS pattern of a script, i.e., a glob pattern relative to its input_path that matches all epochs of the dataset
+# which can be processed independently of each other (e.g., 'raw/*/'). The script is parsed instead of imported, so that no heavy modules are loaded.
+def get_epoch_pattern(script_path):
+    with open(script_path, 'r', encoding='utf-8') as script_file:
+        tree = ast.parse(script_file.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'EPOCHS' for target in node.targets):
+            if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                return node.value.value
+    return None
+
+# Splits a step of a script that declares EPOCHS into one step per epoch, which only processes the epoch given by --inclusion_list.
+# The epoch names are the matched paths relative to the part of the pattern before the first wildcard (e.g., 'jun_15_2022/Aisle_CCW_Run_1').
+# Epochs in the --exclusion_list argument are skipped. Steps that already specify an inclusion list are not split.
+def expand_epochs(step):
+    arguments = dict(step.arguments)
+    epoch_pattern = get_epoch_pattern(step.script_path)
+    if epoch_pattern is None or 'input_path' not in arguments or '--inclusion_list' in arguments:
+        return [step]
+
+    pattern = os.path.normpath(os.path.join(arguments['input_path'], epoch_pattern))
+    pattern_parts = pattern.split(os.sep)
+    static_parts = []
+    for part in pattern_parts:
+        if glob.has_magic(part):
+            break
+        static_parts.append(part)
+    epochs_folder = os.sep.join(static_parts)
+    exclusion_list = [arguments['--exclusion_list']] if arguments.get('--exclusion_list') else []
+
+    epoch_steps = []
+    for epoch_path in sorted(glob.glob(pattern)):
+        epoch_path = os.path.normpath(epoch_path)
+        epoch = os.path.relpath(epoch_path, epochs_folder).replace(os.sep, '/')
+        if epoch in exclusion_list:
+            continue
+        # the other epochs are no inputs of the step
+        epoch_steps.append(replace(step,
+                                   arguments=step.arguments + [['--inclusion_list', epoch]],
+                                   ignored_paths=list(step.ignored_paths) + [pattern],
+                                   epoch=epoch,
+                                   epoch_path=epoch_path))
+    return epoch_steps if epoch_steps else [step]
+
+
+# Reads the YAML configuration and resolves it into one DatasetJob per dataset.
+# A dataset is either specified as 'default' or as a mapping with optional dataset_root, processing_steps, and resources.
+# Missing entries are taken from the default configuration.
+def load_processing_config(config_path):
+    with open(config_path, 'r') as config_file:
+        config = list(yaml.safe_load_all(config_file))
+        default_config = None if len(config) == 1 else config[0]
+        datasets = config[0] if len(config) == 1 else config[1]
+
+    jobs = []
+    for dataset_name in datasets:
+        dataset = datasets[dataset_name]
+        if dataset == 'default':
+            dataset = {}
+
+        if 'dataset_root' in dataset:
+            dataset_root = dataset['dataset_root']
+        else:
+            if default_config is None:
+                print('Expected default configuration, but none was specified')
+                exit()
+            dataset_root = default_config['dataset_root']
+
+        dataset_root = dataset_root.replace('${{dataset_name}}', dataset_name)
+        has_create_pointcloud_script = os.path.exists(os.path.join('datasets', dataset_name, 'create_pointclouds.py'))
+
+        resources = {}
+        if default_config is not None:
+            resources.update(default_config.get('resources', {}))
+        resources.update(dataset.get('resources', {}))
+
+        job = DatasetJob(dataset_name,
+                         dataset_root,
+                         cpu_weight=resources.get('cpu_weight', 1),
+                         memory_weight=resources.get('memory_weight', 0),
+                         threads=resources.get('threads'))
+        steps = dataset['processing_steps'] if 'processing_steps' in dataset else default_config['processing_steps']
+        for step in steps:
+            processing_step = get_command_for_processing_step(step, dataset_name, dataset_root, has_create_pointcloud_script)
+            if processing_step is not None:
+                job.steps.append(processing_step)
+
+        dataset_outputs = [output for step in job.steps for output in step.outputs]
+        for step in job.steps:
+            step.ignored_paths = list(dataset_outputs)
+        job.steps = [epoch_step for step in job.steps for epoch_step in expand_epochs(step)]
+        jobs.append(job)
+    return jobs
+
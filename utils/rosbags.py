@@ -32,7 +32,6 @@ POSSIBILITY OF SUCH DAMAGE."""
 # Message conversion code adapted from: http://docs.ros.org/en/kinetic/api/ros_numpy/html/point__cloud2_8py_source.html
 
 import numpy as np
-from rosbags.rosbag1 import Reader
 
 DUMMY_FIELD_PREFIX = '__'
 
@@ -117,6 +116,7 @@ def pointcloud_from_point_message(message):
 
 # Extracts all poses and their timestamps from a rosbag
 def extract_poses(rosbag_path, typestore, topic_name):
+	from rosbags.rosbag1 import Reader
 	timestamps = []
 	poses = []
 	with Reader(rosbag_path) as reader:
@@ -0,0 +1,252 @@
+import numpy as np
+import os
+import json
+import shutil
+import utils.pointcloud_format as pf
+from utils.io import read_point_batch
+from utils.tile_writer import tile_indices
+
+# A container that stores all epochs of a scene in one folder, chunked by (epoch, tile) in a tile grid that is shared by all epochs:
+#   scene.json                  the point cloud format, the tile grid, and the offsets of the shared local CRS in the world CRS
+#   epochs/[epoch]/[x]_[y].bin  the points of an epoch in a tile, written by an EpochWriter
+#   epochs/[epoch]/epoch.json   the number of points per tile, written when the epoch is complete
+#   packed.json                 the epochs in the packed tiles and the start of each epoch in each tile (see SceneContainer.pack)
+#   packed-[generation]/[x]_[y].bin   the points of all packed epochs in a tile, one epoch after the other (the previous generation is kept until the next packing)
+# The points are stored as little-endian records with one typed field per field of the pointcloud_format (see record_dtype).
+# Each epoch is written by its own EpochWriter, so that multiple processes can write different epochs concurrently. Packing concatenates the epochs
+# of each tile into one file, so that a tile is read across all epochs with one contiguous read.
+SCENE_METADATA = 'scene.json'
+EPOCH_METADATA = 'epoch.json'
+PACKED_INDEX = 'packed.json'
+
+# The fields of utils.pointcloud_format by name, which restore the fields of a stored format
+KNOWN_FIELDS = {field.name : field for field in [pf.X, pf.Y, pf.Z, pf.R, pf.G, pf.B, pf.INTENSITY, pf.CHANGE, pf.SEMANTIC, pf.INSTANCE]}
+
+
+# Returns the little-endian record type of the points of a scene, whose fields have the types of the PointBatch columns (e.g., coordinates as float64)
+def record_dtype(pointcloud_format):
+    return np.dtype([(field.name, pf.column_dtype(field).newbyteorder('<')) for field in pointcloud_format.fields])
+
+def tile_key(tile):
+    return str(int(tile[0])) + '_' + str(int(tile[1]))
+
+def write_json(path, data):
+    temp_path = path + '.tmp' + str(os.getpid())
+    with open(temp_path, 'w') as json_file:
+        json.dump(data, json_file)
+    os.replace(temp_path, path)
+
+def read_json(path):
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+# Reads the points of a scene. The epochs of the scene are the packed epochs followed by the complete epochs that were not packed yet.
+class SceneContainer:
+    def __init__(self, path):
+        self.path = path
+        metadata = read_json(os.path.join(path, SCENE_METADATA))
+        self.pointcloud_format = pf.PointcloudFormat([KNOWN_FIELDS.get(name, pf.PointcloudField(name, np.dtype(dtype).type)) for name, dtype in metadata['fields']])
+        self.dtype = record_dtype(self.pointcloud_format)
+        self.bbox = np.array(metadata['bbox'])
+        self.tile_size = np.array(metadata['tile_size'])
+        self.num_tiles = np.array(metadata['num_tiles'])
+        self.offsets = np.array(metadata['offsets'])
+
+    # Creates a scene with a tile grid given by its bbox (a matrix of shape (2,2) on the ground plane) and either the tile_size or the num_tiles (see TileWriter).
+    # The offsets are the origin of the local CRS of the points in the world CRS. Creating an existing scene with the same parameters opens it, so that
+    # each writer process can create the scene before writing its epoch.
+    @staticmethod
+    def create(path, pointcloud_format, bbox, tile_size=None, num_tiles=np.array([1, 1]), offsets=np.array([0, 0, 0])):
+        bbox = np.asarray(bbox, dtype=np.float64)
+        if tile_size is not None:
+            tile_size = np.broadcast_to(np.asarray(tile_size, dtype=np.float64), (2,))
+            num_tiles = np.maximum(np.ceil((bbox[1] - bbox[0]) / tile_size), 1).astype(int)
+        else:
+            num_tiles = np.asarray(num_tiles).astype(int)
+            tile_size = (bbox[1] - bbox[0]) / num_tiles
+        metadata = {'fields' : [[field.name, np.dtype(field.dtype).str] for field in pointcloud_format.fields],
+                    'bbox' : bbox.tolist(),
+                    'tile_size' : tile_size.tolist(),
+                    'num_tiles' : num_tiles.tolist(),
+                    'offsets' : np.asarray(offsets, dtype=np.float64).tolist()}
+
+        metadata_path = os.path.join(path, SCENE_METADATA)
+        if os.path.isfile(metadata_path):
+            if read_json(metadata_path) != metadata:
+                raise ValueError('The scene in ' + path + ' exists with a different format or tiling')
+        else:
+            os.makedirs(path, exist_ok=True)
+            write_json(metadata_path, metadata)
+        return SceneContainer(path)
+
+    def epoch_folder(self, epoch):
+        return os.path.join(self.path, 'epochs', epoch)
+
+    def packed_index(self):
+        index_path = os.path.join(self.path, PACKED_INDEX)
+        return read_json(index_path) if os.path.isfile(index_path) else {'generation' : 0, 'epochs' : [], 'tiles' : {}}
+
+    def packed_folder(self, generation):
+        return os.path.join(self.path, 'packed-' + str(generation))
+
+    # Returns the complete epochs that are not packed yet, sorted by name, and the number of points per tile of each
+    def unpacked_epochs(self, index=None):
+        index = self.packed_index() if index is None else index
+        epochs_folder = os.path.join(self.path, 'epochs')
+        epochs = {}
+        if os.path.isdir(epochs_folder):
+            for epoch in sorted(os.listdir(epochs_folder)):
+                metadata_path = os.path.join(epochs_folder, epoch, EPOCH_METADATA)
+                if epoch not in index['epochs'] and os.path.isfile(metadata_path):
+                    epochs[epoch] = read_json(metadata_path)['num_points']
+        return epochs
+
+    def epochs(self):
+        index = self.packed_index()
+        return index['epochs'] + list(self.unpacked_epochs(index))
+
+    def read_records(self, path, start=0, end=None):
+        if end is None:
+            end = os.path.getsize(path) // self.dtype.itemsize
+        if end <= start:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(path, dtype=self.dtype, mode='r', offset=start * self.dtype.itemsize, shape=(end - start,))
+
+    # Reads a tile (x, y) of the given epochs (defaults to all epochs) as dictionary of epoch and PointBatch. The batches are views of memory-mapped files:
+    # the packed epochs of the tile are read from one file, in which they are stored contiguously in the order of the scene.
+    def read_tile(self, tile, epochs=None):
+        index = self.packed_index()
+        unpacked_epochs = self.unpacked_epochs(index)
+        epochs = index['epochs'] + list(unpacked_epochs) if epochs is None else epochs
+        key = tile_key(tile)
+
+        result = {}
+        packed_starts = index['tiles'].get(key)
+        packed_epochs = [epoch for epoch in epochs if epoch in index['epochs']]
+        if packed_epochs and packed_starts is not None:
+            records = self.read_records(os.path.join(self.packed_folder(index['generation']), key + '.bin'))
+        for epoch in epochs:
+            if epoch in index['epochs']:
+                if packed_starts is None:
+                    points = np.empty(0, dtype=self.dtype)
+                else:
+                    epoch_idx = index['epochs'].index(epoch)
+                    points = records[packed_starts[epoch_idx]:packed_starts[epoch_idx + 1]]
+            elif epoch in unpacked_epochs:
+                num_points = unpacked_epochs[epoch].get(key, 0)
+                points = self.read_records(os.path.join(self.epoch_folder(epoch), key + '.bin'), 0, num_points)
+            else:
+                raise ValueError('The scene in ' + self.path + ' has no epoch ' + epoch)
+            result[epoch] = pf.PointBatch.from_records(points, self.pointcloud_format)
+        return result
+
+    # Reads all tiles of an epoch as one PointBatch
+    def read_epoch(self, epoch):
+        tiles = [(x, y) for x in range(self.num_tiles[0]) for y in range(self.num_tiles[1])]
+        return pf.PointBatch.concatenate(self.read_tile(tile, [epoch])[epoch] for tile in tiles)
+
+    # Appends the complete epochs that are not packed yet to the packed tiles (in the order of their names).
+    # The packed tiles are written into a new folder and replace the previous ones by updating packed.json. The previous packed tiles and the chunks
+    # of the newly packed epochs are only removed by the next packing, so that reads that started before (with the previous packed.json) are not affected.
+    # Reads must not span two packings, and packing must not run concurrently with another packing of the same scene.
+    def pack(self):
+        index = self.packed_index()
+        new_epochs = self.unpacked_epochs(index)
+        if not new_epochs:
+            return
+
+        generation = index['generation'] + 1
+        folder = self.packed_folder(generation)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+        tiles = {}
+        for x in range(self.num_tiles[0]):
+            for y in range(self.num_tiles[1]):
+                key = tile_key((x, y))
+                starts = index['tiles'].get(key, [0] * (len(index['epochs']) + 1))
+                with open(os.path.join(folder, key + '.bin'), 'wb') as tile_file:
+                    if starts[-1] > 0:
+                        with open(os.path.join(self.packed_folder(index['generation']), key + '.bin'), 'rb') as packed_file:
+                            shutil.copyfileobj(packed_file, tile_file, 2**24)
+                    for epoch, num_points in new_epochs.items():
+                        if num_points.get(key, 0) > 0:
+                            with open(os.path.join(self.epoch_folder(epoch), key + '.bin'), 'rb') as chunk_file:
+                                shutil.copyfileobj(chunk_file, tile_file, 2**24)
+                        starts = starts + [starts[-1] + num_points.get(key, 0)]
+                tiles[key] = starts
+
+        write_json(os.path.join(self.path, PACKED_INDEX), {'generation' : generation, 'epochs' : index['epochs'] + list(new_epochs), 'tiles' : tiles})
+        # the files replaced by the previous packing are not used by any reader anymore
+        for name in os.listdir(self.path):
+            if name.startswith('packed-') and int(name[len('packed-'):]) < index['generation']:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        for epoch in index['epochs']:
+            shutil.rmtree(self.epoch_folder(epoch), ignore_errors=True)
+
+
+# Writes one epoch of a scene, sorting the points into the tiles of the scene (like the TileWriter). The points are added as 2-D arrays with the fields
+# of the scene's pointcloud_format as columns, or as PointBatches, in the local CRS of the scene. Points with NaN coordinates are dropped.
+# The points of each tile are buffered up to write_threshold points in total and appended to the chunk of the tile. The epoch becomes part of the scene
+# when the writer is closed, until then readers do not see it. Opening a writer for an incomplete epoch discards the chunks written before.
+class EpochWriter:
+    def __init__(self, scene, epoch, write_threshold=4000000):
+        self.scene = scene
+        self.epoch = epoch
+        self.write_threshold = write_threshold
+        if epoch in scene.epochs():
+            raise ValueError('The scene in ' + scene.path + ' already contains the epoch ' + epoch)
+        self.folder = scene.epoch_folder(epoch)
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder)
+        self.buffers = {}
+        self.num_buffered = 0
+        self.num_points = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        return False
+
+    def add_points(self, points):
+        pointcloud_format = self.scene.pointcloud_format
+        if not isinstance(points, pf.PointBatch):
+            points = pf.PointBatch.from_array(np.asarray(points), pointcloud_format)
+        points = points[~np.isnan(points.xyz()).any(axis=1)]
+        if len(points) == 0:
+            return
+
+        tile_idx = tile_indices(np.column_stack([points['X'], points['Y']]), self.scene.bbox[0], self.scene.tile_size, self.scene.num_tiles)
+        u, i = np.unique(tile_idx, return_inverse=True, axis=0)
+        order = np.argsort(i.ravel(), kind='stable')
+        ends = np.cumsum(np.bincount(i.ravel(), minlength=len(u)))
+        for idx, end in enumerate(ends):
+            start = ends[idx - 1] if idx > 0 else 0
+            self.buffers.setdefault(tile_key(u[idx]), []).append(points[order[start:end]])
+        self.num_buffered += len(points)
+        if self.num_buffered >= self.write_threshold:
+            self.flush()
+
+    def flush(self):
+        for key, batches in self.buffers.items():
+            records = pf.PointBatch.concatenate(batches).to_records(self.scene.dtype)
+            with open(os.path.join(self.folder, key + '.bin'), 'ab') as chunk_file:
+                records.tofile(chunk_file)
+            self.num_points[key] = self.num_points.get(key, 0) + len(records)
+        self.buffers = {}
+        self.num_buffered = 0
+
+    def close(self):
+        self.flush()
+        write_json(os.path.join(self.folder, EPOCH_METADATA), {'num_points' : self.num_points})
+
+
+# Writes the point clouds of an epoch (e.g., the LAS/LAZ, PLY, or Parquet files written by the extraction, see utils.io.read_point_batch) into the scene.
+# LAS/LAZ files are read in their local CRS, which has to be the local CRS of the scene.
+def import_epoch(scene, epoch, filepaths, write_threshold=4000000):
+    with EpochWriter(scene, epoch, write_threshold) as epoch_writer:
+        for filepath in filepaths:
+            epoch_writer.add_points(read_point_batch(filepath, scene.pointcloud_format))
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+import traceback
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.processing import StepStatus, ProcessingStep, DatasetJob
+
+# Stores the runtimes (in seconds) of previously executed processing steps, per dataset and step key (the script, plus the epoch for epoch steps).
+# They are used for starting the datasets (and epochs) with the longest expected runtime first.
+class RuntimeHistory:
+    def __init__(self, path=None):
+        self.path = path
+        self.runtimes = {}
+        self.lock = threading.Lock()
+        if path is not None and os.path.isfile(path):
+            with open(path, 'r') as history_file:
+                self.runtimes = json.load(history_file)
+
+    # Returns the sum of the recorded runtimes of all steps of the job, or None if at least one step has never been recorded
+    def expected_runtime(self, job):
+        runtimes = [self.step_runtime(step) for step in job.steps]
+        if any(runtime is None for runtime in runtimes):
+            return None
+        return sum(runtimes)
+
+    def step_runtime(self, step):
+        return self.runtimes.get(step.dataset_name, {}).get(step.key)
+
+    def record(self, step, runtime):
+        with self.lock:
+            self.runtimes.setdefault(step.dataset_name, {})[step.key] = runtime
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as history_file:
+                json.dump(self.runtimes, history_file, indent=2)
+            os.replace(temp_path, self.path)
+
+
+# The progress of a DatasetJob while it is processed by the DatasetScheduler
+@dataclass
+class JobState:
+    job: DatasetJob
+    stages: list
+    pending: list = field(default_factory=list)    # the steps of the current stage that have not been started yet
+    running: int = 0
+    started: bool = False
+    finished: bool = False
+    failed_step: ProcessingStep = None
+
+
+# Processes multiple datasets concurrently, while the stages of each dataset are executed in their specified order.
+# The steps within a stage (i.e., the epochs of a dataset, see DatasetJob.stages) are executed concurrently.
+# Each running step occupies cpu_weight of the num_cpus cores and memory_weight of the memory budget (in GB) of its dataset.
+# Datasets that demand more than the available resources are clamped to them, i.e., they are processed alone.
+# Datasets are started in the order of their expected runtime (longest first), with datasets without recorded runtimes first.
+# The same applies to the steps within a stage.
+# The effective concurrency of the last run, i.e., the maximum number of concurrently running steps and the sum of their thread budgets
+# (steps without a thread budget count as all cores), is available as peak_steps and peak_threads.
+class DatasetScheduler:
+    def __init__(self, num_cpus=1, memory_budget=None, runtime_history=None):
+        self.num_cpus = num_cpus
+        self.memory_budget = memory_budget
+        self.runtime_history = runtime_history if runtime_history is not None else RuntimeHistory()
+        self.peak_steps = 0
+        self.peak_threads = 0
+
+    def cpu_demand(self, job):
+        return min(max(job.cpu_weight, 0), self.num_cpus)
+
+    def memory_demand(self, job):
+        if self.memory_budget is None:
+            return 0
+        return min(max(job.memory_weight, 0), self.memory_budget)
+
+    def sort_jobs(self, jobs):
+        def sort_key(indexed_job):
+            index, job = indexed_job
+            runtime = self.runtime_history.expected_runtime(job)
+            return (runtime is not None, -(runtime or 0), index)
+        return [job for _, job in sorted(enumerate(jobs), key=sort_key)]
+
+    def sort_steps(self, steps):
+        def sort_key(indexed_step):
+            index, step = indexed_step
+            runtime = self.runtime_history.step_runtime(step)
+            return (runtime is not None, -(runtime or 0), index)
+        return [step for _, step in sorted(enumerate(steps), key=sort_key)]
+
+    # Executes a single step. Skipped steps are not recorded, as their runtime says nothing about the actual processing time.
+    def run_step(self, step, run_step):
+        start_time = time.perf_counter()
+        status = run_step(step)
+        if status == StepStatus.SUCCEEDED:
+            self.runtime_history.record(step, time.perf_counter() - start_time)
+        return status
+
+    # Moves a job to its next stage. Returns False if the job is finished, i.e., if all stages are done or a step has failed.
+    # As the steps of a stage are independent of each other, the remaining steps of the current stage are still executed after a failure.
+    def advance(self, state):
+        if state.pending or state.running > 0:
+            return True
+        if state.failed_step is not None or not state.stages:
+            return False
+        state.pending = self.sort_steps(state.stages.pop(0))
+        return True
+
+    # run_step is a callable that executes a single ProcessingStep and returns its StepStatus.
+    # on_start and on_finish are optional callbacks that get the job (and the failed step) passed, e.g., for reporting the progress.
+    # Returns a list of (job, failed_step) tuples.
+    def run(self, jobs, run_step, on_start=None, on_finish=None):
+        states = [JobState(job, job.stages()) for job in self.sort_jobs(jobs)]
+        running = {}
+        free_cpus = self.num_cpus
+        free_memory = self.memory_budget
+        failures = []
+        self.peak_steps = 0
+        self.peak_threads = 0
+        step_threads = lambda step: step.threads or os.cpu_count() or 1
+
+        def finish(state):
+            state.finished = True
+            self.runtime_history.save()
+            if state.failed_step is not None:
+                failures.append((state.job, state.failed_step))
+            if on_finish is not None:
+                on_finish(state.job, state.failed_step)
+
+        with ThreadPoolExecutor(max_workers=max(1, sum(len(state.job.steps) for state in states))) as executor:
+            while any(not state.finished for state in states):
+                # start every pending step that fits into the currently free resources, keeping the priority order
+                for state in states:
+                    if state.finished:
+                        continue
+                    if not state.started and not self.advance(state):    # jobs without steps
+                        state.started = True
+                        if on_start is not None:
+                            on_start(state.job)
+                        finish(state)
+                        continue
+                    cpu_demand = self.cpu_demand(state.job)
+                    memory_demand = self.memory_demand(state.job)
+                    while state.pending:
+                        if running and (cpu_demand > free_cpus or (free_memory is not None and memory_demand > free_memory)):
+                            break
+                        if not state.started:
+                            state.started = True
+                            if on_start is not None:
+                                on_start(state.job)
+                        step = state.pending.pop(0)
+                        state.running += 1
+                        free_cpus -= cpu_demand
+                        if free_memory is not None:
+                            free_memory -= memory_demand
+                        running[executor.submit(self.run_step, step, run_step)] = (state, step)
+                        self.peak_steps = max(self.peak_steps, len(running))
+                        self.peak_threads = max(self.peak_threads, sum(step_threads(step) for _, step in running.values()))
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    state, step = running.pop(future)
+                    state.running -= 1
+                    free_cpus += self.cpu_demand(state.job)
+                    if free_memory is not None:
+                        free_memory += self.memory_demand(state.job)
+                    # an exception raised by run_step (e.g., by the build cache) only fails the dataset of the step, whose later stages are not executed
+                    try:
+                        status = future.result()
+                    except Exception:
+                        print('Processing step', step.key, 'of', state.job.name, 'raised an exception')
+                        traceback.print_exc()
+                        status = StepStatus.FAILED
+                    if status == StepStatus.FAILED and state.failed_step is None:
+                        state.failed_step = step
+                    if not self.advance(state):
+                        finish(state)
+
+        self.runtime_history.save()
+        return failures
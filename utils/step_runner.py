@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import runpy
+import threading
+import traceback
+import subprocess
+import importlib
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.processing import StepStatus
+from dataclasses import asdict
+from utils.telemetry import ResourceUsage, ResourceMonitor, StepReport, wait_and_measure, measure_outputs
+from utils.estimator import measure_inputs
+from utils.threads import thread_environment, set_thread_budget
+
+# Heavy third-party modules that are imported once per worker process of the InProcessRunner (missing ones are skipped)
+PRELOADED_MODULES = ['numpy', 'scipy.spatial', 'laspy', 'plyfile', 'pypcd4', 'shapely', 'open3d', 'cv2', 'tifffile', 'rosbags.rosbag1', 'pyarrow.parquet', 'tqdm']
+
+
+# Redirects stdout and stderr of the current process (including output of native libraries) to the given file
+@contextmanager
+def redirect_output(log_path):
+    if log_path is None:
+        yield
+        return
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = [os.dup(1), os.dup(2)]
+    with open(log_path, 'a') as log_file:
+        os.dup2(log_file.fileno(), 1)
+        os.dup2(log_file.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            for fd in saved_fds:
+                os.close(fd)
+
+
+# Executes each processing step in a separate Python interpreter, which isolates the steps from each other.
+# Runners return the StepStatus and the ResourceUsage of the step.
+class SubprocessRunner:
+    def run(self, step, log_path=None):
+        environment = thread_environment(step.threads) if step.threads is not None else None
+        if log_path is None:
+            return_code, usage = wait_and_measure(subprocess.Popen(step.command(), env=environment))
+        else:
+            with open(log_path, 'a') as log_file:
+                return_code, usage = wait_and_measure(subprocess.Popen(step.command(), stdout=log_file, stderr=subprocess.STDOUT, env=environment))
+        return (StepStatus.SUCCEEDED if return_code == 0 else StepStatus.FAILED), usage
+
+    def close(self):
+        pass
+
+
+def preload_modules():
+    for module_name in PRELOADED_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+
+# Executes the __main__ block of a dataset script within the current interpreter, with the step arguments as command line.
+# The __main__ block maps the command line to the entry function of the script (e.g., extract_pointclouds or compute_statistics).
+# The script itself is executed in a fresh namespace, so module-level state (e.g., cached camera parameters) is not shared between steps,
+# while all modules imported by it (numpy, open3d, utils, ...) are only imported once per process.
+# As these modules are already loaded, the thread budget of the step is applied to their thread pools directly (see set_thread_budget).
+def run_step_in_current_process(step, log_path=None):
+    if step.threads is not None:
+        set_thread_budget(step.threads)
+    saved_argv = sys.argv
+    sys.argv = [step.script_path] + step.command()[3:]
+    status = StepStatus.SUCCEEDED
+    # the monitor is not set if redirecting the output or starting the monitor fails, e.g., if the log file cannot be opened
+    monitor = None
+    try:
+        with redirect_output(log_path), ResourceMonitor() as monitor:
+            try:
+                runpy.run_module(step.module, run_name='__main__', alter_sys=True)
+            except SystemExit as system_exit:
+                if system_exit.code not in (None, 0):
+                    status = StepStatus.FAILED
+            except BaseException:
+                traceback.print_exc()
+                status = StepStatus.FAILED
+    except Exception:
+        traceback.print_exc()
+        status = StepStatus.FAILED
+    finally:
+        sys.argv = saved_argv
+        usage = monitor.usage if monitor is not None else ResourceUsage()
+    return status, usage
+
+
+# Executes processing steps in a pool of warm worker processes, which are reused for all steps and datasets.
+# This avoids starting a new interpreter and re-importing heavy libraries for every step.
+# Each worker executes one step at a time. If a worker crashes (e.g., due to a segmentation fault in a native library),
+# the step is reported as failed and the pool is restarted.
+class InProcessRunner:
+    def __init__(self, num_workers=1):
+        self.num_workers = max(1, int(num_workers))
+        self.lock = threading.Lock()
+        self.executor = self.create_executor()
+
+    def create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.num_workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=preload_modules)
+
+    def run(self, step, log_path=None):
+        with self.lock:
+            executor = self.executor
+        try:
+            return executor.submit(run_step_in_current_process, step, log_path).result()
+        except BrokenProcessPool:
+            print('A worker process crashed while executing', step.module)
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = self.create_executor()
+            return StepStatus.FAILED, ResourceUsage()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def create_step_runner(mode, num_workers=1):
+    if mode == 'inprocess':
+        return InProcessRunner(num_workers)
+    return SubprocessRunner()
+
+
+# Executes a step with the given runner, unless the build cache reports it as up to date, and measures its resource usage.
+# The size of its inputs is reported as well, which calibrates the cost estimation (see utils.estimator).
+def execute_step(step, step_runner, build_cache, log_path=None, force=False):
+    usages = []
+    def run_step(step):
+        status, usage = step_runner.run(step, log_path)
+        usages.append(usage)
+        return status
+
+    input_files = build_cache.input_files(step)
+    input_size = measure_inputs(input_files)
+    start_time = time.time()
+    status = build_cache.run_step(step, run_step, force=force, input_files=input_files)
+    wall_time = time.time() - start_time
+
+    # the build cache records the output files of the step (for epoch steps, only the files of the epoch)
+    record = build_cache.load_record(step) if status == StepStatus.SUCCEEDED else None
+    files_produced, output_bytes, points_emitted = measure_outputs(record['outputs']) if record is not None else (0, 0, 0)
+    usage = usages[0] if usages else ResourceUsage()
+    return StepReport(step.dataset_name,
+                      step.script,
+                      status.value,
+                      start_time,
+                      wall_time,
+                      **asdict(usage),
+                      files_produced=files_produced,
+                      output_bytes=output_bytes,
+                      points_emitted=points_emitted,
+                      outputs=step.outputs,
+                      epoch=step.epoch,
+                      input_bytes=input_size.bytes,
+                      input_files=input_size.files,
+                      input_images=input_size.images,
+                      input_points=input_size.points)
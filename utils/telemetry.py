@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import struct
+import threading
+from dataclasses import dataclass, asdict, field
+
+# Resources used by a single processing step. Values that cannot be determined on the current platform are None.
+# peak_rss and the I/O counters are given in bytes. bytes_read/bytes_written count all read/write calls (including cached I/O).
+@dataclass
+class ResourceUsage:
+    cpu_time: float = None
+    peak_rss: int = None
+    bytes_read: int = None
+    bytes_written: int = None
+
+
+# One entry of the run report
+@dataclass
+class StepReport:
+    dataset: str
+    script: str
+    status: str
+    start_time: float
+    wall_time: float
+    cpu_time: float = None
+    peak_rss: int = None
+    bytes_read: int = None
+    bytes_written: int = None
+    files_produced: int = 0
+    output_bytes: int = 0
+    points_emitted: int = 0
+    outputs: list = field(default_factory=list)
+    epoch: str = None
+    input_bytes: int = None
+    input_files: int = None
+    input_images: int = None
+    input_points: int = None
+
+
+def read_proc_io(pid='self'):
+    try:
+        with open('/proc/' + str(pid) + '/io', 'r') as io_file:
+            values = dict(line.split(': ') for line in io_file.read().splitlines())
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def maxrss_to_bytes(maxrss):
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+# Resets the peak resident set size of the current process (only possible on Linux)
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+def read_peak_rss():
+    try:
+        with open('/proc/self/status', 'r') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# Waits for a subprocess.Popen process and measures its resource usage.
+# On systems without os.wait4 (e.g., Windows), only the return code is determined.
+def wait_and_measure(process, sampling_interval=0.5):
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return process.returncode, ResourceUsage()
+
+    # /proc/<pid>/io is only available while the process is alive, so it is sampled periodically
+    io_counters = None
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid != 0:
+            break
+        io_counters = read_proc_io(process.pid) or io_counters
+        time.sleep(sampling_interval)
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    usage = ResourceUsage(cpu_time=rusage.ru_utime + rusage.ru_stime, peak_rss=maxrss_to_bytes(rusage.ru_maxrss))
+    if io_counters is not None:
+        usage.bytes_read, usage.bytes_written = io_counters
+    return process.returncode, usage
+
+
+# Measures the resource usage of code executed within the current process
+class ResourceMonitor:
+    def __enter__(self):
+        self.peak_rss_reset = reset_peak_rss()
+        self.io_counters = read_proc_io()
+        self.start_cpu_time = time.process_time()
+        self.usage = ResourceUsage()
+        return self
+
+    def __exit__(self, *args):
+        self.usage.cpu_time = time.process_time() - self.start_cpu_time
+        # without a reset, the peak refers to the lifetime of the process
+        self.usage.peak_rss = read_peak_rss()
+        if self.usage.peak_rss is None:
+            try:
+                import resource
+                self.usage.peak_rss = maxrss_to_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+            except ImportError:
+                pass
+        io_counters = read_proc_io()
+        if self.io_counters is not None and io_counters is not None:
+            self.usage.bytes_read = io_counters[0] - self.io_counters[0]
+            self.usage.bytes_written = io_counters[1] - self.io_counters[1]
+        return False
+
+
+# Reads the number of points from the header of a LAS/LAZ, PLY, or PCD file without reading the points (see utils.io.count_points).
+# Returns None for other files and files that cannot be read.
+def count_points_in_header(path):
+    from utils.io import count_points
+    try:
+        return count_points(path)
+    except (OSError, ValueError, IndexError, KeyError, struct.error):
+        return None
+
+# Counts the files, bytes, and points (if available from the file headers) in the given output paths
+def measure_outputs(output_paths):
+    files_produced = 0
+    output_bytes = 0
+    points_emitted = 0
+    for output_path in output_paths:
+        if os.path.isfile(output_path):
+            filepaths = [output_path]
+        else:
+            filepaths = [os.path.join(root, filename) for root, _, filenames in os.walk(output_path) for filename in filenames]
+        for filepath in filepaths:
+            files_produced += 1
+            output_bytes += os.path.getsize(filepath)
+            points_emitted += count_points_in_header(filepath) or 0
+    return files_produced, output_bytes, points_emitted
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return '-'
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024:
+            return '%.1f %s' % (num_bytes, unit)
+        num_bytes /= 1024
+    return '%.1f TB' % num_bytes
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+
+# Collects the StepReports of a run and appends them to a JSON-lines file (one line per step)
+class RunReport:
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            with open(self.path, 'a') as report_file:
+                report_file.write(json.dumps(asdict(entry)) + '\n')
+
+    # Returns a table of the executed steps, ranked by their wall time
+    def summary_table(self, max_rows=None):
+        entries = sorted(self.entries, key=lambda entry: entry.wall_time, reverse=True)
+        if max_rows is not None:
+            entries = entries[:max_rows]
+
+        header = ['Dataset', 'Script', 'Status', 'Wall time', 'CPU time', 'Peak RSS', 'Read', 'Written', 'Files', 'Output', 'Points']
+        rows = [header]
+        for entry in entries:
+            rows.append([entry.dataset,
+                         entry.script if entry.epoch is None else entry.script + ' (' + entry.epoch + ')',
+                         entry.status,
+                         format_seconds(entry.wall_time),
+                         format_seconds(entry.cpu_time),
+                         format_bytes(entry.peak_rss),
+                         format_bytes(entry.bytes_read),
+                         format_bytes(entry.bytes_written),
+                         str(entry.files_produced),
+                         format_bytes(entry.output_bytes),
+                         str(entry.points_emitted)])
+        widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+        lines = ['  '.join(value.ljust(width) for value, width in zip(row, widths)) for row in rows]
+        lines.insert(1, '-' * len(lines[0]))
+        return '\n'.join(lines)
@@ -0,0 +1,82 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# The number of threads a processing step may use in total. It is set by process_datasets.py for each step (see set_thread_budget),
+# and can also be set manually when executing a dataset script directly. Without it, all cores are used.
+THREAD_BUDGET_VARIABLE = 'PROCESSING_THREADS'
+
+# Variables that limit the thread pools of native libraries: OpenMP (e.g., used by open3d), BLAS implementations used by numpy/scipy,
+# numexpr, OpenCV, and lazrs (rayon). They only affect libraries that are loaded after they have been set, e.g., in a new subprocess.
+NATIVE_THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                           'NUMEXPR_NUM_THREADS', 'OPENCV_FOR_THREADS_NUM', 'RAYON_NUM_THREADS']
+
+# The number of threads used for compressing LAZ files (see utils.io.get_laz_backend). It is set by the --laz_workers option of process_datasets.py.
+LAZ_WORKERS_VARIABLE = 'LAZ_WORKERS'
+
+
+# Returns the thread budget of the current process, which is meant to be passed to thread pools that are created by the scripts
+# (e.g., workers of scipy's cKDTree.query or a ThreadPoolExecutor)
+def thread_budget():
+    value = os.environ.get(THREAD_BUDGET_VARIABLE)
+    if value:
+        return max(1, int(value))
+    return os.cpu_count() or 1
+
+# Returns the number of threads for compressing LAZ files: the value of LAZ_WORKERS, else the thread budget
+def laz_workers():
+    value = os.environ.get(LAZ_WORKERS_VARIABLE)
+    if value:
+        return max(1, int(value))
+    return thread_budget()
+
+# Returns a copy of the environment in which a subprocess is limited to the given number of threads
+def thread_environment(num_threads, environment=None):
+    environment = dict(os.environ if environment is None else environment)
+    for variable in [THREAD_BUDGET_VARIABLE] + NATIVE_THREAD_VARIABLES:
+        environment[variable] = str(num_threads)
+    return environment
+
+# Limits the current process to the given number of threads. Besides setting the environment variables for libraries that are loaded later,
+# the thread pools of already loaded libraries are limited: OpenCV and, if threadpoolctl is installed, BLAS and OpenMP.
+def set_thread_budget(num_threads):
+    os.environ.update({variable : value for variable, value in thread_environment(num_threads, {}).items()})
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(num_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(num_threads)
+    except ImportError:
+        pass
+
+
+# Applies the function to the items in a background thread pool and yields the results in order. Up to num_prefetched items are processed
+# ahead of the consumer, e.g., for reading the next tiles while the current one is analysed (num_prefetched + 1 results are held at most).
+def prefetch(function, items, num_prefetched=1):
+    if num_prefetched <= 0:
+        for item in items:
+            yield function(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_prefetched) as executor:
+        futures = deque()
+        for item in items:
+            futures.append(executor.submit(function, item))
+            if len(futures) > num_prefetched:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+# Returns the thread budget of each step of a dataset: the threads specified under resources in the configuration, else (when processing
+# concurrently) the number of cores the dataset occupies, i.e., its cpu_weight clamped to the available cores. The --threads option of
+# process_datasets.py overrides both. None means that the steps are not limited.
+def step_thread_budget(job, num_cpus, concurrent, threads=None):
+    if threads is not None:
+        return max(1, int(threads))
+    if job.threads is not None:
+        return max(1, int(job.threads))
+    if concurrent:
+        return max(1, int(min(job.cpu_weight, num_cpus)))
+    return None
@@ -1,44 +1,162 @@
-import laspy
 import numpy as np
 import os
-from utils.io import FileFormat, las_points_from_pointcloud, get_las_header
+import glob
+import json
+import time
+from utils.io import FileFormat, quantize_las_coordinates, get_las_header, get_laz_backend, pointcloud_bbox, open_parquet_writer, write_parquet_row_groups
+from utils.pointcloud_format import PointBatch, COORDINATE_FIELDS, column_dtype
+
+CHECKPOINT_FILENAME = '.tile_writer_checkpoint.json'
+# The checkpoint interval (in seconds) that is used if resume is set without a checkpoint_interval
+DEFAULT_CHECKPOINT_INTERVAL = 600
+TILE_EXTENSIONS = {FileFormat.LAZ : '.laz', FileFormat.PARQUET : '.parquet'}
+
+# Returns the indices (x, y) of the tiles of a grid (with its minimum at bbox_min) that contain the points on the ground plane (xy).
+# The tiles are open to the borders of the grid, i.e., points outside of it are assigned to the nearest tile.
+def tile_indices(xy, bbox_min, tile_size, num_tiles):
+    tile_idx = ((xy - bbox_min) / tile_size).astype(int)
+    tile_idx[:,0] = np.clip(tile_idx[:,0], a_min=0, a_max=num_tiles[0]-1)
+    tile_idx[:,1] = np.clip(tile_idx[:,1], a_min=0, a_max=num_tiles[1]-1)
+    return tile_idx
 
 # Utility class for the TileWriter
+# If use_parts is set, the points are written into a sequence of part files (e.g., tile_0_0.laz.part0) that are merged into the tile when closing.
+# Each part is finished at a checkpoint, so that a crashed extraction can be resumed from the parts that were finished before the last checkpoint.
+# The parts of LAZ tiles are written as uncompressed LAS, so that the points are only compressed once, when the parts are merged.
+# LAZ tiles are compressed with laz_workers threads (see utils.io.get_laz_backend).
+# The points are buffered with one column per field, i.e., each field keeps its type (e.g., instance IDs as uint16). The coordinates of LAS/LAZ tiles
+# are buffered as the int32 values of the LAS header (see utils.io.quantize_las_coordinates), so a point of FORMAT_XYZI takes 16 bytes,
+# like in a float32 array, but without losing the precision of world coordinates.
+# The LAS header is created when the first points are added: its offsets and scales are derived from the bounds of the tile (a matrix of shape (2,2)
+# on the ground plane) and the bounding box of the first points (see utils.io.get_las_header). All parts of a tile share this header.
+# As the tiles are open to the borders, later points can lie far outside of this header. Their coordinates are clipped to its range (with a message),
+# instead of aborting the extraction.
+# Parquet tiles (output_path ending with .parquet) get a row group for each block of at most write_threshold points (see utils.io.write_parquet_row_groups).
+# Their coordinates are buffered as float64, as they are written.
 class SingleTileWriter:
-    def __init__(self, output_path, las_header, write_threshold, pointcloud_format):
-        self.las_header = las_header
+    def __init__(self, output_path, tile_bounds, write_threshold, pointcloud_format, use_parts=False, laz_workers=None, las_offsets=np.array([0, 0, 0]), las_precision=1000000):
+        self.tile_bounds = tile_bounds
+        self.las_offsets = las_offsets
+        self.las_precision = las_precision
+        self.las_header = None
         self.pointcloud_format = pointcloud_format
         self.output_path = output_path
-        self.las_writer = laspy.open(output_path, mode='w', header=las_header)
+        self.is_parquet = output_path.endswith('.parquet')
+        self.do_compress = output_path.endswith('.laz')
+        self.laz_backend = get_laz_backend(laz_workers) if self.do_compress else None
+        self.file_writer = None    # opened when the first points are written
+        self.use_parts = use_parts
+        self.num_parts = 0
         
         self.write_threshold = write_threshold
-        self.data = np.empty((write_threshold, len(pointcloud_format.fields)), dtype=np.float32)
+        self.columns = {field.name : np.empty(write_threshold, dtype=np.int32 if field in COORDINATE_FIELDS and not self.is_parquet else column_dtype(field))
+                        for field in pointcloud_format.fields}
         self.current_index = 0
         self.points_written = 0
 
+    def part_path(self, part_index):
+        return self.output_path + '.part' + str(part_index)
+
+    # Adds a PointBatch with the fields of the pointcloud_format (in blocks of at most write_threshold points)
     def add_points(self, points):
-        num_points = len(points)
-        if self.current_index + num_points > self.write_threshold:
-            self.flush()
-        self.data[self.current_index:self.current_index + num_points] = points
-        self.current_index += num_points
+        for start in range(0, len(points), self.write_threshold):
+            block = points[start:start + self.write_threshold]
+            num_points = len(block)
+            if self.current_index + num_points > self.write_threshold:
+                self.flush()
+            if self.las_header is None and not self.is_parquet:
+                bbox = pointcloud_bbox(block)
+                bbox[0, :2] = np.minimum(bbox[0, :2], self.tile_bounds[0])
+                bbox[1, :2] = np.maximum(bbox[1, :2], self.tile_bounds[1])
+                self.las_header = get_las_header(self.pointcloud_format, self.las_offsets, self.las_precision, bbox=bbox)
+            for field in self.pointcloud_format.fields:
+                target = self.columns[field.name][self.current_index:self.current_index + num_points]
+                if field in COORDINATE_FIELDS and not self.is_parquet:
+                    target[:] = quantize_las_coordinates(block[field.name], COORDINATE_FIELDS.index(field), self.las_header, clip=True)
+                else:
+                    target[:] = block[field.name]
+            self.current_index += num_points
 
     def flush(self):
         if self.current_index == 0:
             return
 
-        las_points = las_points_from_pointcloud(self.data[:self.current_index], 
-                                                self.pointcloud_format,
-                                                self.las_header)
-        self.las_writer.write_points(las_points.points)
+        if self.is_parquet:
+            if self.file_writer is None:
+                self.file_writer = open_parquet_writer(self.part_path(self.num_parts) if self.use_parts else self.output_path, self.pointcloud_format)
+            points = PointBatch(self.pointcloud_format, {name : column[:self.current_index] for name, column in self.columns.items()})
+            write_parquet_row_groups(self.file_writer, points, self.pointcloud_format, self.write_threshold)
+            self.points_written += self.current_index
+            self.current_index = 0
+            return
+
+        import laspy
+        if self.file_writer is None:
+            path = self.part_path(self.num_parts) if self.use_parts else self.output_path
+            self.file_writer = laspy.open(path, mode='w', header=self.las_header, do_compress=self.do_compress and not self.use_parts, laz_backend=self.laz_backend)
+        # the buffered coordinates are already quantized, so all columns are copied into the point record as they are
+        las_points = laspy.ScaleAwarePointRecord.zeros(self.current_index, header=self.las_header)
+        for name, column in self.columns.items():
+            las_points.array[name] = column[:self.current_index]
+        self.file_writer.write_points(las_points)
         self.points_written += self.current_index
         self.current_index = 0
 
+    # Writes all buffered points and closes the current part file
+    def finish_part(self):
+        self.flush()
+        if self.file_writer is not None:
+            self.file_writer.close()
+            self.file_writer = None
+            self.num_parts += 1
+
+    # Continues after the given number of finished parts (with the header of the first one) and removes all parts written after them
+    def restore(self, num_parts, points_written):
+        self.num_parts = num_parts
+        self.points_written = points_written
+        if num_parts > 0 and not self.is_parquet:
+            import laspy
+            with laspy.open(self.part_path(0)) as part_reader:
+                self.las_header = part_reader.header
+        for part_path in glob.glob(glob.escape(self.output_path) + '.part*'):
+            if int(part_path[len(self.output_path) + len('.part'):]) >= num_parts:
+                os.remove(part_path)
+
+    def merge_parts(self):
+        if self.is_parquet:
+            self.merge_parquet_parts()
+            return
+        import laspy
+        with laspy.open(self.output_path, mode='w', header=self.las_header, do_compress=self.do_compress, laz_backend=self.laz_backend) as las_writer:
+            for part_index in range(self.num_parts):
+                with laspy.open(self.part_path(part_index)) as part_reader:
+                    for points in part_reader.chunk_iterator(self.write_threshold):
+                        las_writer.write_points(points)
+        for part_index in range(self.num_parts):
+            os.remove(self.part_path(part_index))
+
+    # Copies the row groups of the parts into the tile
+    def merge_parquet_parts(self):
+        import pyarrow.parquet as pq
+        with open_parquet_writer(self.output_path, self.pointcloud_format) as parquet_writer:
+            for part_index in range(self.num_parts):
+                part_file = pq.ParquetFile(self.part_path(part_index))
+                for row_group in range(part_file.num_row_groups):
+                    parquet_writer.write_table(part_file.read_row_group(row_group))
+                part_file.close()
+        for part_index in range(self.num_parts):
+            os.remove(self.part_path(part_index))
+
     def close(self):
-        if self.current_index > 0:
+        if self.use_parts:
+            self.finish_part()
+            if self.points_written > 0:
+                self.merge_parts()
+        else:
             self.flush()
-        self.las_writer.close()
-        if self.points_written == 0:
+            if self.file_writer is not None:
+                self.file_writer.close()
+        if self.points_written == 0 and os.path.isfile(self.output_path):
             os.remove(self.output_path)
 
 # Writes a point cloud iteratively to disk, sorting it into non-overlapping tiles
@@ -48,6 +166,15 @@ class SingleTileWriter:
 # If both are available, the tile_size is used to derive the num_tiles
 # bbox should be a matrix of shape (2,2), with the first row being the minimum, and the second the maximum on the ground plane (xy)
 # The tiles are open to the borders, i.e., points falling outside the borders of a tile are added to the nearest tile
+# With a checkpoint_interval (in seconds), the writer supports resuming a crashed extraction: checkpoint() is called with the current input position
+# (e.g., a file offset, a timestamp, or a frame index) after each processed input. Once the interval has elapsed, all buffered points are written and the
+# position is stored together with the finished part files of all tiles. With resume=True, the writer continues from the last checkpoint in the output folder
+# (if any) and provides its position as resume_position. Points added after the last checkpoint are discarded, so the input has to continue right after it.
+# Without both, no checkpoints are stored and each tile is written directly (without part files that have to be merged when closing).
+# laz_workers is the number of threads for compressing each LAZ tile (defaults to the LAZ_WORKERS variable or the thread budget, see utils.threads).
+# The points are added either as 2-D array with the fields of the pointcloud_format as columns, or as PointBatch (see utils.pointcloud_format).
+# Each tile stores its coordinates relative to its own offset, with the las_precision (see utils.io.get_las_header). The las_offsets are the origin of the
+# local CRS of the points in the world CRS, as for utils.io.write_pointcloud.
 class TileWriter:
     def __init__(self, 
                  output_folder,
@@ -57,9 +184,16 @@ class TileWriter:
                  tile_size=None, 
                  num_tiles=np.array([1,1]), 
                  padding=0, 
-                 write_threshold=4000000):
-        self.las_header = get_las_header(pointcloud_format)
+                 write_threshold=4000000,
+                 checkpoint_interval=None,
+                 resume=False,
+                 laz_workers=None,
+                 las_offsets=np.array([0, 0, 0]),
+                 las_precision=1000000):
+        self.pointcloud_format = pointcloud_format
         self.bbox = bbox
+        if resume and checkpoint_interval is None:
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
 
         bbox_extent = bbox[1] - bbox[0]
         if tile_size is not None:
@@ -80,29 +214,89 @@ class TileWriter:
                 tile_path = os.path.join(output_folder, 
                                          ''.join(['tile_', str(x), '_',  
                                          str(y), 
-                                         '.laz' if file_format == FileFormat.LAZ else '.las']))
+                                         TILE_EXTENSIONS.get(file_format, '.las')]))
+                tile_min = self.bbox[0] + np.array([x, y]) * self.tile_size
                 self.writers[x].append(SingleTileWriter(tile_path, 
-                                                        self.las_header, 
+                                                        np.array([tile_min, tile_min + self.tile_size]), 
                                                         write_threshold=write_threshold, 
-                                                        pointcloud_format=pointcloud_format))
+                                                        pointcloud_format=pointcloud_format,
+                                                        use_parts=checkpoint_interval is not None,
+                                                        laz_workers=laz_workers,
+                                                        las_offsets=las_offsets,
+                                                        las_precision=las_precision))
+
+        self.checkpoint_path = os.path.join(output_folder, CHECKPOINT_FILENAME)
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint_time = time.monotonic()
+        self.resume_position = None
+        if checkpoint_interval is not None:
+            self.restore_checkpoint(resume)
+
+    # Restores the state of the last checkpoint (if resume is set and it matches the tiling), otherwise removes the parts of a previous extraction
+    def restore_checkpoint(self, resume):
+        checkpoint = None
+        if resume and os.path.isfile(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            if checkpoint['num_tiles'] != [int(n) for n in self.num_tiles]:
+                print('The checkpoint in', self.checkpoint_path, 'does not match the tiling. Starting from scratch.')
+                checkpoint = None
+
+        for x in range(self.num_tiles[0]):
+            for y in range(self.num_tiles[1]):
+                num_parts, points_written = checkpoint['tiles'][x][y] if checkpoint is not None else (0, 0)
+                self.writers[x][y].restore(num_parts, points_written)
+        if checkpoint is not None:
+            self.resume_position = checkpoint['position']
+            print('Resuming from checkpoint at position', self.resume_position)
+        elif os.path.isfile(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    # Stores a checkpoint at the given input position if the checkpoint interval has elapsed. Returns True if a checkpoint was stored.
+    def checkpoint(self, position, force=False):
+        if self.checkpoint_interval is None:
+            return False
+        if not force and time.monotonic() - self.last_checkpoint_time < self.checkpoint_interval:
+            return False
+
+        tiles = []
+        for x in range(self.num_tiles[0]):
+            tiles.append([])
+            for y in range(self.num_tiles[1]):
+                writer = self.writers[x][y]
+                writer.finish_part()
+                tiles[x].append([writer.num_parts, writer.points_written])
+
+        checkpoint = {'position' : position, 'num_tiles' : [int(n) for n in self.num_tiles], 'tiles' : tiles}
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temp_path, self.checkpoint_path)
+        self.last_checkpoint_time = time.monotonic()
+        return True
 
     
     def add_points(self, points):
+        # points with NaN values are dropped. Arrays are converted into a PointBatch after that, as NaN cannot be represented by the integer fields.
+        if isinstance(points, PointBatch):
+            points = points[~np.isnan(points.xyz()).any(axis=1)]
+        else:
+            points = PointBatch.from_array(points[~np.isnan(points).any(axis=1)], self.pointcloud_format)
+
         # sort points into tiles
-        tile_idx = ((points[:,:2] - self.bbox[0]) / self.tile_size).astype(int)
-        tile_idx[:,0] = np.clip(tile_idx[:,0], a_min=0, a_max=self.num_tiles[0]-1)
-        tile_idx[:,1] = np.clip(tile_idx[:,1], a_min=0, a_max=self.num_tiles[1]-1)
+        tile_idx = tile_indices(np.column_stack([points['X'], points['Y']]), self.bbox[0], self.tile_size, self.num_tiles)
         u, i, counts = np.unique(tile_idx, return_inverse=True, return_counts=True, axis=0)
         points_sorted = points[np.argsort(i)]
-        tiled_points = np.split(points_sorted, np.cumsum(counts)[:-1])
+        ends = np.cumsum(counts)
 
-        for idx, tile in enumerate(tiled_points):
-            tile = tile[~np.isnan(tile).any(axis=1)]
+        for idx, end in enumerate(ends):
             tile_x = u[idx][0]
             tile_y = u[idx][1]
-            self.writers[tile_x][tile_y].add_points(tile)
+            self.writers[tile_x][tile_y].add_points(points_sorted[end - counts[idx]:end])
 
     def close(self):
         for x in range(self.num_tiles[0]):
             for y in range(self.num_tiles[1]):
-                self.writers[x][y].close()
\ No newline at end of file
+                self.writers[x][y].close()
+        if os.path.isfile(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
\ No newline at end of file